@@ -0,0 +1,41 @@
+"""
+Memoria por id y velocidad de busqueda de ``set`` vs ``IdsVistos``
+para ids de productos tipo EAN.
+
+    $ python benchmarks/bench_dedup.py [cantidad]
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from preciosclaros.dedup import IdsVistos
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+random.seed(0)
+# como enteros, para que el costo de los str se mida solo si el conjunto los retiene
+ids = [7790000000000 + random.randrange(10**10) for _ in range(N)]
+consultas = [str(n) for n in random.sample(ids, N // 2) + [7790000000000 + random.randrange(10**10) for _ in range(N // 2)]]
+
+
+def medir(nombre, crear):
+    tracemalloc.start()
+    vistos = crear()
+    for n in ids:
+        id_ = str(n)
+        if id_ not in vistos:
+            vistos.add(id_)
+    if hasattr(vistos, "compactar"):
+        vistos.compactar()
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    inicio = time.perf_counter()
+    for id_ in consultas:
+        id_ in vistos
+    t = time.perf_counter() - inicio
+    print(f"{nombre:24} {memoria / len(vistos):8.1f} bytes/id {len(consultas) / t:14,.0f} busquedas/s")
+
+
+print(f"{N:,} ids")
+medir("set", set)
+medir("IdsVistos", IdsVistos)
@@ -0,0 +1,70 @@
+"""
+Filas/segundo exportando ``PrecioItem`` con ``CsvItemExporter`` vs ``FilasCsvExporter``
+(item por item y por pagina con ``export_filas``).
+
+    $ python benchmarks/bench_exporters.py [filas]
+"""
+import io
+import random
+import sys
+import time
+from datetime import datetime
+
+from scrapy.exporters import CsvItemExporter
+
+from preciosclaros.exporters import FilasCsvExporter
+from preciosclaros.items import PrecioItem
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+PAGINA = 50
+random.seed(0)
+fecha = datetime.utcnow()
+filas = [
+    ("15-1-1080", str(7790000000000 + random.randrange(10**9)), round(random.uniform(10, 5000), 2), 1.0, 2.0, fecha)
+    for _ in range(N)
+]
+items = [
+    PrecioItem(
+        sucursal_id=s, producto_id=p, precio=precio, precio_max=pmax, precio_min=pmin, fecha_relevamiento=f
+    )
+    for s, p, precio, pmax, pmin, f in filas
+]
+
+
+def medir(nombre, exportar):
+    inicio = time.perf_counter()
+    exportar(io.BytesIO())
+    t = time.perf_counter() - inicio
+    print(f"{nombre:36} {N / t:12,.0f} filas/s")
+
+
+def csv_item_exporter(f):
+    e = CsvItemExporter(f)
+    e.start_exporting()
+    for item in items:
+        e.export_item(item)
+    e.finish_exporting()
+
+
+def filas_item_por_item(f):
+    e = FilasCsvExporter(f, "precio")
+    e.start_exporting()
+    for item in items:
+        e.export_item(item)
+    e.finish_exporting()
+
+
+def filas_por_pagina(f):
+    e = FilasCsvExporter(f, "precio")
+    e.start_exporting()
+    for i in range(0, N, PAGINA):
+        pagina = filas[i : i + PAGINA]
+        texto = e.formatear_fecha(pagina[0][5])
+        e.export_filas([fila[:5] + (texto,) for fila in pagina])
+    e.finish_exporting()
+
+
+print(f"{N:,} precios")
+medir("CsvItemExporter.export_item", csv_item_exporter)
+medir("FilasCsvExporter.export_item", filas_item_por_item)
+medir("FilasCsvExporter.export_filas", filas_por_pagina)
@@ -0,0 +1,79 @@
+"""
+Indices encadenados de ``indices.py`` sobre un dataset sintetico: el calculo vectorizado
+completo vs leer los indices ya guardados en ``indices.csv``, y la actualizacion con un snapshot nuevo.
+
+    $ python benchmarks/bench_indices.py [snapshots] [sucursales] [productos]
+"""
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import helpers
+import indices
+
+SNAPSHOTS = int(sys.argv[1]) if len(sys.argv) > 1 else 14
+SUCURSALES = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+PRODUCTOS = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+rng = np.random.default_rng(0)
+
+
+def generar(directorio):
+    comercios = rng.integers(1, 40, SUCURSALES)
+    pd.DataFrame(
+        {
+            "id": [f"{c}-1-{i}" for i, c in enumerate(comercios)],
+            "comercioId": comercios,
+            "banderaId": 1,
+            "banderaDescripcion": [f"Supermercados {c}" for c in comercios],
+            "provincia": rng.choice(list(helpers.iso_codes), SUCURSALES),
+        }
+    ).to_csv(directorio / "sucursales.csv", index=False)
+
+    ids = 7790000000000 + np.arange(PRODUCTOS)
+    pd.DataFrame(
+        {
+            "id": ids,
+            "categoria1": [f"Categoria {i}" for i in rng.integers(0, 12, PRODUCTOS)],
+            "categoria2": [f"Subcategoria {i}" for i in rng.integers(0, 60, PRODUCTOS)],
+            "categoria3": [f"Rubro {i}" for i in rng.integers(0, 300, PRODUCTOS)],
+        }
+    ).to_csv(directorio / "productos.csv", index=False)
+
+    sucursales = pd.read_csv(directorio / "sucursales.csv").drop_duplicates(["comercioId", "provincia"])
+    sucursal_id = np.repeat(sucursales["id"].to_numpy(), PRODUCTOS)
+    producto_id = np.tile(ids, len(sucursales))
+    precio = rng.uniform(100, 20000, len(sucursal_id)).round(2)
+    for dia in pd.date_range("2026-01-01", periods=SNAPSHOTS + 1):
+        precio = (precio * rng.choice([1, 1, 1, 1.05], len(precio))).round(2)
+        relevados = rng.random(len(precio)) < 0.9
+        pd.DataFrame(
+            {"sucursal_id": sucursal_id[relevados], "producto_id": producto_id[relevados], "precio": precio[relevados]}
+        ).to_csv(directorio / f"precios_{dia:%Y%m%d}.csv", index=False)
+
+
+def medir(nombre, funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    print(f"{nombre:40} {time.perf_counter() - inicio:8.2f}s")
+    return resultado
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    directorio = Path(tmp)
+    generar(directorio)
+    ultimo = sorted(directorio.glob("precios_*.csv"))[-1]
+    shutil.move(ultimo, directorio / "nuevo")
+    largo = helpers.read_precios_largo(directorio, cache=True)
+    print(f"{SNAPSHOTS} snapshots, {len(largo):,} precios")
+
+    completos = medir("calcular_indices (vectorizado)", lambda: indices.calcular_indices(directorio, cache=True))
+    medir("actualizar_indices (primera vez)", lambda: indices.actualizar_indices(directorio, cache=True))
+    medir("read_indices (indices.csv)", lambda: indices.read_indices(directorio))
+    shutil.move(directorio / "nuevo", ultimo)
+    medir("actualizar_indices (un snapshot nuevo)", lambda: indices.actualizar_indices(directorio, cache=True))
+    print(f"{len(completos):,} indices")
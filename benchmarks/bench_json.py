@@ -0,0 +1,41 @@
+"""
+Compara el decodificado de una pagina de productos de la API
+con ``json`` (sobre ``response.text``, como antes) vs los decodificadores
+de ``preciosclaros.decoders`` sobre ``response.body``.
+
+    $ python benchmarks/bench_json.py
+"""
+import json
+import random
+import timeit
+
+from preciosclaros.decoders import DECODIFICADORES, filas_productos
+
+random.seed(0)
+productos = [
+    {
+        "id": str(7790000000000 + random.randrange(10**9)),
+        "nombre": f"Producto de prueba {i}",
+        "presentacion": "500.0 gr",
+        "marca": random.choice(["ARCOR", "LA SERENISIMA", "MOLTO", "COCA COLA"]),
+        "precio": round(random.uniform(10, 5000), 2),
+        "precioMax": round(random.uniform(10, 5000), 2),
+        "precioMin": round(random.uniform(10, 5000), 2),
+    }
+    for i in range(100)
+]
+body = json.dumps({"total": 10000, "maxLimitPermitido": 100, "productos": productos}).encode()
+N = 2000
+
+
+def stdlib_text():
+    data = json.loads(body.decode("utf-8"))
+    return [dict(p) for p in data["productos"]]
+
+
+print(f"pagina de {len(productos)} productos, {len(body)} bytes, {N} repeticiones")
+t = timeit.timeit(stdlib_text, number=N)
+print(f"{'json.loads(text) + dicts':28} {N * len(productos) / t:12,.0f} productos/s")
+for nombre, decodificar in DECODIFICADORES.items():
+    t = timeit.timeit(lambda: filas_productos(decodificar(body)["productos"]), number=N)
+    print(f"{nombre + '(body) + filas':28} {N * len(productos) / t:12,.0f} productos/s")
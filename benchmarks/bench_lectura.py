@@ -0,0 +1,55 @@
+"""
+Lectura de un dataset sintetico de varios CSV de precios: la lectura original
+(``leer_csv`` archivo por archivo, tipos inferidos) vs ``leer_varios`` con tipos
+explicitos y el motor mas rapido, en uno y en varios procesos.
+
+    $ python benchmarks/bench_lectura.py [archivos] [filas_por_archivo] [jobs]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from lectura import MOTOR, leer_csv, leer_varios
+
+ARCHIVOS = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+FILAS = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+JOBS = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+KWARGS = {"parse_dates": ["fecha_relevamiento"], "index_col": None, "header": 0}
+
+
+def generar(directorio):
+    random.seed(0)
+    for n in range(ARCHIVOS):
+        with (directorio / f"precio-{n + 1}-{ARCHIVOS}.csv").open("w") as f:
+            f.write("sucursal_id,producto_id,precio,precio_max,precio_min,fecha_relevamiento\n")
+            for _ in range(FILAS):
+                precio = round(random.uniform(10, 5000), 2)
+                f.write(
+                    f"{random.randrange(100)}-1-{random.randrange(2000)},{7790000000000 + random.randrange(10**6)},"
+                    f"{precio},{precio},{precio},2026-10-18 12:{random.randrange(60):02d}:00.000000\n"
+                )
+
+
+def medir(nombre, leer):
+    inicio = time.perf_counter()
+    frame = pd.concat(leer(), axis=0, ignore_index=True)
+    t = time.perf_counter() - inicio
+    print(f"{nombre:40} {t:8.2f}s {len(frame) / t:12,.0f} filas/s")
+    return frame
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    directorio = Path(tmp)
+    generar(directorio)
+    paths = sorted(directorio.glob("precio-*.csv"))
+    print(f"{ARCHIVOS} archivos x {FILAS:,} filas, motor {MOTOR}, {os.cpu_count()} CPUs")
+
+    original = medir("leer_csv (secuencial)", lambda: (leer_csv(f, **KWARGS) for f in paths))
+    medir("leer_varios (jobs=1)", lambda: leer_varios(paths, 1, **KWARGS))
+    paralelo = medir(f"leer_varios (jobs={JOBS})", lambda: leer_varios(paths, JOBS, **KWARGS))
+    assert original.to_csv(index=False) == paralelo.to_csv(index=False)
@@ -0,0 +1,82 @@
+"""
+Memoria del frame normalizado de ``helpers.read_precios`` con los tipos de ``esquema.py``
+vs los tipos que infiere pandas (texto y float64), sobre un dataset sintetico.
+
+    $ python benchmarks/bench_memoria.py [snapshots] [sucursales] [productos]
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import esquema
+import helpers
+
+SNAPSHOTS = int(sys.argv[1]) if len(sys.argv) > 1 else 14
+SUCURSALES = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+PRODUCTOS = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+rng = np.random.default_rng(0)
+
+
+def generar(directorio):
+    provincias = list(helpers.iso_codes)
+    comercios = rng.integers(1, 40, SUCURSALES)
+    pd.DataFrame(
+        {
+            "id": [f"{c}-1-{i}" for i, c in enumerate(comercios)],
+            "comercioId": comercios,
+            "banderaId": 1,
+            "banderaDescripcion": [f"Supermercados {c}" for c in comercios],
+            "provincia": rng.choice(provincias, SUCURSALES),
+        }
+    ).to_csv(directorio / "sucursales.csv", index=False)
+
+    ids = 7790000000000 + np.arange(PRODUCTOS)
+    categorias = [f"Categoria {i}" for i in range(12)]
+    pd.DataFrame(
+        {
+            "id": ids,
+            "marca": [f"Marca {i}" for i in rng.integers(0, 800, PRODUCTOS)],
+            "nombre": [f"Producto de ejemplo numero {i}" for i in range(PRODUCTOS)],
+            "categoria1": rng.choice(categorias, PRODUCTOS),
+            "categoria2": rng.choice(categorias, PRODUCTOS),
+            "categoria3": rng.choice(categorias, PRODUCTOS),
+        }
+    ).to_csv(directorio / "productos.csv", index=False)
+
+    # un precio por cadena, provincia y producto, que cambia un poco cada dia
+    sucursales = pd.read_csv(directorio / "sucursales.csv").drop_duplicates(["comercioId", "provincia"])
+    sucursal_id = np.repeat(sucursales["id"].to_numpy(), PRODUCTOS)
+    producto_id = np.tile(ids, len(sucursales))
+    precio = rng.uniform(100, 20000, len(sucursal_id)).round(2)
+    for dia in pd.date_range("2026-01-01", periods=SNAPSHOTS):
+        precio = (precio * rng.choice([1, 1, 1, 1.05], len(precio))).round(2)
+        pd.DataFrame({"sucursal_id": sucursal_id, "producto_id": producto_id, "precio": precio}).to_csv(
+            directorio / f"precios_{dia:%Y%m%d}.csv", index=False
+        )
+
+
+def inferidos(frame):
+    """
+    Los tipos que tenia el frame antes del esquema: texto, enteros y float64.
+    """
+    tipos = {}
+    for columna, tipo in frame.dtypes.items():
+        if isinstance(tipo, pd.CategoricalDtype):
+            tipos[columna] = tipo.categories.dtype
+        elif tipo == esquema.TIPO_PRECIO:
+            tipos[columna] = "float64"
+    return frame.astype(tipos)
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    directorio = Path(tmp)
+    generar(directorio)
+    precios = helpers.read_precios(directorio)
+    antes = inferidos(precios).memory_usage(deep=True).sum()
+    despues = precios.memory_usage(deep=True).sum()
+    print(f"{SNAPSHOTS} snapshots, {len(precios):,} filas x {len(precios.columns)} columnas")
+    print(f"tipos inferidos {antes / 2**20:10.1f} MB")
+    print(f"esquema         {despues / 2**20:10.1f} MB  ({antes / despues:.1f}x menos)")
@@ -1,7 +1,15 @@
 import argparse
+import gzip
+import math
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from esquema import concatenar
+from lectura import guardar_manifiesto, leer_csv_por_partes, leer_manifiesto, leer_varios, pendientes
+
 parser = argparse.ArgumentParser()
 parser.add_argument(
     "src_path",
@@ -10,20 +18,243 @@ parser.add_argument(
     help="Path to files to be merged; enclose in quotes, accepts * as wildcard for directories or filenames",
 )
 parser.add_argument("-o", type=str, default="precios_{date_from}_{date_to}.csv", help="Output csv")
-args = parser.parse_args()
+parser.add_argument(
+    "--memoria",
+    type=int,
+    default=0,
+    help="Memoria máxima aproximada en MB. Consolida por partes usando archivos temporales (0: todo en memoria)",
+)
+parser.add_argument("--tmp", type=str, default=None, help="Directorio para los temporales de --memoria")
+parser.add_argument(
+    "--manifiesto",
+    type=str,
+    default=None,
+    help="Manifiesto JSON de los archivos ya consolidados: sólo se suman al consolidado los archivos nuevos",
+)
+parser.add_argument(
+    "--jobs",
+    type=int,
+    default=1,
+    help="Procesos para leer los archivos en paralelo (0: uno por CPU). No se combina con --memoria",
+)
+
+# se deja un solo precio por cadena y producto
+CLAVE = ["cadena", "precio", "producto_id"]
+DESCARTAR = ["fecha_relevamiento", "precio_max", "precio_min"]
+ORDEN = ["producto_id", "sucursal_id"]
+
+# estimacion holgada de lo que ocupa en memoria una fila leida con pandas,
+# y de cuanto crece un CSV (o uno comprimido) al leerlo
+BYTES_POR_FILA = 400
+EXPANSION = {".gz": 20, ".zst": 20}
+EXPANSION_CSV = 4
+
+
+def consolidar(all_files, jobs=1, base=None):
+    """
+    Consolidacion en memoria: devuelve el frame final y el rango de fechas de ``all_files``.
+    Con ``base`` (un consolidado anterior) sus filas van primero.
+    """
+    datasets = leer_varios(all_files, jobs, parse_dates=["fecha_relevamiento"], index_col=None, header=0)
+    frame = concatenar(datasets, axis=0, ignore_index=True)
+    date_from = frame.fecha_relevamiento.min().strftime("%Y%m%d")
+    date_to = frame.fecha_relevamiento.max().strftime("%Y%m%d")
+    if base is not None:
+        frame = concatenar(leer_varios([base], index_col=None, header=0) + [frame], axis=0, ignore_index=True)
+
+    # dejar solo un valor por sucursal
+    frame["cadena"] = frame.sucursal_id.str.rpartition("-")[0]
+    frame = frame.drop_duplicates(CLAVE)
+
+    frame = frame.drop(["cadena"] + DESCARTAR, axis=1)
+    frame = frame.sort_values(by=ORDEN)
+    return frame, date_from, date_to
+
+
+def tipo_comun(tipos):
+    """
+    El dtype que resulta de concatenar columnas con ``tipos``, como en ``pd.concat``.
+    """
+    tipos = set(tipos)
+    if len(tipos) == 1:
+        return tipos.pop()
+    if all(t.kind in "iuf" for t in tipos):
+        return np.result_type(*tipos)
+    return np.dtype(object)
+
+
+def como_texto(columna):
+    # valores iguales para pandas (10 y 10.0) tienen que ir a la misma particion
+    if pd.api.types.is_numeric_dtype(columna):
+        columna = columna.astype(float)
+    return columna.astype(str)
+
+
+def particion(parte, particiones):
+    clave = pd.DataFrame({c: como_texto(parte[c]) for c in CLAVE})
+    return pd.util.hash_pandas_object(clave, index=False).to_numpy() % particiones
+
+
+def particionar(all_files, tmp, particiones, chunksize, base=None):
+    """
+    Fase 1: lee los archivos de a partes y reparte las filas en ``particiones``
+    segun un hash de ``CLAVE``, de manera que los duplicados caen en la misma.
+    El indice de cada fila es su posicion global (para conservar la primera aparicion).
+    """
+    tipos = {}
+    fechas = []
+    piezas = [0] * particiones
+    inicio = 0
+    lecturas = [
+        leer_csv_por_partes(f, chunksize, parse_dates=["fecha_relevamiento"], index_col=None, header=0)
+        for f in all_files
+    ]
+    if base is not None:
+        # el consolidado anterior ya no tiene fechas y va primero
+        lecturas.insert(0, leer_csv_por_partes(base, chunksize, index_col=None, header=0))
+    for lectura in lecturas:
+        for parte in lectura:
+            if parte.empty:
+                continue
+            if "fecha_relevamiento" in parte:
+                fechas += [parte.fecha_relevamiento.min(), parte.fecha_relevamiento.max()]
+            parte["cadena"] = parte.sucursal_id.str.rpartition("-")[0]
+            parte = parte.drop(DESCARTAR, axis=1, errors="ignore")
+            parte.index = pd.RangeIndex(inicio, inicio + len(parte))
+            inicio += len(parte)
+            for columna, tipo in parte.dtypes.items():
+                tipos.setdefault(columna, []).append(tipo)
+            for p, pieza in parte.groupby(particion(parte, particiones), sort=False):
+                pieza.to_pickle(tmp / f"p{p}-{piezas[p]:06d}.pkl")
+                piezas[p] += 1
+    tipos = {columna: tipo_comun(t) for columna, t in tipos.items()}
+    return tipos, min(fechas).strftime("%Y%m%d"), max(fechas).strftime("%Y%m%d")
+
+
+def ordenar_particiones(tmp, particiones, tipos, bloque):
+    """
+    Fase 2: deduplica cada particion y la guarda ordenada en bloques de ``bloque`` filas.
+    Devuelve los paths de los bloques de cada particion.
+    """
+    corridas = []
+    for p in range(particiones):
+        piezas = sorted(tmp.glob(f"p{p}-*.pkl"))
+        if not piezas:
+            continue
+        frame = pd.concat([pd.read_pickle(pieza) for pieza in piezas]).astype(tipos)
+        for pieza in piezas:
+            pieza.unlink()
+        frame = frame.drop_duplicates(CLAVE).drop("cadena", axis=1)
+        frame["_orden"] = frame.index
+        frame = frame.sort_values(by=ORDEN + ["_orden"])
+        bloques = []
+        for i in range(0, len(frame), bloque):
+            bloques.append(tmp / f"r{p}-{len(bloques):06d}.pkl")
+            frame.iloc[i : i + bloque].to_pickle(bloques[-1])
+        corridas.append(iter(bloques))
+    return corridas
+
+
+def hasta(frame, limite):
+    """
+    Filas de ``frame`` (ordenado) cuya clave ``ORDEN + _orden`` es menor o igual a ``limite``.
+    """
+    producto_id, sucursal_id, orden = limite
+    return (frame.producto_id < producto_id) | (
+        (frame.producto_id == producto_id)
+        & ((frame.sucursal_id < sucursal_id) | ((frame.sucursal_id == sucursal_id) & (frame._orden <= orden)))
+    )
+
+
+def mezclar(corridas, salida):
+    """
+    Fase 3: merge de las particiones ordenadas. En cada paso se escriben las filas
+    hasta la menor de las ultimas claves de los bloques actuales, que ya no pueden
+    tener otra fila menor en ningun bloque siguiente.
+    """
+    actuales = {}
+    for i, corrida in enumerate(corridas):
+        actuales[i] = pd.read_pickle(next(corrida))
+    header = True
+    while actuales:
+        limite = min(
+            (b.producto_id.iat[-1], b.sucursal_id.iat[-1], b._orden.iat[-1]) for b in actuales.values()
+        )
+        salen = []
+        for i, b in list(actuales.items()):
+            mascara = hasta(b, limite)
+            salen.append(b[mascara])
+            if mascara.all():
+                siguiente = next(corridas[i], None)
+                if siguiente is None:
+                    del actuales[i]
+                else:
+                    actuales[i] = pd.read_pickle(siguiente)
+            else:
+                actuales[i] = b[~mascara]
+        frame = pd.concat(salen).sort_values(by=ORDEN + ["_orden"]).drop("_orden", axis=1)
+        frame.to_csv(salida, index=False, header=header)
+        header = False
+
+
+def consolidar_por_partes(all_files, memoria, output, tmp=None, base=None, rango=None):
+    """
+    Consolidacion con memoria acotada (``memoria`` bytes aprox.): particiona por hash
+    a disco, deduplica y ordena cada particion y las mezcla con un merge externo.
+    El resultado es el mismo que el de ``consolidar``. Devuelve el path escrito y el
+    rango de fechas, que incluye ``rango`` (el del consolidado ``base``).
+    """
+    all_files = list(all_files)
+    entradas = all_files + ([Path(base)] if base is not None else [])
+    estimado = sum(f.stat().st_size * EXPANSION.get(f.suffix, EXPANSION_CSV) for f in entradas)
+    # cada particion (y su copia al deduplicar) tiene que entrar en memoria
+    particiones = max(1, math.ceil(2 * estimado / memoria))
+    chunksize = max(10_000, memoria // BYTES_POR_FILA // 2)
+    bloque = max(1_000, chunksize // (particiones + 1))
+
+    tmp = Path(tempfile.mkdtemp(prefix="consolidar-", dir=tmp))
+    try:
+        tipos, date_from, date_to = particionar(all_files, tmp, particiones, chunksize, base)
+        if rango is not None:
+            date_from, date_to = min(date_from, rango[0]), max(date_to, rango[1])
+        corridas = ordenar_particiones(tmp, particiones, tipos, bloque)
+        output = output.format(date_from=date_from, date_to=date_to)
+        abrir = gzip.open if output.endswith(".gz") else open
+        with abrir(output, "wt", newline="") as salida:
+            mezclar(corridas, salida)
+    finally:
+        shutil.rmtree(tmp)
+    return output, date_from, date_to
 
-all_files = Path(".").glob(args.src_path)
 
-datasets = (pd.read_csv(f, parse_dates=["fecha_relevamiento"], index_col=None, header=0) for f in all_files)
-frame = pd.concat(datasets, axis=0, ignore_index=True)
-date_from = frame.fecha_relevamiento.min().strftime("%Y%m%d")
-date_to = frame.fecha_relevamiento.max().strftime("%Y%m%d")
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.memoria and args.jobs != 1:
+        # la lectura por partes es secuencial: conserva el orden global de las filas
+        parser.error("--jobs no se puede combinar con --memoria")
+    all_files = list(Path(".").glob(args.src_path))
 
-# dejar solo un valor por sucursal
-frame["cadena"] = frame.sucursal_id.str.rpartition("-")[0]
-frame = frame.drop_duplicates(["cadena", "precio", "producto_id"])
+    base = rango = None
+    if args.manifiesto:
+        # se suman los archivos nuevos al consolidado anterior, con las mismas reglas
+        manifiesto = leer_manifiesto(args.manifiesto)
+        base, all_files = pendientes(manifiesto, all_files)
+        if base is not None:
+            if not all_files:
+                parser.exit(message="No hay archivos nuevos para consolidar\n")
+            rango = manifiesto["date_from"], manifiesto["date_to"]
 
-frame = frame.drop(["cadena", "fecha_relevamiento", "precio_max", "precio_min"], axis=1)
-frame = frame.sort_values(by=["producto_id", "sucursal_id"])
+    if args.memoria:
+        output, date_from, date_to = consolidar_por_partes(
+            all_files, args.memoria * 2**20, args.o, args.tmp, base, rango
+        )
+    else:
+        frame, date_from, date_to = consolidar(all_files, args.jobs, base)
+        if rango is not None:
+            date_from, date_to = min(date_from, rango[0]), max(date_to, rango[1])
+        output = args.o.format(date_from=date_from, date_to=date_to)
+        frame.to_csv(output, index=False)
 
-frame.to_csv(args.o.format(date_from=date_from, date_to=date_to), index=False)
+    if args.manifiesto:
+        manifiesto.update(salida=output, date_from=date_from, date_to=date_to)
+        guardar_manifiesto(args.manifiesto, manifiesto)
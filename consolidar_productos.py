@@ -1,7 +1,8 @@
 import argparse
 import pandas as pd
-from itertools import chain
-from pathlib import Path
+
+from esquema import concatenar
+from lectura import expandir, guardar_manifiesto, leer_manifiesto, leer_varios, pendientes
 
 
 parser = argparse.ArgumentParser()
@@ -18,20 +19,39 @@ parser.add_argument(
     default="productos.csv",
     help="Output csv",
 )
+parser.add_argument("--jobs", type=int, default=1, help="Procesos para leer los archivos en paralelo (0: uno por CPU)")
+parser.add_argument(
+    "--manifiesto",
+    type=str,
+    default=None,
+    help="Manifiesto JSON de los archivos ya consolidados: sólo se suman al consolidado los archivos nuevos",
+)
 
 
-args = parser.parse_args()
+if __name__ == "__main__":
+    args = parser.parse_args()
 
-all_files = chain.from_iterable(
-    Path('.').glob(p) if not p.startswith("/") else [Path(p)] for p in args.src_path
-)
+    all_files = expandir(args.src_path)
+
+    if args.manifiesto:
+        # se suman los archivos nuevos al consolidado anterior, con las mismas reglas
+        manifiesto = leer_manifiesto(args.manifiesto)
+        base, all_files = pendientes(manifiesto, all_files)
+        if base is not None:
+            if not all_files:
+                parser.exit(message="No hay archivos nuevos para consolidar\n")
+            all_files = [base] + all_files
+
+    datasets = leer_varios(all_files, args.jobs, index_col=None, header=0)
 
-datasets = (pd.read_csv(f, index_col=None, header=0) for f in all_files)
+    frame = concatenar(datasets, axis=0, ignore_index=True, sort=True).drop_duplicates(["id"]).sort_values(by="id")
 
-frame = pd.concat(datasets, axis=0, ignore_index=True, sort=True).drop_duplicates(["id"]).sort_values(by="id")
+    target_cols = "id,marca,nombre,presentacion".split(",")
+    rest_cols = list(sorted(set(frame.columns) - set(target_cols)))
+    frame = frame.reindex(target_cols + rest_cols, axis=1)
 
-target_cols = "id,marca,nombre,presentacion".split(",")
-rest_cols = list(sorted(set(frame.columns) - set(target_cols)))
-frame = frame.reindex(target_cols + rest_cols, axis=1)
+    frame.to_csv(args.o, index=False)
 
-frame.to_csv(args.o, index=False)
+    if args.manifiesto:
+        manifiesto["salida"] = args.o
+        guardar_manifiesto(args.manifiesto, manifiesto)
@@ -2,6 +2,9 @@ import argparse
 import pandas as pd
 from pathlib import Path
 
+from esquema import concatenar
+from lectura import guardar_manifiesto, leer_manifiesto, leer_varios, pendientes
+
 parser = argparse.ArgumentParser()
 parser.add_argument(
     "src_path",
@@ -15,16 +18,40 @@ parser.add_argument(
     default="sucursales.csv",
     help="Output csv",
 )
+parser.add_argument("--jobs", type=int, default=1, help="Procesos para leer los archivos en paralelo (0: uno por CPU)")
+parser.add_argument(
+    "--manifiesto",
+    type=str,
+    default=None,
+    help="Manifiesto JSON de los archivos ya consolidados: sólo se suman al consolidado los archivos nuevos",
+)
+
 
+if __name__ == "__main__":
+    args = parser.parse_args()
 
-args = parser.parse_args()
+    all_files = Path(".").glob(args.src_path)
 
-all_files = Path(".").glob(args.src_path)
+    if args.manifiesto:
+        # se suman los archivos nuevos al consolidado anterior, con las mismas reglas
+        manifiesto = leer_manifiesto(args.manifiesto)
+        base, all_files = pendientes(manifiesto, all_files)
+        if base is not None:
+            if not all_files:
+                parser.exit(message="No hay archivos nuevos para consolidar\n")
+            all_files = [base] + all_files
 
-datasets = (pd.read_csv(f, index_col=None, header=0) for f in all_files)
+    datasets = leer_varios(all_files, args.jobs, index_col=None, header=0)
 
-frame = pd.concat(datasets, axis=0, ignore_index=True).drop_duplicates().sort_values(by="id")
+    # las columnas de salida se eligen antes de deduplicar, para comparar igual las filas
+    # de los archivos del scraper y las del consolidado anterior (que no tiene sucursalId).
+    # sucursalId es la ultima parte de id, asi que las filas repetidas son las mismas que con esa columna
+    frame = concatenar(datasets, axis=0, ignore_index=True)
+    frame = frame["id,comercioId,banderaId,banderaDescripcion,comercioRazonSocial,provincia,localidad,direccion,lat,lng,sucursalNombre,sucursalTipo".split(",")]
+    frame = frame.drop_duplicates().sort_values(by="id")
 
-frame = frame["id,comercioId,banderaId,banderaDescripcion,comercioRazonSocial,provincia,localidad,direccion,lat,lng,sucursalNombre,sucursalTipo".split(",")]
+    frame.to_csv(args.o, index=False)
 
-frame.to_csv(args.o, index=False)
+    if args.manifiesto:
+        manifiesto["salida"] = args.o
+        guardar_manifiesto(args.manifiesto, manifiesto)
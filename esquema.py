@@ -0,0 +1,87 @@
+"""
+Esquema de tipos compartido por ``helpers.py``, ``lectura.py`` y los scripts de consolidación.
+
+El texto de baja cardinalidad (provincias, cadenas, marcas, categorias) y los ids de texto
+de sucursales se guardan como categoricas: un codigo entero por fila y cada valor distinto una
+sola vez. Los ids de producto son numericos y se dejan como enteros (o categoricas de enteros
+en los frames normalizados). Los precios de los frames para analizar van en ``float32``.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# texto repetitivo en sucursales, productos y frames normalizados (los nombres de productos
+# se repiten en cada provincia y cadena)
+CATEGORICAS = [
+    "provincia",
+    "cadena",
+    "marca",
+    "nombre",
+    "presentacion",
+    "banderaDescripcion",
+    "comercioRazonSocial",
+    "localidad",
+    "sucursalTipo",
+    "categoria1",
+    "categoria2",
+    "categoria3",
+    "id_prov",
+    "sucursal_id",
+]
+
+PRECIOS = ["precio", "precio_max", "precio_min"]
+
+# precios de los frames normalizados: 7 digitos significativos alcanzan para analizar
+# y ocupan la mitad. Los scripts de consolidación leen float64 para escribir exactamente
+# los mismos valores.
+TIPO_PRECIO = np.float32
+
+# tipos para leer los CSV (``pd.read_csv(..., dtype=DTYPES)``); las columnas ausentes se ignoran
+DTYPES = {
+    **{columna: "category" for columna in CATEGORICAS},
+    **{columna: "float64" for columna in PRECIOS},
+    "lat": "float64",
+    "lng": "float64",
+}
+
+
+def sin_categoricas(dtypes):
+    """
+    ``dtypes`` con texto comun en lugar de categoricas, para leer de a partes
+    (cada parte tendria categorias distintas).
+    """
+    return {columna: "str" if tipo == "category" else tipo for columna, tipo in dtypes.items()}
+
+
+def concatenar(frames, **kwargs):
+    """
+    ``pd.concat`` que conserva las categoricas: si las categorias difieren entre frames
+    ``pd.concat`` las convierte a object, asi que antes se unifican (ordenadas, para que
+    ordenar por la columna sea lo mismo que ordenar el texto).
+    """
+    frames = list(frames)
+    columnas = {c for frame in frames for c, tipo in frame.dtypes.items() if isinstance(tipo, pd.CategoricalDtype)}
+    for columna in columnas:
+        valores = [frame[columna] for frame in frames if columna in frame]
+        if not all(isinstance(v.dtype, pd.CategoricalDtype) for v in valores):
+            continue
+        if all(v.dtype == valores[0].dtype for v in valores):
+            # mismas categorias: pd.concat ya las conserva
+            continue
+        tipo = pd.CategoricalDtype(union_categoricals(valores, sort_categories=True).categories)
+        frames = [frame.astype({columna: tipo}) if columna in frame else frame for frame in frames]
+    return pd.concat(frames, **kwargs)
+
+
+def compactar(frame):
+    """
+    Pasa las columnas conocidas de ``frame`` a los tipos del esquema
+    (categoricas y precios ``TIPO_PRECIO``).
+    """
+    tipos = {}
+    for columna, tipo in frame.dtypes.items():
+        if columna in CATEGORICAS and not isinstance(tipo, pd.CategoricalDtype):
+            tipos[columna] = "category"
+        elif (columna in PRECIOS or columna.startswith(("precio_", "variacion"))) and tipo.kind == "f":
+            tipos[columna] = TIPO_PRECIO
+    return frame.astype(tipos)
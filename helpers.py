@@ -1,7 +1,12 @@
 from pathlib import Path
-import functools
+import json
 from subprocess import run
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+
+import esquema
+from lectura import MOTOR, leer_csv
 
 iso_codes = {
     "AR-A": "Salta",
@@ -31,6 +36,10 @@ iso_codes = {
 }
 
 
+# se incrementa si cambia el formato de la cache de read_precios_largo()
+CACHE_VERSION = 2
+
+
 def download_data():
     run(["kaggle", "datasets", "download", "--unzip", "tinnqn/precios-claros-precios-de-argentina"])
 
@@ -42,17 +51,95 @@ def sucursales_prov(path):
     Tambien se reemplazan los códigos de las provincias por su nombre.
     De esta manera precios de distintas sucursales pueden ser comparables
     """
-    sucursales = pd.read_csv(path / "sucursales.csv")
+    sucursales = pd.read_csv(path / "sucursales.csv", dtype=esquema.DTYPES)
     sucursales_prov = sucursales[["id", "provincia", "banderaDescripcion"]]
     sucursales_prov = sucursales_prov.rename(columns={"banderaDescripcion": "cadena"})
-    sucursales_prov.replace({"provincia": iso_codes}, inplace=True)
+    sucursales_prov["provincia"] = sucursales_prov["provincia"].cat.rename_categories(lambda c: iso_codes.get(c, c))
     sucursales_prov["id_prov"] = (
-        sucursales["comercioId"].astype(str) + "-" + sucursales["banderaId"].astype(str) + "-" + sucursales["provincia"]
-    )
+        sucursales["comercioId"].astype(str)
+        + "-"
+        + sucursales["banderaId"].astype(str)
+        + "-"
+        + sucursales["provincia"].astype(str)
+    ).astype("category")
     sucursales_prov.set_index("id", inplace=True)
     return sucursales_prov
 
 
+def expandir_gemelas(precios, gemelas):
+    """
+    Agrega a ``precios`` las filas de las sucursales gemelas
+    (``sucursalgemela-*.csv`` del scraper con ``-a gemelas=1``),
+    copiando los precios de su sucursal de referencia.
+    """
+    copias = pd.merge(
+        gemelas[["sucursal_id", "referencia_id"]],
+        precios.rename(columns={"sucursal_id": "referencia_id"}),
+        on="referencia_id",
+    ).drop("referencia_id", axis=1)
+    return pd.concat([precios, copias[precios.columns]], ignore_index=True)
+
+
+def manifiestos(path="data"):
+    """
+    Manifiestos de las corridas con ``-a solo_cambios=...``, ordenados por fecha de fin.
+    """
+    leidos = [json.loads(f.read_text()) for f in Path(path).glob("manifiesto-*.json")]
+    return sorted(leidos, key=lambda m: m["fin"])
+
+
+def reconstruir_precios(path="data", fecha=None):
+    """
+    Rearma el listado completo de precios vigente a ``fecha`` (por defecto el fin de
+    la ultima corrida) a partir de los precios que cambiaron (``precio-*``) y las bajas
+    (``baja-*``) de las corridas con ``-a solo_cambios=...``.
+
+    Para cada ``(sucursal_id, producto_id)`` queda el ultimo precio relevado hasta ``fecha``,
+    salvo que despues se haya dado de baja.
+    """
+    path = Path(path)
+    if fecha is None:
+        fecha = manifiestos(path)[-1]["fin"]
+    fecha = pd.Timestamp(fecha)
+    clave = ["sucursal_id", "producto_id"]
+
+    precios = pd.concat(
+        [leer_csv(f, dtype={"sucursal_id": str, "producto_id": str}) for f in path.glob("precio-*.csv*")]
+        + [pd.read_parquet(f) for f in path.glob("precio-*.parquet")],
+        ignore_index=True,
+    )
+    precios["fecha_relevamiento"] = pd.to_datetime(precios["fecha_relevamiento"])
+    precios = (
+        precios[precios["fecha_relevamiento"] <= fecha]
+        .sort_values("fecha_relevamiento", kind="stable")
+        .drop_duplicates(clave, keep="last")
+    )
+
+    bajas = [leer_csv(f, dtype={"sucursal_id": str, "producto_id": str}) for f in path.glob("baja-*.csv")]
+    if bajas:
+        bajas = pd.concat(bajas, ignore_index=True)
+        bajas["fecha"] = pd.to_datetime(bajas["fecha"])
+        bajas = bajas[bajas["fecha"] <= fecha].groupby(clave)["fecha"].max().reset_index()
+        precios = precios.merge(bajas, on=clave, how="left")
+        # una baja posterior al ultimo precio relevado saca al producto de la sucursal
+        precios = precios[~(precios["fecha"] > precios["fecha_relevamiento"])].drop("fecha", axis=1)
+
+    return precios.sort_values(clave).reset_index(drop=True)
+
+
+def escribir_snapshots(path="data", destino="."):
+    """
+    Escribe un ``precios_{fecha}.csv`` por corrida con ``-a solo_cambios=...``
+    (el listado completo de esa fecha), en el formato que lee ``read_precios``.
+    """
+    for manifiesto in manifiestos(path):
+        fin = pd.Timestamp(manifiesto["fin"])
+        precios = reconstruir_precios(path, fin)
+        precios[["sucursal_id", "producto_id", "precio"]].to_csv(
+            Path(destino) / f"precios_{fin:%Y%m%d}.csv", index=False
+        )
+
+
 def read_precio(f, sucursales_df):
     """
     devuelve el dataset de precios del CSV "f", cruzado con
@@ -61,47 +148,239 @@ def read_precio(f, sucursales_df):
     La columna precio se renombra a precio_{fecha} donde fecha se extrae
     del nombre del archivo.
     """
-    fecha = f.name.split("_")[-1][:-4]
-    precio = pd.read_csv(f)
+    fecha = fecha_archivo(f)
+    precio = esquema.compactar(pd.read_csv(f, dtype=esquema.DTYPES))
     precio = precio.rename(columns={"precio": f"precio_{fecha}"})
     precio = precio.join(sucursales_df, on="sucursal_id")
     return precio
 
 
-def read_precios(path="."):
+def fecha_archivo(f):
+    return f.name.split("_")[-1][:-4]
+
+
+def leer_snapshot(f, codigo_prov, producto_ids=None):
+    """
+    Lee un precios_*.csv y devuelve los codigos de id_prov, los producto_id y los precios,
+    con un unico precio por id_prov y producto (el primero).
+    Sólo quedan las sucursales de ``codigo_prov`` y, si se indican, los ``producto_ids``.
+    """
+    precio = leer_csv(f, usecols=["sucursal_id", "producto_id", "precio"], engine=MOTOR)
+    if producto_ids is not None:
+        precio = precio[precio["producto_id"].isin(producto_ids)]
+    precio["id_prov"] = precio["sucursal_id"].map(codigo_prov)
+    precio = precio.dropna(subset=["id_prov", "producto_id", "precio"])
+    precio = precio.drop_duplicates(["id_prov", "producto_id"])
+    return precio["id_prov"].to_numpy(np.int32), precio["producto_id"], precio["precio"].to_numpy(esquema.TIPO_PRECIO)
+
+
+def firma(f):
+    stat = f.stat()
+    return [f.name, stat.st_size, stat.st_mtime_ns]
+
+
+def como_array(index):
+    # np.save sin pickle: los valores no numericos se guardan como texto
+    valores = np.asarray(index)
+    return valores.astype(str) if valores.dtype == object else valores
+
+
+def precios_cache(here, directorio, archivos, codigo_prov):
+    """
+    Cache de read_precios_largo(): por cada snapshot guarda en ``directorio/precios_largo`` los codigos
+    de id_prov y producto_id y los precios como .npy. Sólo se leen los CSV nuevos o modificados
+    (por nombre, tamaño y mtime); si cambia sucursales.csv se rearma todo. Fuera de ``precios_largo``
+    no se escribe ni se borra nada, así que ``directorio`` puede ser compartido.
+
+    Devuelve las listas de codigos de id_prov, de producto y de precios de cada snapshot
+    de ``archivos`` (arrays abiertos con memory map, que se copian a memoria al filtrarlos
+    o concatenarlos) y los producto_id de esos codigos.
+    """
+    directorio = Path(directorio) / "precios_largo"
+    indice_path = directorio / "indice.json"
+    indice = json.loads(indice_path.read_text()) if indice_path.exists() else {}
+    if indice.get("version") != CACHE_VERSION or indice.get("sucursales") != firma(here / "sucursales.csv"):
+        # cambiaron las sucursales, y con ellas los codigos de id_prov: se borran sólo los archivos propios
+        for viejo in list(directorio.glob("*.npy")) + [indice_path]:
+            viejo.unlink(missing_ok=True)
+        indice = {"version": CACHE_VERSION, "sucursales": firma(here / "sucursales.csv"), "snapshots": {}}
+    directorio.mkdir(parents=True, exist_ok=True)
+
+    # diccionario de producto_id: solo se agregan valores al final, los codigos ya guardados no cambian
+    productos_path = directorio / "productos.npy"
+    productos = pd.Index(np.load(productos_path)) if productos_path.exists() else None
+    snapshots = indice["snapshots"]
+    for nombre in [n for n in snapshots if not (here / n).exists()]:
+        del snapshots[nombre]
+        for columna in directorio.glob(f"{Path(nombre).stem}.*.npy"):
+            columna.unlink()
+
+    for f in archivos:
+        if snapshots.get(f.name) == firma(f):
+            continue
+        id_prov, producto_id, precio = leer_snapshot(f, codigo_prov)
+        nuevos = pd.Index(producto_id.unique())
+        if productos is None:
+            productos = nuevos
+        else:
+            productos = productos.append(nuevos[productos.get_indexer(nuevos) < 0])
+        np.save(directorio / f"{f.stem}.id_prov.npy", id_prov)
+        np.save(directorio / f"{f.stem}.producto.npy", productos.get_indexer(producto_id).astype(np.int32))
+        np.save(directorio / f"{f.stem}.precio.npy", precio)
+        snapshots[f.name] = firma(f)
+    # el diccionario antes que el indice: si se corta en el medio, los snapshots se vuelven a leer
+    if productos is not None:
+        np.save(productos_path, como_array(productos))
+    indice_path.write_text(json.dumps(indice))
+
+    columnas = [
+        [np.load(directorio / f"{f.stem}.{columna}.npy", mmap_mode="r") for f in archivos]
+        for columna in ("id_prov", "producto", "precio")
+    ]
+    return (*columnas, np.load(productos_path, mmap_mode="r"))
+
+
+def read_precios_largo(
+    path=".", sucursales=None, cache=None, desde=None, hasta=None, id_provs=None, producto_ids=None
+):
+    """
+    Lee todos los precios_*.csv en formato largo: una fila por fecha, id_prov y producto_id,
+    con su precio. Las tres claves son categoricas (codigos enteros), asi que el
+    frame ocupa poco aunque haya muchas fechas.
+
+    Si en una fecha hay varios precios para un producto en el mismo id_prov
+    queda el primero (se asume que son todos iguales, ver sucursales_prov()).
+
+    Con ``cache`` (``True`` para usar ``path/.cache`` o un directorio) los datos normalizados
+    se guardan en disco y en las siguientes llamadas sólo se leen los CSV nuevos (ver precios_cache()).
+
+    Los filtros se aplican al leer: ``desde``/``hasta`` (fechas, inclusive) descartan archivos enteros
+    por la fecha del nombre, e ``id_provs``/``producto_ids`` descartan filas de cada archivo
+    antes de juntarlos. Si ningun archivo cae entre ``desde`` y ``hasta`` el frame queda vacio.
+    """
+    here = Path(path)
+    if sucursales is None:
+        sucursales = sucursales_prov(here)
+    provs = pd.Categorical(sucursales["id_prov"])
+    codigo_prov = pd.Series(provs.codes, index=sucursales.index)
+
+    archivos = sorted(here.glob("precios_*.csv"), key=fecha_archivo)
+    if desde is not None:
+        archivos = [f for f in archivos if fecha_archivo(f) >= pd.Timestamp(desde).strftime("%Y%m%d")]
+    if hasta is not None:
+        archivos = [f for f in archivos if fecha_archivo(f) <= pd.Timestamp(hasta).strftime("%Y%m%d")]
+
+    if not archivos:
+        # ningun snapshot entre desde y hasta: frame vacio, con las columnas y tipos de siempre
+        ids_prov, precios = [np.empty(0, np.int32)], [np.empty(0, esquema.TIPO_PRECIO)]
+        producto_id = pd.Categorical([])
+    elif cache:
+        directorio = here / ".cache" if cache is True else Path(cache)
+        ids_prov, codigos, precios, productos = precios_cache(here, directorio, archivos, codigo_prov)
+        if id_provs is not None or producto_ids is not None:
+            # sobre los arrays mapeados: sólo se copian a memoria las filas elegidas
+            columnas = []
+            for columna in zip(ids_prov, codigos, precios):
+                elegidas = np.ones(len(columna[0]), dtype=bool)
+                if id_provs is not None:
+                    elegidas &= np.isin(columna[0], provs.categories.get_indexer(id_provs))
+                if producto_ids is not None:
+                    elegidas &= np.isin(columna[1], pd.Index(productos).get_indexer(producto_ids))
+                columnas.append([c[elegidas] for c in columna])
+            ids_prov, codigos, precios = zip(*columnas) if columnas else ([], [], [])
+        producto_id = pd.Categorical.from_codes(np.concatenate(codigos), categories=productos)
+    else:
+        if id_provs is not None:
+            codigo_prov = codigo_prov[sucursales["id_prov"].isin(id_provs)]
+        ids_prov, producto_ids, precios = zip(*(leer_snapshot(f, codigo_prov, producto_ids) for f in archivos))
+        producto_id = union_categoricals([pd.Categorical(p) for p in producto_ids])
+
+    largos = [len(p) for p in precios]
+    return pd.DataFrame(
+        {
+            "fecha": pd.Categorical.from_codes(
+                np.repeat(np.arange(len(largos), dtype=np.int32), largos),
+                categories=[fecha_archivo(f) for f in archivos],
+                ordered=True,
+            ),
+            "id_prov": pd.Categorical.from_codes(np.concatenate(ids_prov), categories=provs.categories),
+            "producto_id": producto_id,
+            "precio": np.concatenate(precios),
+        }
+    )
+
+
+def pivotear_precios(largo):
+    """
+    Pasa los precios de formato largo (read_precios_largo()) al ancho:
+    una fila por id_prov y producto_id, con una columna precio_{fecha} por fecha
+    (NaN si no hay precio ese dia).
+    """
+    fechas = largo["fecha"].cat.categories
+    provs = largo["id_prov"].cat.categories
+    productos = largo["producto_id"].cat.categories
+
+    clave = largo["id_prov"].cat.codes.to_numpy(np.int64) * len(productos) + largo["producto_id"].cat.codes.to_numpy()
+    claves, fila = np.unique(clave, return_inverse=True)
+    matriz = np.full((len(claves), len(fechas)), np.nan, dtype=esquema.TIPO_PRECIO)
+    matriz[fila, largo["fecha"].cat.codes.to_numpy()] = largo["precio"].to_numpy()
+
+    ancho = pd.DataFrame(matriz, columns=[f"precio_{fecha}" for fecha in fechas])
+    ancho.insert(0, "id_prov", pd.Categorical.from_codes(claves // len(productos), categories=provs))
+    ancho.insert(1, "producto_id", pd.Categorical.from_codes(claves % len(productos), categories=productos))
+    return ancho
+
+
+def read_precios(
+    path=".", cache=None, provincias=None, cadenas=None, productos=None, categorias1=None, desde=None, hasta=None
+):
     """
     Helper principal.
     Lee todo los csvs del dataset para obtener un solo frame normalizado
-    y util para analizar.
+    y util para analizar. ``cache`` como en read_precios_largo().
+
+    Se puede leer sólo una parte, filtrando mientras se lee:
+    ``provincias`` (nombres o codigos ISO, ej. "AR-X"), ``cadenas``, ``productos`` (ids),
+    ``categorias1`` y las fechas ``desde``/``hasta`` (inclusive).
     """
 
     here = Path(path)
     sucursales = sucursales_prov(here)
-    productos = pd.read_csv(here / "productos.csv")
-    precios = [read_precio(f, sucursales) for f in Path(path).glob("precios_*.csv")]
-
-    # aplico merges de todos los precios
-    def merge(left, right):
-        return (
-            pd.merge(left, right, on=["producto_id", "id_prov", "provincia"], how="inner").dropna()
-            # .drop(["sucursal_id_x", "sucursal_id_y"], axis=1)
-        )
+    df_productos = pd.read_csv(here / "productos.csv", dtype=esquema.DTYPES)
+
+    id_provs = producto_ids = None
+    if provincias is not None or cadenas is not None:
+        elegidas = sucursales
+        if provincias is not None:
+            elegidas = elegidas[elegidas["provincia"].isin([iso_codes.get(p, p) for p in provincias])]
+        if cadenas is not None:
+            elegidas = elegidas[elegidas["cadena"].isin(cadenas)]
+        id_provs = np.asarray(elegidas["id_prov"].unique())
+    if productos is not None or categorias1 is not None:
+        if productos is not None:
+            df_productos = df_productos[df_productos["id"].isin(productos)]
+        if categorias1 is not None:
+            df_productos = df_productos[df_productos["categoria1"].isin(categorias1)]
+        producto_ids = df_productos["id"]
 
-    precios = functools.reduce(merge, precios)
-    # eliminar columnas repetidas
-    precios = precios.loc[:, ~precios.columns.duplicated()]
-    precios = precios.rename(columns={"cadena_x": "cadena"})
+    largo = read_precios_largo(here, sucursales, cache, desde, hasta, id_provs, producto_ids)
+    if not len(largo["fecha"].cat.categories):
+        raise ValueError(f"No hay precios_*.csv en {here} entre {desde} y {hasta}")
 
-    # elimina columnas innecesarias.
-    # basicamente sucursal_* y cadena_y  (queda cadena, renombrada antes)
-    for c in set(precios.columns):
-        if c.startswith(("sucursal", "cadena_")):
-            precios.drop(c, axis=1, inplace=True)
+    # solo los productos con precio en todas las fechas
+    precios = pivotear_precios(largo).dropna()
+
+    # cadena y provincia de cada id_prov
+    provs = sucursales.drop_duplicates("id_prov").set_index("id_prov")
+    id_prov = precios["id_prov"].astype(str)
+    precios["cadena"] = id_prov.map(provs["cadena"])
+    precios["provincia"] = id_prov.map(provs["provincia"])
+    precios["producto_id"] = precios["producto_id"].astype(largo["producto_id"].cat.categories.dtype)
 
     # cruzamos datos con productos
     precios = pd.merge(
         precios,
-        productos[["id", "marca", "nombre", "categoria1", "categoria2", "categoria3"]],
+        df_productos[["id", "marca", "nombre", "categoria1", "categoria2", "categoria3"]],
         left_on="producto_id",
         right_on="id",
     ).drop(["id", "id_prov"], axis=1)
@@ -113,4 +392,9 @@ def read_precios(path="."):
 
     precios["variacion"] = precios[fin] - precios[inicio]
     precios["variacion_relativa"] = precios["variacion"] / precios[inicio] * 100
-    return precios
+
+    # tipos compactos (ver esquema.py): producto_id como categorica de enteros
+    precios["producto_id"] = precios["producto_id"].astype("category")
+    precios = esquema.compactar(precios)
+    # el mismo orden de filas con o sin cache
+    return precios.sort_values(["provincia", "cadena", "producto_id"], ignore_index=True)
@@ -0,0 +1,238 @@
+"""
+Indices de precios encadenados por categoria, provincia y cadena, calculados sobre
+los precios en formato largo de ``helpers.read_precios_largo()``.
+
+Para cada nivel de categoria (``categoria1``, ``categoria2``, ``categoria3``), provincia y cadena,
+y cada fecha, se comparan los precios de los productos que estan en esa fecha y en la anterior
+(mismo producto en el mismo id_prov) y se encadenan los eslabones desde 100:
+
+- ``jevons``: media geometrica de los relativos de precio.
+- ``dutot``: suma de precios actuales sobre suma de precios anteriores. Es el Laspeyres
+  que se puede calcular sin cantidades (una unidad de cada producto en la fecha anterior).
+
+Los indices se guardan en ``indices.csv`` junto a los datos, para leerlos sin recalcular:
+
+    $ python indices.py path/a/datasets/
+"""
+import argparse
+import json
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import esquema
+from helpers import fecha_archivo, firma, read_precios_largo, sucursales_prov
+from lectura import MOTOR
+
+NIVELES = ["categoria1", "categoria2", "categoria3"]
+CLAVES = ["nivel", "categoria", "provincia", "cadena"]
+
+# se incrementa si cambia el calculo o el formato de indices.csv
+INDICES_VERSION = 1
+
+
+def enlaces(largo, sucursales, productos, niveles=NIVELES):
+    """
+    Eslabones de los indices: por nivel, categoria, provincia, cadena y fecha, la cantidad de
+    ``productos`` comparados con la fecha anterior y el log de la variacion de ``jevons`` y ``dutot``.
+
+    ``largo`` es el frame de read_precios_largo(), ``sucursales`` el de sucursales_prov()
+    y ``productos`` el de productos.csv. Los productos sin categoria en un nivel no cuentan en ese nivel.
+    """
+    fechas = largo["fecha"].cat.categories
+    ids = largo["producto_id"].cat.categories
+
+    # pares (precio anterior, precio actual) del mismo producto e id_prov en fechas consecutivas
+    fecha = largo["fecha"].cat.codes.to_numpy()
+    item = largo["id_prov"].cat.codes.to_numpy(np.int64) * len(ids) + largo["producto_id"].cat.codes.to_numpy()
+    precio = largo["precio"].to_numpy(np.float64)
+    orden = np.lexsort((fecha, item))
+    item, fecha, precio = item[orden], fecha[orden], precio[orden]
+    actual = np.flatnonzero((item[1:] == item[:-1]) & (fecha[1:] == fecha[:-1] + 1)) + 1
+    actual = actual[(precio[actual] > 0) & (precio[actual - 1] > 0)]
+
+    # grupo de provincia y cadena de cada id_prov
+    provs = sucursales.drop_duplicates("id_prov").set_index("id_prov").reindex(largo["id_prov"].cat.categories)
+    provincias = provs["provincia"].cat.categories
+    cadenas = provs["cadena"].cat.categories
+    codigo_pc, pcs = pd.factorize(
+        provs["provincia"].cat.codes.to_numpy(np.int64) * len(cadenas) + provs["cadena"].cat.codes.to_numpy(),
+        sort=True,
+    )
+    por_id = productos.drop_duplicates("id").set_index("id").reindex(ids)
+
+    codigo_prov, codigo_producto = np.divmod(item[actual], len(ids))
+    pc = codigo_pc[codigo_prov]
+    fecha = fecha[actual]
+    actuales, anteriores = precio[actual], precio[actual - 1]
+    relativo = np.log(actuales / anteriores)
+
+    # agregados por grupo (categoria, provincia, cadena y fecha) con sumas de numpy sobre codigos enteros
+    por_nivel = []
+    for nivel in niveles:
+        categorias = por_id[nivel].astype("category").array
+        categoria = categorias.codes[codigo_producto]
+        elegidos = categoria >= 0
+        clave = (categoria.astype(np.int64) * len(pcs) + pc) * len(fechas) + fecha
+        grupo, claves = pd.factorize(clave[elegidos], sort=True)
+        claves, codigo_fecha = np.divmod(claves, len(fechas))
+        codigo_categoria, claves = np.divmod(claves, len(pcs))
+        codigo_provincia, codigo_cadena = np.divmod(pcs[claves], len(cadenas))
+        suma = partial(np.bincount, grupo, minlength=len(claves))
+        por_nivel.append(
+            pd.DataFrame(
+                {
+                    "nivel": pd.Categorical.from_codes(np.full(len(claves), niveles.index(nivel)), categories=niveles),
+                    "categoria": pd.Categorical.from_codes(codigo_categoria, categories=categorias.categories),
+                    "provincia": pd.Categorical.from_codes(codigo_provincia, categories=provincias),
+                    "cadena": pd.Categorical.from_codes(codigo_cadena, categories=cadenas),
+                    "fecha": pd.Categorical.from_codes(codigo_fecha, categories=fechas, ordered=True),
+                    "productos": suma(),
+                    "jevons": suma(relativo[elegidos]) / suma(),
+                    "dutot": np.log(suma(actuales[elegidos]) / suma(anteriores[elegidos])),
+                }
+            )
+        )
+    return esquema.concatenar(por_nivel, ignore_index=True)
+
+
+def encadenar(eslabones, anteriores=None):
+    """
+    Encadena los eslabones de enlaces() en indices ``jevons`` y ``dutot``.
+
+    Cada grupo vale 100 en la fecha anterior a su primer eslabon (con ``productos`` 0).
+    Con ``anteriores`` (indices ya calculados hasta la primer fecha de ``eslabones``)
+    los grupos que ya estaban siguen desde su ultimo valor.
+    """
+    # por fecha: los indices nuevos se agregan al final de indices.csv
+    eslabones = eslabones.sort_values(["fecha"] + CLAVES, ignore_index=True)
+    grupos = eslabones.groupby(CLAVES, observed=True, sort=False)
+    nivel = {indice: grupos[indice].cumsum().to_numpy() for indice in ("jevons", "dutot")}
+
+    nuevos = np.ones(len(eslabones), dtype=bool)
+    if anteriores is not None and len(anteriores):
+        ultimos = anteriores.drop_duplicates(CLAVES, keep="last")[CLAVES + ["jevons", "dutot"]]
+        desde = eslabones[CLAVES].merge(ultimos, on=CLAVES, how="left")
+        nuevos = desde["jevons"].isna().to_numpy()
+        for indice in nivel:
+            nivel[indice] = nivel[indice] + np.log(desde[indice].fillna(100).to_numpy() / 100)
+
+    fechas = np.asarray(eslabones["fecha"].cat.categories)
+    codigo_fecha = eslabones["fecha"].cat.codes.to_numpy()
+    indices = eslabones[CLAVES + ["productos"]].assign(
+        fecha=fechas[codigo_fecha], jevons=100 * np.exp(nivel["jevons"]), dutot=100 * np.exp(nivel["dutot"])
+    )
+    # base 100 de los grupos que arrancan en estos eslabones
+    primeros = ~indices.duplicated(CLAVES).to_numpy() & nuevos
+    base = indices[primeros].assign(fecha=fechas[codigo_fecha[primeros] - 1], productos=0, jevons=100.0, dutot=100.0)
+    indices = esquema.concatenar([base, indices]).sort_values(["fecha"] + CLAVES, ignore_index=True)
+    return indices[CLAVES + ["fecha", "productos", "jevons", "dutot"]]
+
+
+def calcular_indices(path=".", cache=None, desde=None, hasta=None):
+    """
+    Calcula los indices de todos los precios_*.csv de ``path`` (o de las fechas ``desde``/``hasta``),
+    sin guardarlos. ``cache`` como en read_precios_largo().
+    """
+    here = Path(path)
+    sucursales = sucursales_prov(here)
+    productos = pd.read_csv(here / "productos.csv", dtype=esquema.DTYPES)
+    largo = read_precios_largo(here, sucursales, cache, desde, hasta)
+    return compactar(encadenar(enlaces(largo, sucursales, productos)))
+
+
+def compactar(indices):
+    return indices.astype({clave: "category" for clave in CLAVES})
+
+
+def read_indices(path="."):
+    """
+    Lee los indices guardados por actualizar_indices().
+    """
+    return pd.read_csv(
+        Path(path) / "indices.csv", dtype={"fecha": str, **{clave: "category" for clave in CLAVES}}, engine=MOTOR
+    )
+
+
+def escribir_csv(indices, path, agregar=False):
+    """
+    Escribe (o con ``agregar`` suma al final de) un CSV de indices.
+    Con pyarrow instalado se usa su writer, mucho mas rapido que ``to_csv`` para millones de filas.
+    """
+    if MOTOR != "pyarrow":
+        indices.to_csv(path, mode="a" if agregar else "w", header=not agregar, index=False)
+        return
+    import pyarrow
+    import pyarrow.csv
+
+    opciones = pyarrow.csv.WriteOptions(include_header=not agregar, quoting_style="needed")
+    with open(path, "ab" if agregar else "wb") as f:
+        pyarrow.csv.write_csv(pyarrow.Table.from_pandas(indices, preserve_index=False), f, opciones)
+
+
+def actualizar_indices(path=".", cache=None):
+    """
+    Calcula los indices y los guarda en ``path/indices.csv``, con el registro de los archivos
+    usados en ``path/indices.json``. Si desde la ultima vez sólo hay snapshots de fechas posteriores,
+    se calculan los eslabones nuevos (leyendo desde la ultima fecha ya incluida), se encadenan
+    a los indices guardados y se agregan al final del CSV; si cambió cualquier otro archivo
+    se recalcula todo.
+    Devuelve los indices, como read_indices().
+    """
+    here = Path(path)
+    registro_path = here / "indices.json"
+    salida = here / "indices.csv"
+    registro = json.loads(registro_path.read_text()) if registro_path.exists() else {}
+
+    archivos = sorted(here.glob("precios_*.csv"), key=fecha_archivo)
+    fuentes = {
+        "version": INDICES_VERSION,
+        "sucursales": firma(here / "sucursales.csv"),
+        "productos": firma(here / "productos.csv"),
+    }
+    snapshots = {f.name: firma(f) for f in archivos}
+    incluidos = registro.get("snapshots", {})
+    ultima = max((fecha_archivo(Path(nombre)) for nombre in incluidos), default=None)
+    incremental = (
+        salida.exists()
+        and salida.stat().st_size == registro.get("indices")
+        and ultima is not None
+        and all(registro.get(clave) == valor for clave, valor in fuentes.items())
+        and all(snapshots.get(nombre) == valor for nombre, valor in incluidos.items())
+        and all(fecha_archivo(f) > ultima for f in archivos if f.name not in incluidos)
+    )
+
+    if incremental and len(incluidos) == len(snapshots):
+        return read_indices(here)
+    sucursales = sucursales_prov(here)
+    productos = pd.read_csv(here / "productos.csv", dtype=esquema.DTYPES)
+    if incremental:
+        # sólo se escriben los indices de las fechas nuevas
+        anteriores = read_indices(here)
+        largo = read_precios_largo(here, sucursales, cache, desde=ultima)
+        nuevos = encadenar(enlaces(largo, sucursales, productos), anteriores)
+        escribir_csv(nuevos, salida, agregar=True)
+        indices = esquema.concatenar([anteriores, compactar(nuevos)], ignore_index=True)
+    else:
+        largo = read_precios_largo(here, sucursales, cache)
+        indices = compactar(encadenar(enlaces(largo, sucursales, productos)))
+        tmp = salida.with_name(salida.name + ".tmp")
+        escribir_csv(indices, tmp)
+        tmp.replace(salida)
+
+    # el tamaño de indices.csv detecta una corrida que se cortó antes de guardar el registro
+    registro_path.write_text(json.dumps({**fuentes, "snapshots": snapshots, "indices": salida.stat().st_size}))
+    return indices
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "path", nargs="?", default=".", help="Directorio del dataset (precios_*.csv, sucursales.csv y productos.csv)"
+    )
+    parser.add_argument("--cache", action="store_true", help="Usar la cache de precios normalizados")
+    args = parser.parse_args()
+    indices = actualizar_indices(args.path, cache=args.cache or None)
+    print(f"{len(indices):,} indices en {Path(args.path) / 'indices.csv'}")
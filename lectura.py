@@ -0,0 +1,193 @@
+"""
+Lectura de los archivos generados por el scraper, compartida por los scripts de consolidación.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
+from pathlib import Path
+
+import pandas as pd
+
+import esquema
+
+try:
+    import pyarrow  # noqa: F401
+
+    MOTOR = "pyarrow"
+except ImportError:  # pragma: no cover
+    MOTOR = "c"
+
+try:
+    from compression import zstd  # python 3.14+
+except ImportError:  # pragma: no cover
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+
+# tipos explicitos de las columnas conocidas (ver esquema.py); el resto (los ids numericos) se infiere,
+# porque leerlos como texto cambiaria el formato y el orden de los archivos consolidados
+DTYPES = esquema.DTYPES
+
+
+def expandir(patrones):
+    """
+    Devuelve los paths que matchean los patrones (globs relativos o paths absolutos).
+    """
+    if isinstance(patrones, str):
+        patrones = [patrones]
+    return chain.from_iterable(Path(".").glob(p) if not p.startswith("/") else [Path(p)] for p in patrones)
+
+
+def como_csv(frame, dtype=None):
+    """
+    Deja un frame leido de un ``.parquet`` exportado con los tipos que tendria leido del CSV:
+    ``dtype`` para las columnas indicadas y el resto de las de texto numericas (los ids) como numeros.
+    """
+    dtype = dtype or {}
+    for columna in frame.columns:
+        if columna in dtype:
+            frame[columna] = frame[columna].astype(dtype[columna])
+        elif pd.api.types.is_string_dtype(frame[columna]):
+            try:
+                frame[columna] = pd.to_numeric(frame[columna])
+            except (ValueError, TypeError):
+                pass
+    return frame
+
+
+def leer_csv(path, **kwargs):
+    """
+    ``pd.read_csv`` que además lee las partes comprimidas con zstd (``.zst``) y los ``.parquet``
+    exportados con ``formato=parquet`` (de estos sólo se usan ``dtype`` y ``usecols``).
+    Los ``.gz`` los descomprime pandas directamente.
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        return como_csv(pd.read_parquet(path, columns=kwargs.get("usecols")), kwargs.get("dtype"))
+    if path.suffix == ".zst":
+        if zstd is None:
+            raise RuntimeError("Para leer archivos .zst hay que instalar backports.zstd (o usar python 3.14+)")
+        with zstd.open(path) as f:
+            return pd.read_csv(f, **kwargs)
+    return pd.read_csv(path, **kwargs)
+
+
+def leer_csv_por_partes(path, chunksize, **kwargs):
+    """
+    Como ``leer_csv`` pero devuelve los datos de a ``chunksize`` filas, con los tipos de ``DTYPES``
+    sin categoricas (cada parte tendria sus propias categorias).
+    """
+    kwargs = {"dtype": esquema.sin_categoricas(DTYPES), **kwargs}
+    path = Path(path)
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        for lote in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=kwargs.get("usecols")):
+            yield como_csv(lote.to_pandas(), kwargs["dtype"])
+        return
+    if path.suffix == ".zst":
+        if zstd is None:
+            raise RuntimeError("Para leer archivos .zst hay que instalar backports.zstd (o usar python 3.14+)")
+        with zstd.open(path) as f:
+            yield from pd.read_csv(f, chunksize=chunksize, **kwargs)
+        return
+    with pd.read_csv(path, chunksize=chunksize, **kwargs) as partes:
+        yield from partes
+
+
+def leer_varios(paths, jobs=1, **kwargs):
+    """
+    Lee los archivos de ``paths`` con ``leer_csv`` en ``jobs`` procesos (0: uno por CPU),
+    con los tipos de ``DTYPES`` y el motor ``pyarrow`` si está instalado.
+    Devuelve la lista de frames en el orden de ``paths``, para pasarle a ``esquema.concatenar``.
+    """
+    kwargs = {"dtype": DTYPES, "engine": MOTOR, **kwargs}
+    paths = list(paths)
+    jobs = jobs or os.cpu_count()
+    if jobs > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(min(jobs, len(paths))) as pool:
+            return list(pool.map(partial(leer_csv, **kwargs), paths))
+    return [leer_csv(path, **kwargs) for path in paths]
+
+
+def huella_archivo(path, bloque=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for parte in iter(lambda: f.read(bloque), b""):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def leer_manifiesto(path):
+    """
+    Manifiesto de una consolidacion incremental: el archivo consolidado (``salida``)
+    y los archivos ya incluidos en él (``archivos``: path => tamaño y hash).
+    """
+    path = Path(path)
+    if path.exists():
+        return json.loads(path.read_text())
+    return {"archivos": {}}
+
+
+def guardar_manifiesto(path, manifiesto):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifiesto, indent=2))
+    tmp.replace(path)
+
+
+def pendientes(manifiesto, paths):
+    """
+    Devuelve ``(base, nuevos)``: el consolidado anterior (o ``None``) y los archivos de
+    ``paths`` que todavia no se sumaron, que quedan registrados en ``manifiesto``.
+
+    Los archivos se reconocen por path, y los nuevos tambien por hash (un archivo ya
+    consolidado con otro nombre no se vuelve a sumar). Si alguno ya consolidado cambió
+    (de tamaño, o de hash si cambió su fecha de modificacion) no se pueden descontar sus filas,
+    asi que se vuelve a consolidar todo. Lo mismo si falta el consolidado anterior.
+    """
+    paths = [Path(p) for p in paths]
+    procesados = manifiesto["archivos"]
+    if any(str(p) in procesados and cambio(procesados[str(p)], p) for p in paths):
+        procesados.clear()
+        manifiesto.pop("salida", None)
+
+    base = manifiesto.get("salida")
+    if base is not None and not Path(base).exists():
+        procesados.clear()
+        base = None
+
+    hashes = {registro["hash"] for registro in procesados.values()}
+    nuevos = []
+    for path in paths:
+        if str(path) in procesados:
+            continue
+        huella = huella_archivo(path)
+        if huella not in hashes:
+            nuevos.append(path)
+            hashes.add(huella)
+        stat = path.stat()
+        procesados[str(path)] = {"tamanio": stat.st_size, "mtime": stat.st_mtime_ns, "hash": huella}
+    return base, nuevos
+
+
+def cambio(registro, path):
+    """
+    ``True`` si ``path`` ya no es el archivo registrado en el manifiesto. Con la misma fecha de
+    modificacion alcanza con el tamaño; si no, se compara el hash.
+    """
+    stat = path.stat()
+    if registro["tamanio"] != stat.st_size:
+        return True
+    if registro.get("mtime") == stat.st_mtime_ns:
+        return False
+    if registro["hash"] != huella_archivo(path):
+        return True
+    # mismo contenido (por ejemplo copiado de nuevo): no hace falta volver a hashearlo
+    registro["mtime"] = stat.st_mtime_ns
+    return False
@@ -0,0 +1,51 @@
+import argparse
+import math
+import sqlite3
+import statistics
+import pandas as pd
+from pathlib import Path
+
+from preciosclaros.plan import repartir, guardar_plan
+
+parser = argparse.ArgumentParser(
+    description="Arma un plan de porciones balanceado por cantidad de paginas, "
+    "a partir de los precios (o un checkpoint) de corridas anteriores"
+)
+parser.add_argument(
+    "src_path",
+    metavar="path",
+    type=str,
+    nargs="?",
+    help="Path to precio CSVs of previous runs; enclose in quotes, accepts * as wildcard for directories or filenames",
+)
+parser.add_argument("-n", type=int, default=7, help="Cantidad de porciones")
+parser.add_argument("--checkpoint", type=str, help="Archivo de checkpoint (-a checkpoint=...) con totales por sucursal")
+parser.add_argument("--sucursales", type=str, help="CSV de sucursales, para incluir las que no tienen historia")
+parser.add_argument("--limit", type=int, default=50, help="Tamaño de pagina de productos")
+parser.add_argument("-o", type=str, default="plan.json", help="Output json")
+args = parser.parse_args()
+
+totales = {}
+if args.src_path:
+    # cada archivo es una corrida: me quedo con el maximo de precios por sucursal
+    for f in Path(".").glob(args.src_path):
+        for id_sucursal, n in pd.read_csv(f, usecols=["sucursal_id"]).sucursal_id.value_counts().items():
+            totales[id_sucursal] = max(n, totales.get(id_sucursal, 0))
+if args.checkpoint:
+    # los totales del checkpoint son los informados por la API, tienen prioridad
+    conn = sqlite3.connect(args.checkpoint)
+    totales.update(conn.execute("SELECT id_sucursal, total FROM totales"))
+    conn.close()
+
+paginas = {k: max(1, math.ceil(v / args.limit)) for k, v in totales.items()}
+
+if args.sucursales:
+    # sucursales sin datos previos: se estiman con la mediana
+    estimado = int(statistics.median(paginas.values())) if paginas else 1
+    for id_sucursal in pd.read_csv(args.sucursales, usecols=["id"]).id:
+        paginas.setdefault(id_sucursal, estimado)
+
+reparto = repartir(paginas, args.n)
+for i, (carga, ids) in enumerate(reparto, 1):
+    print(f"porcion {i}/{args.n}: {len(ids)} sucursales, {carga} paginas")
+guardar_plan(args.o, reparto, args.limit)
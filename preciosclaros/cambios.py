@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+
+class IndicePrecios:
+    """
+    Indice persistente (SQLite) del ultimo precio conocido de cada ``(sucursal_id, producto_id)``.
+
+    Cada corrida se identifica con ``corrida`` (su marca de tiempo): los pares vistos
+    se marcan con ella, de manera que al final se pueden listar los que desaparecieron.
+    Los precios que cambiaron se guardan recien con ``registrar``, una vez exportados.
+    """
+
+    def __init__(self, path, corrida, commit_cada=10000):
+        self.corrida = corrida
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS precios ("
+            "sucursal_id TEXT, producto_id TEXT, precio REAL, precio_max REAL, precio_min REAL, corrida TEXT, "
+            "PRIMARY KEY (sucursal_id, producto_id)"
+            ") WITHOUT ROWID"
+        )
+        self.commit_cada = commit_cada
+        self.pendientes = 0
+
+    def cambio(self, sucursal_id, producto_id, precio, precio_max, precio_min):
+        """
+        Devuelve ``True`` si el precio es nuevo o distinto del ultimo conocido y marca el par
+        como visto en esta corrida. El precio nuevo no se guarda (ver ``registrar``).
+        """
+        clave = (str(sucursal_id), str(producto_id))
+        row = self.conn.execute(
+            "SELECT precio, precio_max, precio_min FROM precios WHERE sucursal_id = ? AND producto_id = ?", clave
+        ).fetchone()
+        if row is not None:
+            self.conn.execute(
+                "UPDATE precios SET corrida = ? WHERE sucursal_id = ? AND producto_id = ?", (self.corrida,) + clave
+            )
+            self.pendientes += 1
+            if self.pendientes >= self.commit_cada:
+                self.conn.commit()
+                self.pendientes = 0
+        return row != (precio, precio_max, precio_min)
+
+    def registrar(self, precios):
+        """
+        Guarda precios ``(sucursal_id, producto_id, precio, precio_max, precio_min)`` ya exportados,
+        en una transaccion.
+        """
+        filas = [(str(s), str(p), precio, maximo, minimo, self.corrida) for s, p, precio, maximo, minimo in precios]
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO precios VALUES (?, ?, ?, ?, ?, ?)", filas)
+        self.pendientes = 0
+
+    def bajas(self, sucursales):
+        """
+        Quita del indice y devuelve los pares de ``sucursales`` que no se vieron en esta corrida.
+        """
+        self.conn.commit()
+        bajas = []
+        for sucursal_id in sucursales:
+            bajas.extend(
+                self.conn.execute(
+                    "SELECT sucursal_id, producto_id FROM precios WHERE sucursal_id = ? AND corrida != ?",
+                    (sucursal_id, self.corrida),
+                )
+            )
+            self.conn.execute(
+                "DELETE FROM precios WHERE sucursal_id = ? AND corrida != ?", (sucursal_id, self.corrida)
+            )
+        self.conn.commit()
+        return bajas
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import sqlite3
+
+
+def huella_producto(nombre, marca, presentacion):
+    return hashlib.blake2b(f"{nombre}\x1f{marca}\x1f{presentacion}".encode(), digest_size=8).digest()
+
+
+class CatalogoProductos:
+    """
+    Indice persistente (SQLite) de los productos ya exportados en corridas anteriores,
+    con una huella de ``nombre``/``marca``/``presentacion``.
+
+    La busqueda es por clave primaria sobre el archivo, sin cargar nada en memoria
+    al iniciar, asi que arranca al instante aunque tenga millones de productos.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS productos (id TEXT PRIMARY KEY, huella BLOB) WITHOUT ROWID")
+        self.conn.commit()
+
+    def cambio(self, id_, nombre, marca, presentacion):
+        """
+        Devuelve ``True`` si el producto es nuevo o si cambió alguno de sus datos,
+        es decir, si hay que exportarlo. No lo registra (ver ``registrar``).
+        """
+        huella = huella_producto(nombre, marca, presentacion)
+        row = self.conn.execute("SELECT huella FROM productos WHERE id = ?", (str(id_),)).fetchone()
+        return not (row and row[0] == huella)
+
+    def registrar(self, productos):
+        """
+        Registra productos ``(id, nombre, marca, presentacion)`` ya exportados, en una transaccion.
+        """
+        filas = [
+            (str(id_), huella_producto(nombre, marca, presentacion)) for id_, nombre, marca, presentacion in productos
+        ]
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO productos VALUES (?, ?)", filas)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+
+class Checkpoint:
+    """
+    Registro persistente (SQLite) del avance del scrapeo de precios.
+
+    Guarda el ``total`` de productos de cada sucursal ya consultada y los
+    rangos ``(offset, limit)`` de las paginas ya procesadas, de manera que
+    un job reiniciado retome cada sucursal donde quedó.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS totales (id_sucursal TEXT PRIMARY KEY, total INTEGER) WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS paginas ("
+            "id_sucursal TEXT, offset INTEGER, limite INTEGER, PRIMARY KEY (id_sucursal, offset, limite)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def total(self, id_sucursal):
+        row = self.conn.execute("SELECT total FROM totales WHERE id_sucursal = ?", (id_sucursal,)).fetchone()
+        return row[0] if row else None
+
+    def guardar_total(self, id_sucursal, total):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO totales VALUES (?, ?)", (id_sucursal, total))
+
+    def marcar_pagina(self, id_sucursal, offset, limit):
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO paginas VALUES (?, ?, ?)", (id_sucursal, offset, limit))
+
+    def marcar_paginas(self, paginas):
+        """
+        Marca varias paginas ``(id_sucursal, offset, limit)`` en una sola transaccion.
+        """
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO paginas VALUES (?, ?, ?)", paginas)
+
+    def pendientes(self, id_sucursal, total, limit, desde=0):
+        """
+        Devuelve las paginas ``(offset, limit)`` que faltan para cubrir ``[desde, total)``.
+
+        Las paginas ya hechas pueden tener otro tamaño (por ejemplo con ``limite=auto``)
+        así que se calculan los huecos entre rangos y se parten en paginas de ``limit``.
+        """
+        hechas = self.conn.execute(
+            "SELECT offset, limite FROM paginas WHERE id_sucursal = ? ORDER BY offset", (id_sucursal,)
+        ).fetchall()
+        paginas = []
+        cursor = desde
+        for offset, limite in hechas + [(total, 0)]:
+            for o in range(cursor, min(offset, total), limit):
+                paginas.append((o, limit if offset >= total else min(limit, offset - o)))
+            cursor = max(cursor, offset + limite)
+        return paginas
+
+    def close(self):
+        self.conn.close()
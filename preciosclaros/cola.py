@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import os
+import socket
+import sqlite3
+import time
+
+
+class ColaTrabajo:
+    """
+    Cola de trabajo compartida (SQLite) entre varios procesos ``preciosclaros``.
+
+    Cada unidad es una pagina de productos de una sucursal ``(id_sucursal, offset)``.
+    La pagina 0 (con ``total`` desconocido) representa a la sucursal entera: al
+    procesarla se encolan el resto de sus paginas.
+
+    Un worker *toma* unidades con un lease de ``lease`` segundos. Si no la completa
+    antes de que venza (porque murió o lo cortaron), la unidad vuelve a estar
+    disponible para cualquier otro worker.
+
+    Usa el modo WAL de SQLite, así que los workers tienen que ser procesos de la
+    misma máquina con el archivo en un disco local (no un disco de red).
+    """
+
+    PENDIENTE = 0
+    TOMADA = 1
+    HECHA = 2
+
+    def __init__(self, path, lease=600):
+        self.lease = lease
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS unidades ("
+            "id_sucursal TEXT, offset INTEGER, limite INTEGER, total INTEGER, "
+            "estado INTEGER DEFAULT 0, worker TEXT, vence REAL DEFAULT 0, "
+            "PRIMARY KEY (id_sucursal, offset)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS unidades_estado ON unidades (estado, vence)")
+
+    def agregar(self, unidades):
+        """
+        Encola unidades ``(id_sucursal, offset, limit, total)``.
+        Las que ya existen (en cualquier estado) se ignoran, de modo que varios
+        workers pueden sembrar la misma cola sin duplicar trabajo.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO unidades (id_sucursal, offset, limite, total) VALUES (?, ?, ?, ?)", unidades
+            )
+
+    def tomar(self, cantidad):
+        """
+        Toma hasta ``cantidad`` unidades pendientes o con lease vencido.
+        Devuelve una lista de ``(id_sucursal, offset, limit, total)``.
+        """
+        ahora = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            unidades = self.conn.execute(
+                "SELECT id_sucursal, offset, limite, total FROM unidades "
+                "WHERE estado = ? OR (estado = ? AND vence < ?) LIMIT ?",
+                (self.PENDIENTE, self.TOMADA, ahora, cantidad),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE unidades SET estado = ?, worker = ?, vence = ? WHERE id_sucursal = ? AND offset = ?",
+                [(self.TOMADA, self.worker, ahora + self.lease, u[0], u[1]) for u in unidades],
+            )
+        return unidades
+
+    def completar(self, id_sucursal, offset):
+        self.completar_varias([(id_sucursal, offset)])
+
+    def completar_varias(self, unidades):
+        """
+        Marca como hechas las unidades ``(id_sucursal, offset)`` en una sola transaccion.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "UPDATE unidades SET estado = ?, vence = 0 WHERE id_sucursal = ? AND offset = ?",
+                [(self.HECHA, id_sucursal, offset) for id_sucursal, offset in unidades],
+            )
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Decodificadores de las respuestas JSON de la API.
+
+Trabajan directamente sobre ``response.body`` (bytes), sin pasar por
+``response.text``. Si está instalado ``orjson`` se usa por defecto, que es
+varias veces más rapido que ``json`` de la libreria estandar.
+Se puede forzar uno con el setting ``JSON_DECODER`` (``"json"`` u ``"orjson"``).
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def decodificar_json(body):
+    return json.loads(body)
+
+
+def decodificar_orjson(body):
+    return orjson.loads(body)
+
+
+DECODIFICADORES = {"json": decodificar_json}
+if orjson is not None:
+    DECODIFICADORES["orjson"] = decodificar_orjson
+
+
+def get_decodificador(nombre=None):
+    if not nombre:
+        nombre = "orjson" if orjson is not None else "json"
+    try:
+        return DECODIFICADORES[nombre]
+    except KeyError:
+        raise ValueError(f"Decodificador JSON desconocido o no instalado: {nombre}")
+
+
+# orden de las columnas de ``filas_productos``
+COLUMNAS_PRODUCTOS = ("id", "nombre", "presentacion", "marca", "precio", "precioMax", "precioMin")
+
+
+def filas_productos(productos):
+    """
+    Convierte la lista ``productos`` de la API en tuplas con el orden de ``COLUMNAS_PRODUCTOS``.
+    """
+    return [
+        (p["id"], p.get("nombre"), p.get("presentacion"), p.get("marca"), p["precio"], p["precioMax"], p["precioMin"])
+        for p in productos
+    ]
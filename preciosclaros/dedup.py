@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Conjuntos compactos de ids ya vistos, para ``DuplicatesPipeline``.
+
+Los ids de productos son codigos numericos (EAN) que como ``str`` dentro
+de un ``set`` ocupan ~100 bytes cada uno. Acá se guardan como enteros de 64 bits
+en ``array`` ordenados (8 bytes por id), con un buffer chico de ids recientes
+que se mezcla cada tanto.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+
+MAX_UINT64 = 2**64 - 1
+
+
+def como_entero(id_):
+    """
+    Devuelve el id como entero si se puede representar sin perdida
+    (sin ceros a la izquierda y dentro de 64 bits), o ``None``.
+    """
+    if isinstance(id_, int):
+        return id_ if 0 <= id_ <= MAX_UINT64 else None
+    if isinstance(id_, str) and id_.isdigit() and (id_ == "0" or id_[0] != "0") and len(id_) <= 19:
+        return int(id_)
+    return None
+
+
+class IdsVistos:
+    """
+    Conjunto de ids (``in`` y ``add``) que guarda los numericos en
+    ``array('Q')`` ordenados y el resto en un ``set`` comun.
+
+    Los arrays (``corridas``) tienen tamaños que al menos se duplican de una a la
+    anterior, como los niveles de un LSM: al compactar el buffer sólo se mezcla con
+    las corridas más chicas, así que cada id se vuelve a copiar O(log N) veces en
+    lugar de una vez por compactacion. Una busqueda hace un bisect por corrida.
+    """
+
+    def __init__(self, buffer=1 << 16):
+        self.corridas = []
+        self.recientes = set()
+        self.otros = set()
+        self.buffer = buffer
+
+    def __len__(self):
+        return sum(map(len, self.corridas)) + len(self.recientes) + len(self.otros)
+
+    def __contains__(self, id_):
+        n = como_entero(id_)
+        if n is None:
+            return id_ in self.otros
+        return n in self.recientes or self._en_ordenados(n)
+
+    def _en_ordenados(self, n):
+        for corrida in self.corridas:
+            i = bisect_left(corrida, n)
+            if i < len(corrida) and corrida[i] == n:
+                return True
+        return False
+
+    def add(self, id_):
+        n = como_entero(id_)
+        if n is None:
+            self.otros.add(id_)
+            return
+        if n in self.recientes or self._en_ordenados(n):
+            return
+        self.recientes.add(n)
+        if len(self.recientes) >= self.buffer:
+            self.compactar()
+
+    def compactar(self):
+        """
+        Pasa el buffer de ids recientes a una corrida ordenada, mezclandola
+        con las ultimas corridas mientras no sean más grandes que ella.
+        """
+        corrida = array("Q", sorted(self.recientes))
+        self.recientes = set()
+        while self.corridas and len(self.corridas[-1]) <= len(corrida):
+            corrida = array("Q", heapq.merge(self.corridas.pop(), corrida))
+        self.corridas.append(corrida)
+
+
+class HuellasAcotadas:
+    """
+    Tabla de huellas de 64 bits de tamaño fijo (``slots`` * 8 bytes).
+
+    ``visto(clave)`` registra la clave y devuelve ``True`` si ya estaba. Cada huella
+    puede ir a dos slots; si los dos están ocupados pisa a una de las anteriores,
+    asi que la memoria no crece: con claves de mas algunos duplicados pueden pasar,
+    pero una clave nueva nunca se toma por vista (salvo colision de los 64 bits).
+    """
+
+    def __init__(self, slots=1 << 22):
+        self.slots = slots
+        self.tabla = array("Q", bytes(8 * slots))
+
+    def visto(self, clave):
+        # el 0 marca un slot vacio
+        h = (hash(clave) & MAX_UINT64) or 1
+        tabla = self.tabla
+        a = h % self.slots
+        b = (h >> 32) % self.slots
+        if tabla[a] == h or tabla[b] == h:
+            return True
+        if not tabla[a]:
+            tabla[a] = h
+        elif not tabla[b]:
+            tabla[b] = h
+        else:
+            tabla[b if h & 1 else a] = h
+        return False
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import sqlite3
+from datetime import datetime
+
+
+def huella_pagina(productos):
+    """
+    Hash de una pagina de productos de la API: ids y precios, independiente del orden.
+    """
+    h = hashlib.sha1()
+    for prod in sorted(productos, key=lambda p: str(p.get("id"))):
+        h.update(f"{prod.get('id')}|{prod.get('precio')}|{prod.get('precioMax')}|{prod.get('precioMin')}\n".encode())
+    return h.hexdigest()
+
+
+def huella_sucursal(total, huellas):
+    """
+    Huella de una sucursal: el total de productos mas las huellas de las paginas muestreadas.
+    """
+    return hashlib.sha1("|".join([str(total)] + list(huellas)).encode()).hexdigest()
+
+
+class HuellasSucursales:
+    """
+    Almacen (SQLite) de la huella de cada sucursal en la ultima corrida completa
+    y de sus ultimos precios, para el modo ``delta``.
+
+    Si la huella de una sucursal no cambió, sus precios se arrastran de acá
+    en lugar de volver a bajarlos.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS huellas (id_sucursal TEXT PRIMARY KEY, huella TEXT, fecha TEXT) WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS precios ("
+            "id_sucursal TEXT, producto_id TEXT, precio REAL, precio_max REAL, precio_min REAL, "
+            "PRIMARY KEY (id_sucursal, producto_id)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def huella(self, id_sucursal):
+        row = self.conn.execute("SELECT huella FROM huellas WHERE id_sucursal = ?", (id_sucursal,)).fetchone()
+        return row[0] if row else None
+
+    def guardar_huella(self, id_sucursal, huella):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO huellas VALUES (?, ?, ?)", (id_sucursal, huella, datetime.utcnow().isoformat())
+            )
+
+    def olvidar(self, id_sucursal):
+        """
+        Descarta huella y precios de una sucursal que cambió y se va a volver a bajar completa.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM huellas WHERE id_sucursal = ?", (id_sucursal,))
+            self.conn.execute("DELETE FROM precios WHERE id_sucursal = ?", (id_sucursal,))
+
+    def guardar_precios(self, id_sucursal, precios):
+        """
+        ``precios`` es una lista de ``(producto_id, precio, precio_max, precio_min)``
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO precios VALUES (?, ?, ?, ?, ?)", [(id_sucursal, *p) for p in precios]
+            )
+
+    def precios(self, id_sucursal):
+        return self.conn.execute(
+            "SELECT producto_id, precio, precio_max, precio_min FROM precios WHERE id_sucursal = ?", (id_sucursal,)
+        )
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Exportadores alternativos al ``CsvItemExporter`` para ``MultiCSVItemPipeline``.
+"""
+import csv
+import gzip
+import io
+
+from itemadapter import ItemAdapter
+from scrapy.exporters import BaseItemExporter
+
+from preciosclaros.items import PrecioItem, ProductoItem, SucursalItem, ProductoCategorizadoItem, SucursalGemelaItem
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+try:
+    from compression import zstd  # python 3.14+
+except ImportError:  # pragma: no cover
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+
+# columnas de cada tipo de item, en el orden del CSV
+COLUMNAS = {
+    "precio": list(PrecioItem.fields),
+    "producto": list(ProductoItem.fields),
+    "producto_cat": list(ProductoCategorizadoItem.fields),
+    "sucursal": list(SucursalItem.fields),
+    "sucursalgemela": list(SucursalGemelaItem.fields),
+}
+
+# columnas con tipo propio (el resto se guarda como string)
+TIPOS = {
+    "precio": "float64",
+    "precio_max": "float64",
+    "precio_min": "float64",
+    "fecha_relevamiento": "timestamp",
+}
+
+# columnas de baja cardinalidad relativa que se guardan con dictionary encoding
+DICCIONARIO = ["sucursal_id", "producto_id", "referencia_id", "marca", "provincia", "banderaDescripcion"]
+
+
+def tipo_arrow(columna):
+    tipo = TIPOS.get(columna)
+    if tipo == "float64":
+        return pa.float64()
+    if tipo == "timestamp":
+        return pa.timestamp("us")
+    return pa.string()
+
+
+# extension de los archivos segun la compresion
+EXTENSIONES = {"gzip": "gz", "zstd": "zst"}
+
+
+def comprimir(file, compresion):
+    """
+    Envuelve ``file`` (binario, abierto para escritura) para comprimir al vuelo con
+    ``gzip`` o ``zstd``. Al cerrar el envoltorio ``file`` queda abierto.
+    """
+    if compresion == "gzip":
+        return gzip.GzipFile(fileobj=file, mode="wb", compresslevel=6)
+    if compresion == "zstd":
+        if zstd is None:
+            raise RuntimeError("Para comprimir con zstd hay que instalar backports.zstd (o usar python 3.14+)")
+        return zstd.ZstdFile(file, mode="wb")
+    raise ValueError(f"Compresión desconocida: {compresion}")
+
+
+class FilasCsvExporter(BaseItemExporter):
+    """
+    Exportador CSV para los items de esquema fijo (``COLUMNAS``).
+
+    Genera el mismo archivo que ``CsvItemExporter`` pero con el orden de columnas
+    precalculado y sin serializar campo por campo. ``export_filas`` escribe
+    muchas filas (tuplas en el orden de ``COLUMNAS``) con un único ``writerows``.
+    """
+
+    def __init__(self, file, item_type, **kwargs):
+        super().__init__(dont_fail=True, **kwargs)
+        self.columnas = self.fields_to_export or COLUMNAS[item_type]
+        self.stream = io.TextIOWrapper(file, encoding=self.encoding or "utf-8", newline="")
+        self.writer = csv.writer(self.stream)
+
+    def start_exporting(self):
+        self.writer.writerow(self.columnas)
+
+    def formatear_fecha(self, fecha):
+        return str(fecha)
+
+    def export_item(self, item):
+        get = item.get
+        self.writer.writerow([get(c) for c in self.columnas])
+
+    def export_filas(self, filas):
+        self.writer.writerows(filas)
+
+    def finish_exporting(self):
+        self.stream.flush()
+        self.stream.detach()
+
+
+class ParquetItemExporter(BaseItemExporter):
+    """
+    Exporta items a un archivo Parquet tipado y comprimido.
+
+    Las filas se acumulan en columnas y se escriben en *row groups* de
+    ``row_group_size`` filas. Los ids y otras columnas repetitivas usan
+    dictionary encoding.
+    """
+
+    def __init__(self, file, item_type, row_group_size=100_000, compression="zstd", **kwargs):
+        if pa is None:
+            raise RuntimeError("Para exportar a Parquet hay que instalar pyarrow")
+        super().__init__(dont_fail=True, **kwargs)
+        self.file = file
+        self.item_type = item_type
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.writer = None
+        self.columnas = self.fields_to_export or COLUMNAS.get(item_type)
+        self.buffer = None
+
+    def start_exporting(self):
+        pass
+
+    def _iniciar(self, item):
+        if self.columnas is None:
+            self.columnas = list(ItemAdapter(item).field_names())
+        self.schema = pa.schema([(c, tipo_arrow(c)) for c in self.columnas])
+        self.buffer = {c: [] for c in self.columnas}
+        self.writer = pq.ParquetWriter(
+            self.file,
+            self.schema,
+            compression=self.compression,
+            use_dictionary=[c for c in self.columnas if c in DICCIONARIO],
+        )
+
+    def export_item(self, item):
+        if self.writer is None:
+            self._iniciar(item)
+        adapter = ItemAdapter(item)
+        for columna, valores in self.buffer.items():
+            valor = adapter.get(columna)
+            if valor is not None and TIPOS.get(columna) is None and not isinstance(valor, str):
+                valor = str(valor)
+            valores.append(valor)
+        if len(valores) >= self.row_group_size:
+            self.flush()
+
+    def formatear_fecha(self, fecha):
+        return fecha
+
+    def export_filas(self, filas):
+        for fila in filas:
+            if self.writer is None:
+                self._iniciar(dict(zip(COLUMNAS[self.item_type], fila)))
+            for valores, valor in zip(self.buffer.values(), fila):
+                valores.append(valor)
+        if len(self.buffer[self.columnas[0]]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer or not self.buffer[self.columnas[0]]:
+            return
+        tabla = pa.table({c: pa.array(v, type=self.schema.field(c).type) for c, v in self.buffer.items()})
+        self.writer.write_table(tabla, row_group_size=self.row_group_size)
+        for valores in self.buffer.values():
+            valores.clear()
+
+    def finish_exporting(self):
+        if self.writer is not None:
+            self.flush()
+            self.writer.close()
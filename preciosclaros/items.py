@@ -42,3 +42,45 @@ class PrecioItem(scrapy.Item):
     precio_max = scrapy.Field()
     precio_min = scrapy.Field()
     fecha_relevamiento = scrapy.Field(serializer=str)
+
+
+class PaginaPreciosItem(scrapy.Item):
+    """
+    Una pagina completa de productos y precios de una sucursal, en columnas
+    (modo ``lotes``). Los pipelines la procesan de una vez en lugar de item por item.
+    """
+
+    sucursal_id = scrapy.Field()
+    producto_ids = scrapy.Field()
+    nombres = scrapy.Field()
+    presentaciones = scrapy.Field()
+    marcas = scrapy.Field()
+    precios = scrapy.Field()  # None si no se exportan precios
+    precios_max = scrapy.Field()
+    precios_min = scrapy.Field()
+    fecha_relevamiento = scrapy.Field(serializer=str)
+    productos_nuevos = scrapy.Field()  # indices de los productos no vistos (DuplicatesPipeline)
+    filas_precios = scrapy.Field()  # indices de los precios a exportar, si algun pipeline los filtra (None: todos)
+
+
+class SucursalGemelaItem(scrapy.Item):
+    """
+    Indica que los precios de ``sucursal_id`` son los mismos que los de ``referencia_id``
+    (otra sucursal de la misma cadena), que no se volvieron a bajar.
+    """
+
+    sucursal_id = scrapy.Field()
+    referencia_id = scrapy.Field()
+    fecha_relevamiento = scrapy.Field(serializer=str)
+
+
+class FinPaginaItem(scrapy.Item):
+    """
+    Marca el fin de una pagina de productos ``(offset, limite)`` de ``sucursal_id``,
+    despues de sus items. No se exporta: ``MultiCSVItemPipeline`` la confirma (señal
+    ``items_exportados``) recien cuando los items anteriores ya están escritos en disco.
+    """
+
+    sucursal_id = scrapy.Field()
+    offset = scrapy.Field()
+    limite = scrapy.Field()
@@ -1,31 +1,280 @@
 # -*- coding: utf-8 -*-
+import csv
 import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
 from pathlib import Path
 from scrapy.exporters import CsvItemExporter
 from scrapy import signals
-from pydispatch import dispatcher
+from twisted.internet.defer import Deferred
 
 from scrapy.exceptions import DropItem
-from preciosclaros.items import PrecioItem, ProductoCategorizadoItem
+from preciosclaros.cambios import IndicePrecios
+from preciosclaros.catalogo import CatalogoProductos
+from preciosclaros.dedup import HuellasAcotadas, IdsVistos
+from preciosclaros.exporters import COLUMNAS, EXTENSIONES, FilasCsvExporter, ParquetItemExporter, comprimir
+from preciosclaros.items import (
+    FinPaginaItem,
+    PrecioItem,
+    ProductoItem,
+    ProductoCategorizadoItem,
+    PaginaPreciosItem,
+    SucursalGemelaItem,
+)
+
+logger = logging.getLogger(__name__)
+
+# señal de MultiCSVItemPipeline con los items (``items=[...]``) que ya están escritos en disco
+items_exportados = object()
+
+# argumentos del spider cuyo estado persistente se actualiza recien con ``items_exportados``
+CONFIRMAR = ("checkpoint", "cola", "catalogo", "solo_cambios")
 
 
 class DuplicatesPipeline(object):
     def __init__(self):
-        self.ids_seen = set()
+        # un conjunto compacto por tipo de item (sucursal, producto, ...)
+        self.vistos = {}
+        # productos exportados en corridas anteriores (``-a catalogo=...``)
+        self.catalogo = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls()
+        crawler.signals.connect(pipeline.productos_exportados, signal=items_exportados)
+        return pipeline
+
+    def open_spider(self, spider):
+        path = getattr(spider, "catalogo", None)
+        if path:
+            self.catalogo = CatalogoProductos(path)
+
+    def close_spider(self, spider):
+        if self.catalogo:
+            self.catalogo.close()
+
+    def producto_nuevo(self, id_, nombre, marca, presentacion):
+        """
+        ``False`` si el producto ya se exportó en otra corrida con los mismos datos.
+        """
+        return self.catalogo is None or self.catalogo.cambio(id_, nombre, marca, presentacion)
+
+    def productos_exportados(self, items):
+        """
+        Registra en el catalogo los productos que ya están escritos en disco (señal ``items_exportados``).
+        Los que no se llegaron a exportar se vuelven a exportar en la proxima corrida.
+        """
+        if self.catalogo is None:
+            return
+        productos = []
+        for item in items:
+            if isinstance(item, (ProductoItem, ProductoCategorizadoItem)):
+                productos.append((item["id"], item.get("nombre"), item.get("marca"), item.get("presentacion")))
+            elif isinstance(item, PaginaPreciosItem):
+                columnas = item["producto_ids"], item["nombres"], item["marcas"], item["presentaciones"]
+                productos.extend(tuple(columna[i] for columna in columnas) for i in item.get("productos_nuevos") or ())
+        if productos:
+            self.catalogo.registrar(productos)
+
+    def ids_seen(self, name):
+        if name not in self.vistos:
+            self.vistos[name] = IdsVistos()
+        return self.vistos[name]
 
     def process_item(self, item, spider):
-        if isinstance(item, PrecioItem):
+        if isinstance(item, (PrecioItem, SucursalGemelaItem, FinPaginaItem)):
             # los precios los queremos siempre
             return item
 
+        if isinstance(item, PaginaPreciosItem):
+            # marco los productos de la pagina no vistos, los precios pasan todos
+            ids_seen = self.ids_seen("producto")
+            nuevos = []
+            for i, id_ in enumerate(item["producto_ids"]):
+                if id_ not in ids_seen:
+                    ids_seen.add(id_)
+                    if self.producto_nuevo(id_, item["nombres"][i], item["marcas"][i], item["presentaciones"][i]):
+                        nuevos.append(i)
+            item["productos_nuevos"] = nuevos
+            return item
+
         id_ = item.get("id")
-        # esto puede ocupar mucha memoria \o/
-        if id_ and id_ in self.ids_seen:
+        ids_seen = self.ids_seen(item_type(item))
+        if id_ and id_ in ids_seen:
             raise DropItem(f"producto ya bajado")
+        ids_seen.add(id_)
+        if isinstance(item, (ProductoItem, ProductoCategorizadoItem)) and not self.producto_nuevo(
+            id_, item.get("nombre"), item.get("marca"), item.get("presentacion")
+        ):
+            raise DropItem(f"producto sin cambios desde la corrida anterior")
+        return item
+
+
+class PreciosCambiadosPipeline:
+    """
+    Con ``-a solo_cambios=<indice.sqlite>`` deja pasar solo los precios nuevos o distintos
+    (``precio``, ``precio_max`` o ``precio_min``) del ultimo conocido para cada
+    ``(sucursal_id, producto_id)``, segun un indice persistente entre corridas.
+
+    Al cerrar escribe en ``data/`` las bajas (pares de las sucursales scrapeadas que ya
+    no aparecieron) y un manifiesto de la corrida, con los que ``helpers.reconstruir_precios``
+    rearma el listado completo de precios a cada fecha.
+    """
+
+    def __init__(self):
+        self.indice = None
+        self.sucursales = set()
+        self.emitidos = 0
+        self.sin_cambios = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls()
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(pipeline.precios_exportados, signal=items_exportados)
+        return pipeline
+
+    def open_spider(self, spider):
+        path = getattr(spider, "solo_cambios", None)
+        if path:
+            self.path = path
+            self.inicio = datetime.datetime.utcnow()
+            self.indice = IndicePrecios(path, self.inicio.strftime("%Y%m%d-%H%M%S"))
+
+    def cambio(self, sucursal_id, producto_id, precio, precio_max, precio_min):
+        self.sucursales.add(str(sucursal_id))
+        if self.indice.cambio(sucursal_id, producto_id, precio, precio_max, precio_min):
+            self.emitidos += 1
+            return True
+        self.sin_cambios += 1
+        return False
+
+    def precios_exportados(self, items):
+        """
+        Guarda en el indice los precios que ya están escritos en disco (señal ``items_exportados``).
+        Si el job se corta antes, esos precios siguen figurando como cambiados en la proxima corrida.
+        """
+        if self.indice is None:
+            return
+        precios = []
+        for item in items:
+            if isinstance(item, PrecioItem):
+                precios.append(
+                    (item["sucursal_id"], item["producto_id"], item["precio"], item["precio_max"], item["precio_min"])
+                )
+            elif isinstance(item, PaginaPreciosItem) and item["precios"] is not None:
+                columnas = item["producto_ids"], item["precios"], item["precios_max"], item["precios_min"]
+                filas = item.get("filas_precios")
+                if filas is None:
+                    filas = range(len(item["producto_ids"]))
+                precios.extend((item["sucursal_id"],) + tuple(columna[i] for columna in columnas) for i in filas)
+        if precios:
+            self.indice.registrar(precios)
+
+    def process_item(self, item, spider):
+        if self.indice is None:
+            return item
+
+        if isinstance(item, PrecioItem):
+            if not self.cambio(
+                item["sucursal_id"], item["producto_id"], item["precio"], item["precio_max"], item["precio_min"]
+            ):
+                raise DropItem(f"precio sin cambios desde la corrida anterior")
+            return item
+
+        if isinstance(item, PaginaPreciosItem) and item["precios"] is not None:
+            sucursal_id = item["sucursal_id"]
+            item["filas_precios"] = [
+                i
+                for i, fila in enumerate(
+                    zip(item["producto_ids"], item["precios"], item["precios_max"], item["precios_min"])
+                )
+                if self.cambio(sucursal_id, *fila)
+            ]
+        return item
+
+    def spider_closed(self, spider, reason):
+        if self.indice is None:
+            return
+        fin = datetime.datetime.utcnow()
+        nombre = f"{spider.porcion}-{spider.total_spiders}-{self.indice.corrida}"
+        data = Path("data/")
+        data.mkdir(exist_ok=True)
+
+        # las bajas solo son confiables si esta corrida recorrió las sucursales de punta a punta
+        completa = reason == "finished" and not spider.checkpoint and not spider.cola
+        bajas = None
+        if completa:
+            bajas = f"baja-{nombre}.csv"
+            with (data / bajas).open("w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["sucursal_id", "producto_id", "fecha"])
+                writer.writerows(fila + (str(fin),) for fila in self.indice.bajas(sorted(self.sucursales)))
         else:
-            self.ids_seen.add(id_)
+            logger.warning("Corrida incompleta o repartida (%s): no se registran bajas de precios", reason)
+        self.indice.close()
+
+        manifiesto = {
+            "inicio": str(self.inicio),
+            "fin": str(fin),
+            "porcion": f"{spider.porcion}/{spider.total_spiders}",
+            "indice": str(self.path),
+            "completa": completa,
+            "sucursales": sorted(self.sucursales),
+            "precios_emitidos": self.emitidos,
+            "precios_sin_cambios": self.sin_cambios,
+            "bajas": bajas,
+        }
+        with (data / f"manifiesto-{nombre}.json").open("w") as f:
+            json.dump(manifiesto, f, indent=2)
+
+
+class PreciosPorCadenaPipeline:
+    """
+    Con ``-a dedup_cadena=1`` descarta mientras se scrapea los precios repetidos dentro de una cadena
+    (mismo ``producto_id`` y ``precio`` en otra sucursal con el mismo prefijo ``comercio-bandera``
+    de ``sucursal_id``), como hace despues ``consolidar_precios.py``.
+
+    Las claves vistas se guardan en una tabla de huellas de tamaño fijo
+    (``DEDUP_CADENA_SLOTS`` slots de 8 bytes), asi que la memoria no crece con el scrapeo.
+    """
+
+    def __init__(self, slots=1 << 22):
+        self.slots = slots
+        self.vistos = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(slots=crawler.settings.getint("DEDUP_CADENA_SLOTS", 1 << 22))
+
+    def open_spider(self, spider):
+        if getattr(spider, "dedup_cadena", False):
+            self.vistos = HuellasAcotadas(self.slots)
+
+    def process_item(self, item, spider):
+        if self.vistos is None:
+            return item
+
+        if isinstance(item, PrecioItem):
+            cadena = item["sucursal_id"].rpartition("-")[0]
+            if self.vistos.visto((cadena, item["producto_id"], item["precio"])):
+                raise DropItem(f"precio repetido en la cadena")
             return item
 
+        if isinstance(item, PaginaPreciosItem) and item["precios"] is not None:
+            cadena = item["sucursal_id"].rpartition("-")[0]
+            ids, precios = item["producto_ids"], item["precios"]
+            filas = item.get("filas_precios")
+            if filas is None:
+                filas = range(len(ids))
+            item["filas_precios"] = [i for i in filas if not self.vistos.visto((cadena, ids[i], precios[i]))]
+        return item
+
 
 def item_type(item):
     if isinstance(item, ProductoCategorizadoItem):
@@ -37,37 +286,304 @@ class MultiCSVItemPipeline:
 
     items = {"sucursal", "producto", "precio"}
 
-    def __init__(self):
+    def __init__(self, hilo=False, tamanio_cola=10000, crawler=None, sincronizar_cada=60):
         self.files = {}
         self.exporters = {}
-        dispatcher.connect(self.spider_closed, signal=signals.spider_closed)
+
+        # archivos sin comprimir debajo de ``files`` (para medir el tamaño escrito),
+        # marca de tiempo, numero de parte y filas escritas de cada tipo de item
+        self.crudos = {}
+        self.inicios = {}
+        self.partes = {}
+        self.filas = {}
+        self.rotacion = None
+
+        # con ``hilo`` la serializacion y escritura se hacen en un thread aparte,
+        # alimentado por una cola acotada
+        self.hilo = None
+        self.cola = queue.Queue(maxsize=tamanio_cola) if hilo else None
+        # items que esperan lugar en la cola, en orden de llegada
+        self.demorados = deque()
+
+        # items escritos desde la ultima sincronizacion a disco. Cada ``sincronizar_cada`` segundos
+        # se sincronizan los archivos y los items pasan a ``confirmados``, que se envian (desde el
+        # thread del reactor) con la señal ``items_exportados``. Solo si el spider la necesita (CONFIRMAR)
+        self.crawler = crawler
+        self.sincronizar_cada = sincronizar_cada
+        self.confirmar = False
+        self.exportados = []
+        self.confirmados = queue.SimpleQueue()
+        self.sincronizado = time.monotonic()
+        # despues de un error de escritura no se confirma nada más
+        self.error = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            hilo=crawler.settings.getbool("EXPORT_THREAD"),
+            tamanio_cola=crawler.settings.getint("EXPORT_QUEUE_SIZE", 10000),
+            crawler=crawler,
+            sincronizar_cada=crawler.settings.getfloat("EXPORT_SYNC_SECONDS", 60),
+        )
+
+    def open_spider(self, spider):
+        self.confirmar = bool(spider.exportar) and any(getattr(spider, opcion, None) for opcion in CONFIRMAR)
+        if self.cola is not None:
+            self.hilo = threading.Thread(target=self.escritor, name="exportador", daemon=True)
+            self.hilo.start()
+
+    def escritor(self):
+        """
+        Loop del thread de escritura: exporta lo que llega a la cola hasta recibir ``None``.
+        """
+        while True:
+            tarea = self.cola.get()
+            if tarea is None:
+                return
+            item, spider = tarea
+            try:
+                self.escribir(item, spider)
+            except Exception as error:
+                logger.exception("Error exportando %r", item)
+                self.error = self.error or error
+                continue
+            self.registrar(item)
+
+    def registrar(self, item):
+        """
+        Anota ``item`` como escrito y, si pasaron ``sincronizar_cada`` segundos, sincroniza.
+        """
+        if not self.confirmar:
+            return
+        self.exportados.append(item)
+        if time.monotonic() - self.sincronizado >= self.sincronizar_cada:
+            self.sincronizar()
+
+    def sincronizar(self):
+        """
+        Lleva a disco lo exportado hasta ahora y pasa los items escritos a ``confirmados``.
+
+        Los CSV sin comprimir se sincronizan en el lugar. Un archivo comprimido o parquet no
+        es legible hasta cerrarlo, así que se cierra y el siguiente item abre la parte siguiente.
+        """
+        for name in list(self.exporters):
+            exporter, crudo = self.exporters[name], self.crudos[name]
+            if self.files[name] is crudo and hasattr(exporter, "stream"):
+                exporter.stream.flush()
+                crudo.flush()
+                os.fsync(crudo.fileno())
+            else:
+                self.close_exporter(name)
+                self.partes[name] += 1
+        self.sincronizado = time.monotonic()
+        if self.exportados and self.error is None:
+            self.confirmados.put(self.exportados)
+        self.exportados = []
+
+    def enviar_confirmados(self, spider):
+        """
+        Envia ``items_exportados`` por cada lote confirmado. Se llama desde el thread del reactor.
+        """
+        while True:
+            try:
+                items = self.confirmados.get_nowait()
+            except queue.Empty:
+                return
+            self.crawler.signals.send_catch_log(items_exportados, items=items, spider=spider)
+
+    def opcion(self, spider, atributo, setting, default=None):
+        """
+        Opcion de exportacion: el argumento ``-a <atributo>=...`` del spider o si no, el ``setting``.
+        """
+        valor = getattr(spider, atributo, None)
+        if not valor and getattr(spider, "settings", None) is not None:
+            valor = spider.settings.get(setting)
+        return valor or default
+
+    def formato(self, spider):
+        """
+        Formato de salida: ``-a formato=...`` del spider o el setting ``EXPORT_FORMAT``.
+        ``csv`` (default) o ``parquet``.
+        """
+        return self.opcion(spider, "formato", "EXPORT_FORMAT", "csv")
 
     def open_exporter(self, spider, item_type):
         """
         Inicializa el archivo y el exportador de salida
         Se invoca ante el primer
         """
-        today = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
         data = Path("data/")
         data.mkdir(exist_ok=True)
+        if self.rotacion is None:
+            self.rotacion = (
+                int(self.opcion(spider, "rotar_filas", "EXPORT_ROTATE_ROWS", 0)),
+                int(float(self.opcion(spider, "rotar_mb", "EXPORT_ROTATE_MB", 0)) * 2**20),
+            )
+        if item_type not in self.inicios:
+            self.inicios[item_type] = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            self.partes[item_type] = 0
+        self.filas[item_type] = 0
 
-        self.files[item_type] = (data / f"{item_type}-{spider.porcion}-{spider.total_spiders}-{today}.csv").open("w+b")
-        self.exporters[item_type] = CsvItemExporter(self.files[item_type])
+        formato = self.formato(spider)
+        # parquet ya se escribe comprimido
+        compresion = self.opcion(spider, "comprimir", "EXPORT_COMPRESSION") if formato == "csv" else None
+        nombre = f"{item_type}-{spider.porcion}-{spider.total_spiders}-{self.inicios[item_type]}"
+        # al sincronizar se cierran las partes que no se pueden sincronizar abiertas (ver ``sincronizar``)
+        if any(self.rotacion) or (self.confirmar and (formato != "csv" or compresion)):
+            nombre += f"-{self.partes[item_type]:04d}"
+        nombre += f".{formato}"
+        if compresion:
+            nombre += f".{EXTENSIONES[compresion]}"
+
+        self.crudos[item_type] = (data / nombre).open("w+b")
+        if compresion:
+            self.files[item_type] = comprimir(self.crudos[item_type], compresion)
+        else:
+            self.files[item_type] = self.crudos[item_type]
+        if formato == "parquet":
+            self.exporters[item_type] = ParquetItemExporter(self.files[item_type], item_type)
+        elif item_type in COLUMNAS:
+            self.exporters[item_type] = FilasCsvExporter(self.files[item_type], item_type)
+        else:
+            self.exporters[item_type] = CsvItemExporter(self.files[item_type])
         self.exporters[item_type].start_exporting()
 
-    def spider_closed(self, spider):
-        for e in self.exporters.values():
-            e.finish_exporting()
-        for f in self.files.values():
-            f.close()
+    def close_spider(self, spider):
+        hilo = self.hilo
+        if hilo is not None:
+            # vacio la cola antes de cerrar los archivos
+            self.cola.put(None)
+            hilo.join()
+            self.hilo = None
+        for name in list(self.exporters):
+            self.close_exporter(name)
+        if self.confirmar:
+            self.sincronizar()
+            self.enviar_confirmados(spider)
+        if hilo is not None and self.error is not None:
+            # los errores del thread sólo se loggearon: el cierre falla para que la corrida no parezca completa
+            raise self.error
+
+    def close_exporter(self, name):
+        self.exporters.pop(name).finish_exporting()
+        archivo, crudo = self.files.pop(name), self.crudos.pop(name)
+        if archivo is not crudo:
+            # cierra el stream comprimido, ``crudo`` queda abierto
+            archivo.close()
+        if not crudo.closed:
+            if self.confirmar:
+                crudo.flush()
+                os.fsync(crudo.fileno())
+            crudo.close()
+
+    def contar_filas(self, name, filas):
+        """
+        Suma las filas escritas y, si se alcanzó el limite de filas o de tamaño
+        (``rotar_filas`` / ``rotar_mb``), cierra el archivo. El siguiente item abre la parte siguiente.
+        """
+        self.filas[name] += filas
+        max_filas, max_bytes = self.rotacion
+        if (max_filas and self.filas[name] >= max_filas) or (max_bytes and self.crudos[name].tell() >= max_bytes):
+            self.close_exporter(name)
+            self.partes[name] += 1
 
     def process_item(self, item, spider):
-        if spider.exportar:
-            self.export_item(item, spider)
+        if not spider.exportar:
+            return item
+        if self.cola is None:
+            try:
+                self.escribir(item, spider)
+            except Exception as error:
+                self.error = self.error or error
+                raise
+            self.registrar(item)
+        else:
+            item = self.encolar(item, spider)
+        self.enviar_confirmados(spider)
         return item
 
-    def export_item(self, item, spider):
-        name = item_type(item)
+    def encolar(self, item, spider):
+        if not self.demorados:
+            try:
+                self.cola.put_nowait((item, spider))
+                return item
+            except queue.Full:
+                pass
+        # back-pressure: el item queda en proceso hasta que haya lugar en la cola,
+        # lo que frena al scraper sin bloquear el reactor. Los items siguientes esperan
+        # detrás, para que lleguen al thread en el orden en que se scrapearon
+        listo = Deferred()
+        self.demorados.append((item, spider, listo))
+        if len(self.demorados) == 1:
+            self.reintentar_luego()
+        return listo
+
+    def reintentar_luego(self):
+        from twisted.internet import reactor
+
+        reactor.callLater(0.05, self.desencolar_demorados)
+
+    def desencolar_demorados(self):
+        while self.demorados:
+            item, spider, listo = self.demorados[0]
+            try:
+                self.cola.put_nowait((item, spider))
+            except queue.Full:
+                self.reintentar_luego()
+                return
+            self.demorados.popleft()
+            listo.callback(item)
+
+    def escribir(self, item, spider):
+        if isinstance(item, FinPaginaItem):
+            # solo marca el avance, no se escribe
+            return
+        if isinstance(item, PaginaPreciosItem):
+            self.export_pagina(item, spider)
+        else:
+            self.export_item(item, spider)
+
+    def export_pagina(self, item, spider):
+        """
+        Exporta una ``PaginaPreciosItem`` como filas de producto y precio,
+        sin construir un item por fila.
+        """
+        # filas en el orden de ProductoItem y PrecioItem (ver exporters.COLUMNAS)
+        productos = list(zip(item["producto_ids"], item["nombres"], item["presentaciones"], item["marcas"]))
+        nuevos = item.get("productos_nuevos")
+        if nuevos is not None:
+            productos = [productos[i] for i in nuevos]
+        if productos:
+            self.exporter(spider, "producto").export_filas(productos)
+            self.contar_filas("producto", len(productos))
+
+        if item["precios"] is None:
+            return
+        columnas = item["producto_ids"], item["precios"], item["precios_max"], item["precios_min"]
+        filas = item.get("filas_precios")
+        if filas is not None:
+            # solo los precios que dejaron pasar PreciosCambiadosPipeline / PreciosPorCadenaPipeline
+            columnas = [[columna[i] for i in filas] for columna in columnas]
+        n = len(columnas[0])
+        if not n:
+            return
+        exporter = self.exporter(spider, "precio")
+        # la fecha se formatea una vez por pagina
+        exporter.export_filas(
+            zip(
+                [item["sucursal_id"]] * n,
+                *columnas,
+                [exporter.formatear_fecha(item["fecha_relevamiento"])] * n,
+            )
+        )
+        self.contar_filas("precio", n)
+
+    def exporter(self, spider, name):
         if name not in self.files:
             self.open_exporter(spider, name)
-        self.exporters[name].export_item(item)
+        return self.exporters[name]
+
+    def export_item(self, item, spider):
+        name = item_type(item)
+        self.exporter(spider, name).export_item(item)
+        self.contar_filas(name, 1)
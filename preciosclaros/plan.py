@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import heapq
+import json
+
+
+def repartir(paginas, porciones):
+    """
+    Reparte sucursales en ``porciones`` de manera que cada una tenga
+    aproximadamente la misma cantidad de paginas a scrapear.
+
+    ``paginas`` es un dict ``{id_sucursal: cantidad_de_paginas}``.
+    Usa la heuristica LPT: de la sucursal más grande a la más chica,
+    cada una se asigna a la porción con menos paginas acumuladas.
+
+    Devuelve una lista de ``(paginas, [ids])`` por porción.
+    """
+    heap = [(0, i, []) for i in range(porciones)]
+    for id_sucursal, n in sorted(paginas.items(), key=lambda kv: (-kv[1], kv[0])):
+        carga, i, ids = heapq.heappop(heap)
+        ids.append(id_sucursal)
+        heapq.heappush(heap, (carga + n, i, ids))
+    return [(carga, ids) for carga, i, ids in sorted(heap, key=lambda t: t[1])]
+
+
+def guardar_plan(path, reparto, limit):
+    plan = {
+        "limit": limit,
+        "paginas": [carga for carga, ids in reparto],
+        "porciones": [ids for carga, ids in reparto],
+    }
+    with open(path, "w") as f:
+        json.dump(plan, f, indent=1)
+
+
+def leer_plan(path, porcion, total_porciones):
+    """
+    Devuelve los ids de sucursales asignados a ``porcion`` (base 1) en el plan.
+    """
+    with open(path) as f:
+        plan = json.load(f)
+    porciones = plan["porciones"]
+    if len(porciones) != total_porciones:
+        raise ValueError(f"El plan {path} tiene {len(porciones)} porciones, no {total_porciones}")
+    return porciones[porcion - 1]
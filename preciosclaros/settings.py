@@ -23,6 +23,8 @@ ROBOTSTXT_OBEY = False
 
 ITEM_PIPELINES = {
     'preciosclaros.pipelines.DuplicatesPipeline': 100,
+    'preciosclaros.pipelines.PreciosCambiadosPipeline': 150,
+    'preciosclaros.pipelines.PreciosPorCadenaPipeline': 170,
     'preciosclaros.pipelines.MultiCSVItemPipeline': 200,
 }
 
@@ -103,3 +105,26 @@ AUTOTHROTTLE_ENABLED = True
 #HTTPCACHE_DIR = 'httpcache'
 #HTTPCACHE_IGNORE_HTTP_CODES = []
 #HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+
+# Decodificador de las respuestas de la API: "orjson" (default si está instalado) o "json"
+#JSON_DECODER = 'orjson'
+
+# Slots (de 8 bytes) de la tabla de precios vistos por cadena de PreciosPorCadenaPipeline (-a dedup_cadena=1)
+#DEDUP_CADENA_SLOTS = 2**22
+
+# Formato de los archivos exportados: "csv" (default) o "parquet" (requiere pyarrow)
+#EXPORT_FORMAT = 'parquet'
+
+# Exportar desde un thread aparte, con una cola acotada de EXPORT_QUEUE_SIZE items
+#EXPORT_THREAD = True
+#EXPORT_QUEUE_SIZE = 10000
+
+# Compresión de los CSV exportados ("gzip" o "zstd") y rotación en partes por filas o megabytes
+#EXPORT_COMPRESSION = 'gzip'
+#EXPORT_ROTATE_ROWS = 1000000
+#EXPORT_ROTATE_MB = 512
+
+# Con -a checkpoint=..., -a cola=..., -a catalogo=... o -a solo_cambios=... los archivos exportados se sincronizan
+# a disco cada EXPORT_SYNC_SECONDS segundos; recien entonces se marcan como hechas las paginas y se registran
+# los productos y precios exportados
+#EXPORT_SYNC_SECONDS = 60
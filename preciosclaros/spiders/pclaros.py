@@ -1,10 +1,25 @@
 # -*- coding: utf-8 -*-
-import json
 import math
 from collections import defaultdict
 from datetime import datetime
 import scrapy
-from preciosclaros.items import SucursalItem, ProductoItem, ProductoCategorizadoItem, PrecioItem
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from preciosclaros.checkpoint import Checkpoint
+from preciosclaros.cola import ColaTrabajo
+from preciosclaros.decoders import get_decodificador, filas_productos
+from preciosclaros.delta import HuellasSucursales, huella_pagina, huella_sucursal
+from preciosclaros.plan import leer_plan
+from preciosclaros.pipelines import items_exportados
+from preciosclaros.items import (
+    FinPaginaItem,
+    SucursalItem,
+    ProductoItem,
+    ProductoCategorizadoItem,
+    PrecioItem,
+    PaginaPreciosItem,
+    SucursalGemelaItem,
+)
 
 
 HEADERS = {
@@ -32,6 +47,11 @@ productos_url = base_url + "prod/productos"  # ?id_sucursal
 LIMIT_SUCURSALES = 30
 LIMIT_PRODUCTOS = 50
 
+# tamaños de pagina a probar con ``limite=auto``, de mayor a menor.
+# el ultimo es siempre el limite fijo conocido, que sabemos que funciona.
+CANDIDATOS_LIMIT_SUCURSALES = (500, 200, 100, LIMIT_SUCURSALES)
+CANDIDATOS_LIMIT_PRODUCTOS = (500, 200, 100, LIMIT_PRODUCTOS)
+
 
 class PreciosClarosSpider(scrapy.Spider):
     name = "preciosclaros"
@@ -46,6 +66,21 @@ class PreciosClarosSpider(scrapy.Spider):
         productos=1,
         precios=1,
         ids="",
+        limite="",
+        checkpoint="",
+        cola="",
+        lease=600,
+        plan="",
+        delta="",
+        gemelas=0,
+        lotes=0,
+        catalogo="",
+        formato="",
+        comprimir="",
+        rotar_filas=0,
+        rotar_mb=0,
+        solo_cambios="",
+        dedup_cadena=0,
         *args,
         **kwargs,
     ):
@@ -60,28 +95,251 @@ class PreciosClarosSpider(scrapy.Spider):
         self.sucursales_por_cadena = defaultdict(int)  # lleva la cuenta
 
         self.exportar = exportar
+        self.formato = formato  # csv (default) o parquet
+        self.comprimir = comprimir  # gzip o zstd
+        # cortar los archivos exportados en partes de N filas o N megabytes
+        self.rotar_filas = int(rotar_filas)
+        self.rotar_mb = float(rotar_mb)
 
         # flags para skipear items
         self.sucursales = bool(int(sucursales))
         self.productos = bool(int(productos))
         self.precios = bool(int(precios))
         self.ids = [i.strip() for i in ids.split(",") if i.strip()]
+        # las sucursales de la porcion las define el plan (ver planificar_porciones.py). Se recorre
+        # el listado completo de sucursales y se toman las del plan, para exportar sus SucursalItem
+        self.plan = None
+        self.planificadas_vistas = set()
+        if plan:
+            planificadas = leer_plan(plan, self.porcion, self.total_spiders)
+            if self.sucursales:
+                self.plan = set(planificadas)
+            else:
+                self.ids = planificadas
+
+        # tamaño de pagina. Con ``limite=auto`` se sondea al inicio el mayor que acepta la API
+        self.limite_auto = limite == "auto"
+        self.limit_sucursales = LIMIT_SUCURSALES
+        self.limit_productos = LIMIT_PRODUCTOS
+
+        # registro del avance para retomar un scrapeo interrumpido. Una pagina se marca hecha
+        # cuando sus items ya están exportados en disco, asi que requiere ``exportar``
+        assert exportar or not checkpoint, "checkpoint requiere exportar"
+        self.checkpoint = Checkpoint(checkpoint) if checkpoint else None
+
+        # cola de trabajo compartida con otros procesos, en lugar del reparto estatico por porcion.
+        # Como el checkpoint, completa las paginas recien exportadas
+        assert exportar or not cola, "cola requiere exportar"
+        self.cola = ColaTrabajo(cola, lease=int(lease)) if cola else None
+
+        # modo delta: solo se bajan completas las sucursales cuya huella cambió
+        self.delta = HuellasSucursales(delta) if delta else None
+        self.delta_pendientes = {}  # id_sucursal => {"huella": ..., "offsets": set(...)}
+
+        # deteccion de sucursales "gemelas": misma cadena y mismos precios que otra ya scrapeada
+        self.gemelas = bool(int(gemelas))
+        self.huellas_por_cadena = {}  # (comercio-bandera, huella) => id_sucursal de referencia
+
+        self.decodificar = get_decodificador()
+
+        # un item por pagina (PaginaPreciosItem) en lugar de uno por producto y precio
+        self.lotes = bool(int(lotes))
+
+        # indice de productos ya exportados en otras corridas (lo usa DuplicatesPipeline)
+        self.catalogo = catalogo
+
+        # indice de los ultimos precios conocidos: solo se exportan los que cambiaron (PreciosCambiadosPipeline)
+        self.solo_cambios = solo_cambios
+
+        # descartar precios repetidos entre sucursales de la misma cadena (PreciosPorCadenaPipeline).
+        # No se combina con solo_cambios: el indice guarda el precio de cada sucursal, y las que
+        # se descartan no se exportan ni se registran, asi que reconstruir_precios les dejaria el precio viejo
+        self.dedup_cadena = bool(int(dedup_cadena))
+        assert not (solo_cambios and self.dedup_cadena), "solo_cambios no se puede combinar con dedup_cadena"
         super().__init__(*args, **kwargs)
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.decodificar = get_decodificador(crawler.settings.get("JSON_DECODER"))
+        if spider.checkpoint or spider.cola:
+            crawler.signals.connect(spider.paginas_exportadas, signal=items_exportados)
+        if spider.cola:
+            crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    def closed(self, reason):
+        if self.plan is not None and self.plan - self.planificadas_vistas:
+            faltantes = sorted(self.plan - self.planificadas_vistas)
+            self.logger.warning("%s sucursales del plan no están en el listado: %s", len(faltantes), faltantes)
+        if self.checkpoint:
+            self.checkpoint.close()
+        if self.cola:
+            self.cola.close()
+        if self.delta:
+            self.delta.close()
+
+    def paginas_exportadas(self, items):
+        """
+        Marca como hechas en el checkpoint y/o la cola las paginas cuyos items ya están
+        en disco (señal ``items_exportados``).
+        """
+        paginas = [(i["sucursal_id"], i["offset"], i["limite"]) for i in items if isinstance(i, FinPaginaItem)]
+        if not paginas:
+            return
+        if self.checkpoint:
+            self.checkpoint.marcar_paginas(paginas)
+        if self.cola:
+            self.cola.completar_varias([(id_sucursal, offset) for id_sucursal, offset, _ in paginas])
+
+    def tomar_de_cola(self, cantidad):
+        """
+        Toma unidades de la cola compartida y devuelve sus requests.
+        """
+        return [
+            self.productos_request(id_sucursal, offset, total, limit)
+            for id_sucursal, offset, limit, total in self.cola.tomar(cantidad)
+        ]
+
+    def spider_idle(self):
+        """
+        Sin requests pendientes: si la cola tiene trabajo disponible (nuevo o con lease vencido)
+        lo toma y evita que el spider cierre.
+        """
+        requests = self.tomar_de_cola(self.settings.getint("CONCURRENT_REQUESTS"))
+        if not requests:
+            return
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        raise DontCloseSpider
+
     def start_requests(self):
-        import ipdb;ipdb.set_trace()
+        if self.limite_auto:
+            if self.ids:
+                yield self.sondeo_productos_request(self.ids[0], 0)
+            else:
+                yield self.sondeo_sucursales_request(0)
+            return
+        for request in self.iniciar():
+            yield request
+
+    def iniciar(self):
         if self.ids:
-            for id_sucursal in self.ids:
-                yield scrapy.Request(
-                        url=productos_url + f"?limit={LIMIT_PRODUCTOS}&id_sucursal={id_sucursal}",
-                        callback=self.parse_productos_first_page,
-                        headers=HEADERS,
-                        meta={"id_sucursal": id_sucursal},
-                )
+            for request in self.productos_requests(self.ids):
+                yield request
         else:
-            yield scrapy.Request(
-                url=sucursales_url + f"?limit={LIMIT_SUCURSALES}", callback=self.parse_sucursal_first_page, headers=HEADERS
-            )
+            yield self.sucursales_request()
+
+    def sucursales_request(self, offset=None, end=None, limit=None):
+        """
+        Request a una pagina de sucursales. Sin ``offset`` es la primer pagina, que obtiene el total.
+        """
+        limit = limit or self.limit_sucursales
+        if offset is None:
+            url, callback, meta = sucursales_url + f"?limit={limit}", self.parse_sucursal_first_page, {}
+        else:
+            url, callback = sucursales_url + f"?limit={limit}&offset={offset}", self.parse_sucursal
+            meta = {"offset": offset, "end": end}
+        return scrapy.Request(
+            url=url,
+            callback=callback,
+            errback=self.sucursales_fallido if self.limite_auto else None,
+            headers=HEADERS,
+            meta={**meta, "limit": limit},
+        )
+
+    def sondeo_sucursales_request(self, intento):
+        limit = CANDIDATOS_LIMIT_SUCURSALES[intento]
+        return scrapy.Request(
+            url=sucursales_url + f"?limit={limit}",
+            callback=self.parse_sondeo_sucursales,
+            errback=self.sondeo_fallido,
+            headers=HEADERS,
+            dont_filter=True,
+            meta={"sondeo": "sucursales", "intento": intento, "limit": limit},
+        )
+
+    def sondeo_productos_request(self, id_sucursal, intento):
+        limit = CANDIDATOS_LIMIT_PRODUCTOS[intento]
+        return scrapy.Request(
+            url=productos_url + f"?limit={limit}&id_sucursal={id_sucursal}",
+            callback=self.parse_sondeo_productos,
+            errback=self.sondeo_fallido,
+            headers=HEADERS,
+            dont_filter=True,
+            meta={"sondeo": "productos", "intento": intento, "limit": limit, "id_sucursal": id_sucursal},
+        )
+
+    def pagina_completa(self, response, clave):
+        """
+        Indica si la pagina sondeada vino sin errores ni truncada,
+        es decir, con ``min(limit, total)`` elementos.
+        """
+        try:
+            json_data = self.decodificar(response.body)
+            return len(json_data[clave]) == min(response.meta["limit"], json_data["total"])
+        except (ValueError, KeyError, TypeError):
+            return False
+
+    def parse_sondeo_sucursales(self, response):
+        """
+        Sondea el tamaño de pagina de ``sucursales_url``, probando
+        ``CANDIDATOS_LIMIT_SUCURSALES`` de mayor a menor.
+        Luego sondea el de productos con una sucursal de la respuesta.
+        """
+        intento = response.meta["intento"]
+        if not self.pagina_completa(response, "sucursales") and intento + 1 < len(CANDIDATOS_LIMIT_SUCURSALES):
+            yield self.sondeo_sucursales_request(intento + 1)
+            return
+        self.limit_sucursales = response.meta["limit"]
+        self.logger.info("Usando limit=%s para sucursales", self.limit_sucursales)
+        try:
+            id_sucursal = self.decodificar(response.body)["sucursales"][0]["id"]
+        except (ValueError, KeyError, IndexError):
+            # no hay con qué sondear productos; sigo con el limite fijo
+            id_sucursal = None
+        if id_sucursal:
+            yield self.sondeo_productos_request(id_sucursal, 0)
+        else:
+            for request in self.iniciar():
+                yield request
+
+    def parse_sondeo_productos(self, response):
+        """
+        Sondea el tamaño de pagina de ``productos_url``, probando
+        ``CANDIDATOS_LIMIT_PRODUCTOS`` de mayor a menor, y arranca el scrapeo.
+        """
+        intento = response.meta["intento"]
+        if not self.pagina_completa(response, "productos") and intento + 1 < len(CANDIDATOS_LIMIT_PRODUCTOS):
+            yield self.sondeo_productos_request(response.meta["id_sucursal"], intento + 1)
+            return
+        self.limit_productos = response.meta["limit"]
+        self.logger.info("Usando limit=%s para productos", self.limit_productos)
+        for request in self.iniciar():
+            yield request
+
+    def sondeo_fallido(self, failure):
+        """
+        Errback de los sondeos: un error HTTP cuenta como tamaño de pagina no soportado.
+        Si falla también el ultimo candidato (el limite fijo) se arranca igual con los limites fijos.
+        """
+        meta = failure.request.meta
+        intento = meta["intento"] + 1
+        if meta["sondeo"] == "sucursales":
+            if intento < len(CANDIDATOS_LIMIT_SUCURSALES):
+                yield self.sondeo_sucursales_request(intento)
+                return
+            self.logger.error("Falló el sondeo de sucursales: %s", failure.value)
+        elif intento < len(CANDIDATOS_LIMIT_PRODUCTOS):
+            yield self.sondeo_productos_request(meta["id_sucursal"], intento)
+            return
+        else:
+            self.logger.error("Falló el sondeo de productos: %s", failure.value)
+        self.logger.warning(
+            "Usando los limites fijos: %s sucursales y %s productos", self.limit_sucursales, self.limit_productos
+        )
+        for request in self.iniciar():
+            yield request
 
     def parse_sucursal_first_page(self, response):
         """
@@ -92,8 +350,17 @@ class PreciosClarosSpider(scrapy.Spider):
         cada cada uno scrappee su "grupo" de sucursales,
         en páginas de tamaño ``LIMIT``
         """
-        json_data = json.loads(response.text)
-        total = json_data["total"]
+        json_data = self.decodificar(response.body)
+        try:
+            total = json_data["total"]
+        except KeyError:
+            requests = self.reducir_limit_sucursales(response.request)
+            if requests is None:
+                self.logger.error(response.text)
+                raise
+            for request in requests:
+                yield request
+            return
 
         sucursales_por_spider = int(math.ceil((total / self.total_spiders)))
         self.logger.info(f"{total} sucursales en {self.total_spiders} spiders: {sucursales_por_spider} por spider")
@@ -102,15 +369,43 @@ class PreciosClarosSpider(scrapy.Spider):
             return
         start = sucursales_por_spider * (self.porcion - 1)
         end = start + sucursales_por_spider
+        if self.plan is not None:
+            # las sucursales del plan pueden estar en cualquier pagina del listado
+            start, end = 0, total
 
         # process pages
-        for offset in range(start, end, LIMIT_SUCURSALES):
-            yield scrapy.Request(
-                url=sucursales_url + f"?limit={LIMIT_SUCURSALES}&offset={offset}",
-                callback=self.parse_sucursal,
-                headers=HEADERS,
-                meta={"offset": offset, "end": end},
-            )
+        for offset in range(start, end, self.limit_sucursales):
+            yield self.sucursales_request(offset, end)
+
+    def reducir_limit_sucursales(self, request):
+        """
+        Backoff de ``limite=auto`` para las paginas de sucursales, como ``reducir_limit``
+        para las de productos: reduce el tamaño de pagina a la mitad y vuelve a pedir
+        el mismo rango en paginas más chicas.
+
+        Devuelve la lista de requests o ``None`` si ya no se puede reducir.
+        """
+        meta = request.meta
+        limit = meta.get("limit", LIMIT_SUCURSALES)
+        if not self.limite_auto or limit <= LIMIT_SUCURSALES:
+            return None
+        self.limit_sucursales = min(self.limit_sucursales, max(LIMIT_SUCURSALES, limit // 2))
+        self.logger.warning("Reduciendo limit de sucursales a %s", self.limit_sucursales)
+        if "offset" not in meta:
+            # falló la primer pagina, la vuelvo a pedir con el limit nuevo
+            return [self.sucursales_request()]
+        offset = meta["offset"]
+        return [
+            self.sucursales_request(o, meta["end"], min(self.limit_sucursales, offset + limit - o))
+            for o in range(offset, offset + limit, self.limit_sucursales)
+        ]
+
+    def sucursales_fallido(self, failure):
+        requests = self.reducir_limit_sucursales(failure.request)
+        if requests is None:
+            self.logger.error("Falló %s: %s", failure.request.url, failure.value)
+            return []
+        return requests
 
     def parse_sucursal(self, response):
         """
@@ -121,11 +416,25 @@ class PreciosClarosSpider(scrapy.Spider):
         pagina de los productos
         """
         self.logger.info("Obteniendo sucursales %s/%s", response.meta.get("offset"), response.meta.get("end"))
-        sucursales = json.loads(response.text)["sucursales"]
+        try:
+            sucursales = self.decodificar(response.body)["sucursales"]
+        except KeyError:
+            requests = self.reducir_limit_sucursales(response.request)
+            if requests is None:
+                self.logger.error(response.text)
+                raise
+            for request in requests:
+                yield request
+            return
+        ids_sucursales = []
         for suc in sucursales:
 
             item = SucursalItem(suc)
             id_sucursal = item["id"]
+            if self.plan is not None:
+                if id_sucursal not in self.plan:
+                    continue
+                self.planificadas_vistas.add(id_sucursal)
 
             # chequeo limite
             if self.max_sucursales_por_cadena:
@@ -143,66 +452,357 @@ class PreciosClarosSpider(scrapy.Spider):
                     continue
 
             yield item
-            if self.productos:
-                yield scrapy.Request(
-                    url=productos_url + f"?limit={LIMIT_PRODUCTOS}&id_sucursal={id_sucursal}",
-                    callback=self.parse_productos_first_page,
-                    headers=HEADERS,
-                    meta={"id_sucursal": id_sucursal},
-                )
+            ids_sucursales.append(id_sucursal)
+
+        if self.productos:
+            for request in self.productos_requests(ids_sucursales):
+                yield request
+
+    def productos_requests(self, ids_sucursales):
+        """
+        Genera los requests a la primer pagina de productos de las sucursales dadas,
+        un request por sucursal.
+        """
+        if self.cola:
+            # las sucursales se encolan; cualquier worker las toma en ``spider_idle``
+            self.cola.agregar([(id_sucursal, 0, None, None) for id_sucursal in ids_sucursales])
+            return
+
+        for id_sucursal in ids_sucursales:
+            total = self.checkpoint.total(id_sucursal) if self.checkpoint else None
+            if total is None:
+                yield self.productos_request(id_sucursal)
+                continue
+            # sucursal ya iniciada en un job anterior: solo las paginas que faltan
+            pendientes = self.checkpoint.pendientes(id_sucursal, total, self.limit_productos)
+            self.logger.info("Sucursal %s retomada: %s paginas pendientes", id_sucursal, len(pendientes))
+            for offset, limit in pendientes:
+                yield self.productos_request(id_sucursal, offset, total, limit)
+
+    def productos_request(self, id_sucursal, offset=0, total=None, limit=None):
+        """
+        Request a una pagina de productos de una sucursal.
+        Sin ``total`` es la primer pagina, que lo obtiene.
+        """
+        limit = limit or self.limit_productos
+        first_page = total is None
+        return scrapy.Request(
+            url=productos_url + f"?limit={limit}&offset={offset}&id_sucursal={id_sucursal}"
+            if offset
+            else productos_url + f"?limit={limit}&id_sucursal={id_sucursal}",
+            callback=self.parse_productos_first_page if first_page else self.parse_productos_y_precios,
+            errback=self.productos_fallido if self.limite_auto else None,
+            headers=HEADERS,
+            meta={"offset": offset, "total": total, "id_sucursal": id_sucursal, "limit": limit},
+        )
+
+    def reducir_limit(self, request):
+        """
+        Backoff de ``limite=auto``: si una pagina falla, reduce a la mitad
+        el tamaño de pagina y vuelve a pedir el mismo rango en paginas más chicas.
+
+        Devuelve la lista de requests o ``None`` si ya no se puede reducir.
+        """
+        meta = request.meta
+        limit = meta.get("limit", LIMIT_PRODUCTOS)
+        if not self.limite_auto or limit <= LIMIT_PRODUCTOS:
+            return None
+        self.limit_productos = min(self.limit_productos, max(LIMIT_PRODUCTOS, limit // 2))
+        self.logger.warning("Reduciendo limit de productos a %s", self.limit_productos)
+        offset, total = meta["offset"], meta["total"]
+        if total is None:
+            # falló la primer pagina, la vuelvo a pedir con el limit nuevo
+            return [self.productos_request(meta["id_sucursal"])]
+        end = min(offset + limit, total)
+        return [
+            self.productos_request(meta["id_sucursal"], o, total, min(self.limit_productos, end - o))
+            for o in range(offset, end, self.limit_productos)
+        ]
+
+    def productos_fallido(self, failure):
+        requests = self.reducir_limit(failure.request)
+        if requests is None:
+            self.logger.error("Falló %s: %s", failure.request.url, failure.value)
+            return []
+        return requests
 
     def parse_productos_first_page(self, response):
-        json_data = json.loads(response.text)
-        total = json_data["total"]
+        json_data = self.decodificar(response.body)
+        try:
+            total = json_data["total"]
+        except KeyError:
+            requests = self.reducir_limit(response.request)
+            if requests is None:
+                self.logger.error(response.text)
+                raise
+            for request in requests:
+                yield request
+            return
+
+        if self.gemelas or (self.delta and self.precios):
+            for item_or_request in self.muestrear_sucursal(response, total):
+                yield item_or_request
+            return
+
         # procesar  items de la primera pagina ya solicitada
         for items in self.parse_productos_y_precios(response, total):
             yield items
         id_sucursal = response.meta["id_sucursal"]
+        limit = response.meta.get("limit", LIMIT_PRODUCTOS)
 
-        for offset in range(LIMIT_PRODUCTOS, total, LIMIT_PRODUCTOS):
-            yield scrapy.Request(
-                url=productos_url + f"?limit={LIMIT_PRODUCTOS}&offset={offset}&id_sucursal={id_sucursal}",
-                callback=self.parse_productos_y_precios,
-                headers=HEADERS,
-                meta={"offset": offset, "total": total, "id_sucursal": response.meta["id_sucursal"]},
+        if self.cola:
+            # el resto de las paginas queda disponible para cualquier worker
+            self.cola.agregar(
+                [(id_sucursal, o, self.limit_productos, total) for o in range(limit, total, self.limit_productos)]
             )
+            return
+
+        if self.checkpoint:
+            self.checkpoint.guardar_total(id_sucursal, total)
+            for offset, limit in self.checkpoint.pendientes(id_sucursal, total, self.limit_productos, desde=limit):
+                yield self.productos_request(id_sucursal, offset, total, limit)
+            return
+
+        for offset in range(limit, total, self.limit_productos):
+            yield self.productos_request(id_sucursal, offset, total)
 
     def parse_productos_y_precios(self, response, total=None):
-        json_data = json.loads(response.text)
+        json_data = self.decodificar(response.body)
         self.logger.info(
             "Obteniendo  %s/%s precios para la sucursal %s",
-            response.meta.get("offset", 50),
-            response.meta.get("total", total),
+            response.meta.get("offset") or response.meta.get("limit", LIMIT_PRODUCTOS),
+            response.meta.get("total") or total,
             response.meta.get("id_sucursal"),
         )
         try:
             productos = json_data["productos"]
         except KeyError:
-            # loggeo el body del response para debugging
-            self.logger.error(response.text)
-            raise
+            requests = self.reducir_limit(response.request)
+            if requests is None:
+                # loggeo el body del response para debugging
+                self.logger.error(response.text)
+                raise
+            return requests
 
-        items = []
-        for prod in productos:
-            precio = prod.pop("precio")
-            precio_max = prod.pop("precioMax")
-            precio_min = prod.pop("precioMin")
+        filas = filas_productos(productos)
+        if self.lotes:
+            items = [self.pagina_item(response.meta["id_sucursal"], filas)] if filas else []
+        else:
+            items = self.items_por_fila(response.meta["id_sucursal"], filas)
+
+        if self.delta and self.precios:
+            self.registrar_delta(response, [(f[0], f[4], f[5], f[6]) for f in filas])
+        if self.checkpoint or self.cola:
+            # la pagina se marca hecha cuando MultiCSVItemPipeline confirma que se exportó
+            meta = response.meta
+            items.append(
+                FinPaginaItem(
+                    sucursal_id=meta["id_sucursal"],
+                    offset=meta.get("offset") or 0,
+                    limite=meta.get("limit", LIMIT_PRODUCTOS),
+                )
+            )
+        if self.cola:
+            # reemplazo la unidad procesada para no esperar a que el spider quede ocioso
+            items.extend(self.tomar_de_cola(1))
+        return items
 
-            producto = ProductoItem(prod)
-            items.append(producto)
+    def items_por_fila(self, id_sucursal, filas):
+        items = []
+        for id_, nombre, presentacion, marca, precio, precio_max, precio_min in filas:
+            items.append(ProductoItem(id=id_, nombre=nombre, presentacion=presentacion, marca=marca))
             if self.precios:
                 items.append(
                     PrecioItem(
                         precio=precio,
                         precio_max=precio_max,
                         precio_min=precio_min,
-                        sucursal_id=response.meta["id_sucursal"],
-                        producto_id=producto["id"],
+                        sucursal_id=id_sucursal,
+                        producto_id=id_,
                         fecha_relevamiento=datetime.utcnow(),
                     )
                 )
         return items
 
+    def pagina_item(self, id_sucursal, filas):
+        ids, nombres, presentaciones, marcas, precios, precios_max, precios_min = zip(*filas)
+        return PaginaPreciosItem(
+            sucursal_id=id_sucursal,
+            producto_ids=ids,
+            nombres=nombres,
+            presentaciones=presentaciones,
+            marcas=marcas,
+            precios=precios if self.precios else None,
+            precios_max=precios_max,
+            precios_min=precios_min,
+            fecha_relevamiento=datetime.utcnow(),
+        )
+
+    def buscar_gemela(self, id_sucursal, total, muestras):
+        """
+        Compara la huella de la sucursal (total + primer y ultima pagina) con las
+        de otras sucursales de la misma cadena (``comercioId-banderaId``) ya scrapeadas.
+
+        Si coincide con alguna, la sucursal no se sigue paginando y se devuelve un
+        ``SucursalGemelaItem`` que la referencia. Si no, queda registrada como referencia.
+        """
+        cadena = id_sucursal.rpartition("-")[0]
+        huella = huella_sucursal(total, [h for r, h in muestras])
+        referencia = self.huellas_por_cadena.setdefault((cadena, huella), id_sucursal)
+        if referencia == id_sucursal:
+            return None
+        self.logger.info("Sucursal %s gemela de %s, no se pagina", id_sucursal, referencia)
+        return SucursalGemelaItem(
+            sucursal_id=id_sucursal, referencia_id=referencia, fecha_relevamiento=datetime.utcnow()
+        )
+
+    def muestrear_sucursal(self, response, total):
+        """
+        Modos gemelas y delta: con la primer pagina ya bajada pide la ultima como muestra
+        para calcular la huella de la sucursal (ver ``procesar_muestras``).
+        """
+        limit = response.meta.get("limit", LIMIT_PRODUCTOS)
+        huella = huella_pagina(self.decodificar(response.body)["productos"])
+        ultima = (total - 1) // limit * limit if total else 0
+        if not ultima:
+            for item_or_request in self.procesar_muestras(response.meta["id_sucursal"], total, [(response, huella)]):
+                yield item_or_request
+            return
+        request = self.productos_request(response.meta["id_sucursal"], ultima, total, limit)
+        request = request.replace(callback=self.parse_muestra, errback=self.muestra_fallida)
+        request.meta["muestras"] = [(response, huella)]
+        yield request
+
+    def parse_muestra(self, response):
+        meta = response.meta
+        try:
+            productos = self.decodificar(response.body)["productos"]
+        except KeyError:
+            self.logger.warning("Muestra sin productos de la sucursal %s, se baja completa", meta["id_sucursal"])
+            for item_or_request in self.bajar_completa(meta["id_sucursal"], meta["total"], meta["muestras"]):
+                yield item_or_request
+            return
+        muestras = meta["muestras"] + [(response, huella_pagina(productos))]
+        for item_or_request in self.procesar_muestras(meta["id_sucursal"], meta["total"], muestras):
+            yield item_or_request
+
+    def muestra_fallida(self, failure):
+        """
+        Errback de la muestra de la ultima pagina: sin huella no se puede buscar una gemela
+        ni comparar con la corrida anterior, así que la sucursal se baja completa
+        (incluida la ultima pagina, con un request normal).
+        """
+        meta = failure.request.meta
+        self.logger.warning(
+            "Falló la muestra de la sucursal %s (%s), se baja completa", meta["id_sucursal"], failure.value
+        )
+        return list(self.bajar_completa(meta["id_sucursal"], meta["total"], meta["muestras"]))
+
+    def procesar_muestras(self, id_sucursal, total, muestras):
+        """
+        Con las paginas muestreadas decide si la sucursal es gemela de otra de la cadena,
+        si no cambió desde la corrida anterior (modo delta) o si hay que bajarla completa.
+        """
+        if self.gemelas:
+            gemela = self.buscar_gemela(id_sucursal, total, muestras)
+            if gemela:
+                yield gemela
+                for item in self.sucursal_hecha(id_sucursal, total):
+                    yield item
+                return
+        if self.delta and self.precios:
+            for item_or_request in self.decidir_delta(id_sucursal, total, muestras):
+                yield item_or_request
+            return
+        for item_or_request in self.bajar_completa(id_sucursal, total, muestras):
+            yield item_or_request
+
+    def sucursal_hecha(self, id_sucursal, total):
+        """
+        Con checkpoint o cola, marca la sucursal entera (que no se pagina) como hecha
+        cuando se exporten los items anteriores.
+        """
+        if self.checkpoint:
+            self.checkpoint.guardar_total(id_sucursal, total)
+        if self.checkpoint or self.cola:
+            yield FinPaginaItem(sucursal_id=id_sucursal, offset=0, limite=total)
+
+    def decidir_delta(self, id_sucursal, total, muestras):
+        """
+        Compara la huella de la sucursal (total + paginas muestreadas) con la de la ultima
+        corrida completa.
+
+        Si no cambió, se arrastran los precios guardados con la fecha de hoy.
+        Si cambió, se descartan y se baja la sucursal completa: primero las paginas
+        muestreadas y luego el resto. La huella nueva se guarda al terminar todas sus paginas.
+        """
+        huella = huella_sucursal(total, [h for r, h in muestras])
+        if huella == self.delta.huella(id_sucursal):
+            self.logger.info("Sucursal %s sin cambios, se arrastran sus precios", id_sucursal)
+            fecha = datetime.utcnow()
+            for producto_id, precio, precio_max, precio_min in self.delta.precios(id_sucursal):
+                yield PrecioItem(
+                    precio=precio,
+                    precio_max=precio_max,
+                    precio_min=precio_min,
+                    sucursal_id=id_sucursal,
+                    producto_id=producto_id,
+                    fecha_relevamiento=fecha,
+                )
+            for item in self.sucursal_hecha(id_sucursal, total):
+                yield item
+            return
+
+        self.logger.info("Sucursal %s cambió, se baja completa", id_sucursal)
+        for item_or_request in self.bajar_completa(id_sucursal, total, muestras, huella):
+            yield item_or_request
+
+    def bajar_completa(self, id_sucursal, total, muestras, huella=None):
+        """
+        Baja todas las paginas de la sucursal: procesa las ``muestras`` ya bajadas y pide el resto.
+        Con ``huella`` se guarda al terminar todas sus paginas; sin ella la sucursal queda sin huella
+        y se vuelve a bajar completa en la proxima corrida.
+        """
+        if self.delta:
+            self.delta.olvidar(id_sucursal)
+        limit = muestras[0][0].meta.get("limit", LIMIT_PRODUCTOS)
+        if huella is not None:
+            offsets = set(range(0, total, limit)) or {0}
+            self.delta_pendientes[id_sucursal] = {"huella": huella, "offsets": offsets}
+        muestreados = set()
+        for response, _ in muestras:
+            muestreados.add(response.meta.get("offset") or 0)
+            for item in self.parse_productos_y_precios(response, total):
+                yield item
+
+        if self.checkpoint:
+            # como en parse_productos_first_page, para poder retomar la sucursal
+            self.checkpoint.guardar_total(id_sucursal, total)
+            paginas = self.checkpoint.pendientes(id_sucursal, total, limit)
+        else:
+            paginas = [(offset, limit) for offset in range(0, total, limit)]
+        paginas = [(offset, limite) for offset, limite in paginas if offset not in muestreados]
+        if self.cola:
+            # el resto de las paginas queda disponible para cualquier worker
+            self.cola.agregar([(id_sucursal, offset, limite, total) for offset, limite in paginas])
+            return
+        for offset, limite in paginas:
+            yield self.productos_request(id_sucursal, offset, total, limite)
+
+    def registrar_delta(self, response, precios):
+        """
+        Guarda los precios ``(producto_id, precio, precio_max, precio_min)`` de la pagina y,
+        si era la ultima pendiente de la sucursal, su huella.
+        """
+        id_sucursal = response.meta["id_sucursal"]
+        self.delta.guardar_precios(id_sucursal, precios)
+        pendiente = self.delta_pendientes.get(id_sucursal)
+        if pendiente:
+            pendiente["offsets"].discard(response.meta.get("offset") or 0)
+            if not pendiente["offsets"]:
+                self.delta.guardar_huella(id_sucursal, pendiente["huella"])
+                del self.delta_pendientes[id_sucursal]
+
 
 class CategoriasSpider(scrapy.Spider):
     name = "categorias"
@@ -599,12 +1199,19 @@ class CategoriasSpider(scrapy.Spider):
         }
         self.porcion = 1
         self.total_spiders = 1
+        self.decodificar = get_decodificador()
         self.url = (
             productos_url
             + "?array_sucursales=15-1-1080,15-1-288,15-1-241,10-3-670,15-1-5173,10-3-621,10-3-587,9-3-121,9-2-30,9-1-119,9-3-5260,10-3-400,15-1-214,10-3-732,10-3-298,15-1-5197,10-3-526,12-1-116,9-2-247,15-1-90,10-3-615,15-1-446,10-3-380,10-3-563,15-1-382,10-3-616,10-3-370,10-3-533,10-3-561,15-1-492&limit=100&sort=-cant_sucursales_disponible"
         )
         super().__init__(*args, **kwargs)
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.decodificar = get_decodificador(crawler.settings.get("JSON_DECODER"))
+        return spider
+
     def start_requests(self):
         for cat, nombre_cat in self.data.items():
             if len(cat) < 6:
@@ -618,7 +1225,7 @@ class CategoriasSpider(scrapy.Spider):
             )
 
     def parse_productos_first_page(self, response):
-        json_data = json.loads(response.text)
+        json_data = self.decodificar(response.body)
         total = json_data["total"]
 
         # procesar  items de la primera pagina ya solicitada
@@ -635,7 +1242,7 @@ class CategoriasSpider(scrapy.Spider):
             )
 
     def parse_productos_y_precios(self, response, total=None):
-        json_data = json.loads(response.text)
+        json_data = self.decodificar(response.body)
 
         self.logger.info(
             "Obteniendo  %s/%s productos para la categoria %s",
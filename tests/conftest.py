@@ -0,0 +1,82 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from scrapy.http import Request, TextResponse
+
+# los scripts y helpers viven en la raiz del repositorio
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+RESPUESTAS = Path(__file__).parent / "respuestas"
+
+
+def respuesta(url, cuerpo, **meta):
+    """
+    ``TextResponse`` de la API para ``url``, con ``cuerpo`` (dict o nombre de un archivo
+    de ``tests/respuestas``) y el ``meta`` del request.
+    """
+    if isinstance(cuerpo, str):
+        cuerpo = (RESPUESTAS / cuerpo).read_bytes()
+    else:
+        cuerpo = json.dumps(cuerpo).encode()
+    return TextResponse(url, body=cuerpo, encoding="utf-8", request=Request(url, meta=meta))
+
+
+@pytest.fixture
+def en_tmp(tmp_path, monkeypatch):
+    """
+    Corre el test en un directorio temporal (los pipelines escriben en ``data/``).
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """
+    Un dataset chico como el de Kaggle: ``sucursales.csv``, ``productos.csv`` y tres ``precios_*.csv``,
+    con sucursales de la misma cadena y provincia (mismo id_prov) y productos que faltan algunos dias.
+    """
+    import numpy as np
+    import pandas as pd
+
+    pd.DataFrame(
+        {
+            "id": ["10-1-1", "10-1-2", "15-1-7", "9-2-3"],
+            "comercioId": [10, 10, 15, 9],
+            "banderaId": [1, 1, 1, 2],
+            "banderaDescripcion": ["Disco", "Disco", "Changomas", "Dia"],
+            "provincia": ["AR-X", "AR-X", "AR-B", "AR-C"],
+        }
+    ).to_csv(tmp_path / "sucursales.csv", index=False)
+    pd.DataFrame(
+        {
+            "id": [str(7790000000001 + i) for i in range(6)],
+            "marca": ["A", "B", "C", "D", "E", "F"],
+            "nombre": ["Leche", "Yogur", "Arroz", "Fideos", "Jabon", "Vino"],
+            "categoria1": ["Almacen", "Almacen", "Almacen", "Almacen", "Limpieza", None],
+            "categoria2": ["Lacteos", "Lacteos", "Secos", "Secos", "Jabones", None],
+            "categoria3": ["Leches", "Yogures", "Arroces", "Fideos", "Jabones", None],
+        }
+    ).to_csv(tmp_path / "productos.csv", index=False)
+
+    rng = np.random.default_rng(0)
+    sucursales = ["10-1-1", "15-1-7", "9-2-3"]
+    productos = [str(7790000000001 + i) for i in range(6)]
+    precios = rng.uniform(50, 500, (len(sucursales), len(productos))).round(2)
+    for dia, fecha in enumerate(["20261001", "20261002", "20261003"]):
+        precios = (precios * rng.uniform(0.9, 1.2, precios.shape)).round(2)
+        filas = [
+            (sucursal, producto, precios[i, j])
+            for i, sucursal in enumerate(sucursales)
+            for j, producto in enumerate(productos)
+            # cada dia falta un producto distinto en cada sucursal
+            if (i + j + dia) % 5
+        ]
+        # la otra sucursal del mismo id_prov repite los precios de la primera
+        filas += [("10-1-2", producto, precio) for sucursal, producto, precio in filas if sucursal == "10-1-1"]
+        pd.DataFrame(filas, columns=["sucursal_id", "producto_id", "precio"]).to_csv(
+            tmp_path / f"precios_{fecha}.csv", index=False
+        )
+    return tmp_path
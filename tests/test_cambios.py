@@ -0,0 +1,160 @@
+import datetime
+import itertools
+import json
+from types import SimpleNamespace
+
+import pytest
+from scrapy.exceptions import DropItem
+from scrapy.utils.test import get_crawler
+
+from preciosclaros.cambios import IndicePrecios
+from preciosclaros.items import PaginaPreciosItem, PrecioItem
+from helpers import reconstruir_precios
+from preciosclaros import pipelines as pipelines_modulo
+from preciosclaros.pipelines import MultiCSVItemPipeline, PreciosCambiadosPipeline, PreciosPorCadenaPipeline
+from preciosclaros.spiders.pclaros import PreciosClarosSpider
+
+SUCURSAL = "10-3-670"
+
+
+def test_cambio_no_guarda_el_precio(tmp_path):
+    indice = IndicePrecios(tmp_path / "indice.sqlite", "1")
+    assert indice.cambio(SUCURSAL, "1", 10.0, 10.0, 10.0)
+    assert indice.cambio(SUCURSAL, "1", 10.0, 10.0, 10.0)
+    indice.registrar([(SUCURSAL, "1", 10.0, 10.0, 10.0)])
+    assert not indice.cambio(SUCURSAL, "1", 10.0, 10.0, 10.0)
+    assert indice.cambio(SUCURSAL, "1", 11.0, 11.0, 10.0)
+
+
+def test_bajas_de_los_pares_no_vistos(tmp_path):
+    path = tmp_path / "indice.sqlite"
+    indice = IndicePrecios(path, "1")
+    indice.registrar([(SUCURSAL, "1", 10.0, 10.0, 10.0), (SUCURSAL, "2", 5.0, 5.0, 5.0)])
+    indice.close()
+
+    indice = IndicePrecios(path, "2")
+    # cambió pero todavia no se exportó: igual cuenta como visto
+    indice.cambio(SUCURSAL, "1", 11.0, 11.0, 11.0)
+    assert indice.bajas([SUCURSAL]) == [(SUCURSAL, "2")]
+
+
+def corrida(path, **argumentos):
+    crawler = get_crawler(PreciosClarosSpider, {"EXPORT_SYNC_SECONDS": 3600})
+    spider = PreciosClarosSpider.from_crawler(crawler, solo_cambios=str(path), exportar=1, **argumentos)
+    crawler.spider = spider
+    # en el orden de ITEM_PIPELINES
+    pipelines = [
+        PreciosCambiadosPipeline.from_crawler(crawler),
+        PreciosPorCadenaPipeline.from_crawler(crawler),
+        MultiCSVItemPipeline.from_crawler(crawler),
+    ]
+    for pipeline in pipelines:
+        pipeline.open_spider(spider)
+    return crawler, spider, pipelines
+
+
+def procesar(spider, pipelines, item):
+    for pipeline in pipelines:
+        item = pipeline.process_item(item, spider)
+    return item
+
+
+def procesar_o_descartar(spider, pipelines, item):
+    try:
+        return procesar(spider, pipelines, item)
+    except DropItem:
+        return None
+
+
+def cerrar(crawler, spider, pipelines):
+    # como scrapy: primero close_spider de los pipelines, despues la señal spider_closed
+    pipelines[-1].close_spider(spider)
+    pipelines[0].spider_closed(spider, "finished")
+
+
+def precio(producto_id, valor, sucursal_id=SUCURSAL, fecha=datetime.datetime(2026, 10, 18)):
+    return PrecioItem(
+        sucursal_id=sucursal_id,
+        producto_id=producto_id,
+        precio=valor,
+        precio_max=valor,
+        precio_min=valor,
+        fecha_relevamiento=fecha,
+    )
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """
+    Reloj de los pipelines que avanza una hora en cada consulta, para que cada corrida
+    tenga sus propios archivos aunque corran en el mismo segundo.
+    """
+    horas = itertools.count()
+
+    def ahora():
+        return datetime.datetime(2026, 10, 18) + datetime.timedelta(hours=next(horas))
+
+    reloj = SimpleNamespace(datetime=SimpleNamespace(now=ahora, utcnow=ahora))
+    monkeypatch.setattr(pipelines_modulo, "datetime", reloj)
+
+
+def test_precio_guardado_recien_al_exportar(en_tmp):
+    path = en_tmp / "indice.sqlite"
+    crawler, spider, pipelines = corrida(path)
+    procesar(spider, pipelines, precio("1", 10.0))
+    assert IndicePrecios(path, "x").cambio(SUCURSAL, "1", 10.0, 10.0, 10.0)
+    cerrar(crawler, spider, pipelines)
+    assert not IndicePrecios(path, "x").cambio(SUCURSAL, "1", 10.0, 10.0, 10.0)
+
+    crawler, spider, pipelines = corrida(path)
+    with pytest.raises(DropItem):
+        procesar(spider, pipelines, precio("1", 10.0))
+    cerrar(crawler, spider, pipelines)
+    manifiestos = [json.loads(f.read_text()) for f in (en_tmp / "data").glob("manifiesto-*.json")]
+    assert sorted(m["precios_sin_cambios"] for m in manifiestos)[-1] == 1
+
+
+def test_precios_de_una_pagina(en_tmp):
+    path = en_tmp / "indice.sqlite"
+    indice = IndicePrecios(path, "0")
+    indice.registrar([(SUCURSAL, "1", 10.0, 10.0, 10.0)])
+    indice.close()
+
+    crawler, spider, pipelines = corrida(path)
+    pagina = PaginaPreciosItem(
+        sucursal_id=SUCURSAL,
+        producto_ids=("1", "2"),
+        nombres=("a", "b"),
+        marcas=("a", "b"),
+        presentaciones=("a", "b"),
+        precios=(10.0, 20.0),
+        precios_max=(10.0, 20.0),
+        precios_min=(10.0, 20.0),
+        fecha_relevamiento=datetime.datetime(2026, 10, 18),
+    )
+    assert procesar(spider, pipelines, pagina)["filas_precios"] == [1]
+    cerrar(crawler, spider, pipelines)
+    assert not IndicePrecios(path, "x").cambio(SUCURSAL, "2", 20.0, 20.0, 20.0)
+
+
+def test_solo_cambios_no_se_combina_con_dedup_cadena(tmp_path):
+    with pytest.raises(AssertionError, match="dedup_cadena"):
+        PreciosClarosSpider(solo_cambios=str(tmp_path / "indice.sqlite"), exportar=1, dedup_cadena=1)
+
+
+def test_tres_corridas_con_sucursales_de_la_misma_cadena(en_tmp, reloj):
+    # dos sucursales de la misma cadena con los mismos precios: cada una tiene que quedar en el indice
+    path = en_tmp / "indice.sqlite"
+    sucursales = [SUCURSAL, "10-3-671"]
+    exportados = []
+    for dia, valor in enumerate([10.0, 12.0, 12.0]):
+        crawler, spider, pipelines = corrida(path)
+        fecha = datetime.datetime(2026, 10, 1 + dia)
+        items = [precio(p, valor, s, fecha) for s in sucursales for p in ("1", "2")]
+        exportados.append(sum(procesar_o_descartar(spider, pipelines, item) is not None for item in items))
+        cerrar(crawler, spider, pipelines)
+
+    assert exportados == [4, 4, 0]
+    reconstruidos = reconstruir_precios(en_tmp / "data")
+    assert sorted(reconstruidos["sucursal_id"].astype(str)) == sorted(sucursales * 2)
+    assert (reconstruidos["precio"] == 12.0).all()
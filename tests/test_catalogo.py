@@ -0,0 +1,85 @@
+import pytest
+from scrapy.exceptions import DropItem
+from scrapy.utils.test import get_crawler
+
+from preciosclaros.catalogo import CatalogoProductos
+from preciosclaros.items import PaginaPreciosItem, ProductoItem
+from preciosclaros.pipelines import DuplicatesPipeline, MultiCSVItemPipeline
+from preciosclaros.spiders.pclaros import PreciosClarosSpider
+
+LECHE = ("7790742656018", "Leche Entera Sachet 1 Lt", "LA SERENISIMA", "1.0 lt")
+
+
+def test_cambio_no_registra(tmp_path):
+    catalogo = CatalogoProductos(tmp_path / "catalogo.sqlite")
+    assert catalogo.cambio(*LECHE)
+    assert catalogo.cambio(*LECHE)
+    catalogo.registrar([LECHE])
+    assert not catalogo.cambio(*LECHE)
+    assert catalogo.cambio(LECHE[0], "Leche Entera 1 Lt", *LECHE[2:])
+
+
+def corrida(path, **argumentos):
+    crawler = get_crawler(PreciosClarosSpider, {"EXPORT_SYNC_SECONDS": 3600})
+    spider = PreciosClarosSpider.from_crawler(crawler, catalogo=str(path), **argumentos)
+    crawler.spider = spider
+    pipelines = [DuplicatesPipeline.from_crawler(crawler), MultiCSVItemPipeline.from_crawler(crawler)]
+    for pipeline in pipelines:
+        pipeline.open_spider(spider)
+    return spider, pipelines
+
+
+def procesar(spider, pipelines, item):
+    for pipeline in pipelines:
+        item = pipeline.process_item(item, spider)
+    return item
+
+
+def cerrar(spider, pipelines):
+    for pipeline in reversed(pipelines):
+        pipeline.close_spider(spider)
+
+
+def producto():
+    id_, nombre, marca, presentacion = LECHE
+    return ProductoItem(id=id_, nombre=nombre, marca=marca, presentacion=presentacion)
+
+
+def test_producto_registrado_recien_al_exportar(en_tmp):
+    path = en_tmp / "catalogo.sqlite"
+    spider, pipelines = corrida(path, exportar=1)
+    procesar(spider, pipelines, producto())
+    # exportado pero todavia no sincronizado
+    assert CatalogoProductos(path).cambio(*LECHE)
+    cerrar(spider, pipelines)
+    assert not CatalogoProductos(path).cambio(*LECHE)
+
+    spider, pipelines = corrida(path, exportar=1)
+    with pytest.raises(DropItem):
+        procesar(spider, pipelines, producto())
+    cerrar(spider, pipelines)
+
+
+def test_sin_exportar_no_se_registra(en_tmp):
+    path = en_tmp / "catalogo.sqlite"
+    spider, pipelines = corrida(path)
+    procesar(spider, pipelines, producto())
+    cerrar(spider, pipelines)
+    assert CatalogoProductos(path).cambio(*LECHE)
+
+
+def test_productos_nuevos_de_una_pagina(en_tmp):
+    path = en_tmp / "catalogo.sqlite"
+    CatalogoProductos(path).registrar([("1", "Yerba", "X", "1 kg")])
+    spider, pipelines = corrida(path, exportar=1)
+    pagina = PaginaPreciosItem(
+        sucursal_id="10-3-670",
+        producto_ids=("1", LECHE[0]),
+        nombres=("Yerba", LECHE[1]),
+        marcas=("X", LECHE[2]),
+        presentaciones=("1 kg", LECHE[3]),
+        precios=None,
+    )
+    assert procesar(spider, pipelines, pagina)["productos_nuevos"] == [1]
+    cerrar(spider, pipelines)
+    assert not CatalogoProductos(path).cambio(*LECHE)
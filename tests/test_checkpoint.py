@@ -0,0 +1,122 @@
+import pytest
+from scrapy.utils.test import get_crawler
+
+from conftest import respuesta
+from preciosclaros.checkpoint import Checkpoint
+from preciosclaros.items import FinPaginaItem
+from preciosclaros.pipelines import MultiCSVItemPipeline
+from preciosclaros.spiders.pclaros import PreciosClarosSpider, productos_url
+
+SUCURSAL = "10-3-670"
+
+
+def test_pendientes_cubre_los_huecos_entre_paginas_hechas(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "checkpoint.sqlite")
+    # paginas de distinto tamaño, como con ``limite=auto`` y su backoff
+    checkpoint.marcar_paginas([(SUCURSAL, 0, 100), (SUCURSAL, 150, 50)])
+    assert checkpoint.pendientes(SUCURSAL, 320, 50) == [(100, 50), (200, 50), (250, 50), (300, 50)]
+    assert checkpoint.pendientes(SUCURSAL, 320, 50, desde=250) == [(250, 50), (300, 50)]
+    assert checkpoint.pendientes("otra", 120, 50) == [(0, 50), (50, 50), (100, 50)]
+
+
+def test_total_guardado():
+    checkpoint = Checkpoint(":memory:")
+    assert checkpoint.total(SUCURSAL) is None
+    checkpoint.guardar_total(SUCURSAL, 4)
+    assert checkpoint.total(SUCURSAL) == 4
+
+
+def crawl(tmp_path, **settings):
+    crawler = get_crawler(PreciosClarosSpider, settings)
+    spider = PreciosClarosSpider.from_crawler(crawler, exportar=1, checkpoint=str(tmp_path / "checkpoint.sqlite"))
+    crawler.spider = spider
+    pipeline = MultiCSVItemPipeline.from_crawler(crawler)
+    pipeline.open_spider(spider)
+    return spider, pipeline
+
+
+def pagina(spider, offset):
+    url = productos_url + f"?limit=2&offset={offset}&id_sucursal={SUCURSAL}"
+    meta = {"id_sucursal": SUCURSAL, "offset": offset, "total": 4, "limit": 2}
+    return spider.parse_productos_y_precios(respuesta(url, "productos_sucursal.json", **meta))
+
+
+def test_la_pagina_termina_con_su_marca(en_tmp):
+    spider, _ = crawl(en_tmp)
+    items = pagina(spider, 2)
+    assert items[-1] == FinPaginaItem(sucursal_id=SUCURSAL, offset=2, limite=2)
+
+
+def test_pagina_marcada_recien_al_sincronizar_lo_exportado(en_tmp):
+    spider, pipeline = crawl(en_tmp, EXPORT_SYNC_SECONDS=3600)
+    for item in pagina(spider, 2):
+        pipeline.process_item(item, spider)
+    # exportada pero todavia no sincronizada: se vuelve a bajar si el job muere
+    assert spider.checkpoint.pendientes(SUCURSAL, 4, 2) == [(0, 2), (2, 2)]
+
+    pipeline.close_spider(spider)
+    assert spider.checkpoint.pendientes(SUCURSAL, 4, 2) == [(0, 2)]
+    assert (en_tmp / "data").is_dir()
+
+
+def test_sincronizacion_periodica(en_tmp):
+    spider, pipeline = crawl(en_tmp, EXPORT_SYNC_SECONDS=0)
+    for item in pagina(spider, 0):
+        pipeline.process_item(item, spider)
+    assert spider.checkpoint.pendientes(SUCURSAL, 4, 2) == [(2, 2)]
+    pipeline.close_spider(spider)
+
+
+def test_sincronizacion_con_thread_de_escritura(en_tmp):
+    spider, pipeline = crawl(en_tmp, EXPORT_THREAD=True, EXPORT_SYNC_SECONDS=3600)
+    for item in pagina(spider, 0) + pagina(spider, 2):
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    assert spider.checkpoint.pendientes(SUCURSAL, 4, 2) == []
+
+
+def test_comprimido_sincroniza_cerrando_la_parte(en_tmp):
+    spider, pipeline = crawl(en_tmp, EXPORT_COMPRESSION="gzip", EXPORT_SYNC_SECONDS=3600)
+    for item in pagina(spider, 0):
+        pipeline.process_item(item, spider)
+    pipeline.sincronizar()
+    for item in pagina(spider, 2):
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    assert spider.checkpoint.pendientes(SUCURSAL, 4, 2) == []
+    partes = sorted(p.name.rsplit("-", 1)[1] for p in (en_tmp / "data").glob("precio-*.csv.gz"))
+    assert partes == ["0000.csv.gz", "0001.csv.gz"]
+
+
+def test_error_de_escritura_no_marca_la_pagina(en_tmp):
+    spider, pipeline = crawl(en_tmp, EXPORT_THREAD=True)
+
+    def falla(item, spider):
+        raise OSError("disco lleno")
+
+    pipeline.export_item = falla
+    for item in pagina(spider, 0):
+        pipeline.process_item(item, spider)
+    # el error del thread se vuelve a lanzar al cerrar
+    with pytest.raises(OSError):
+        pipeline.close_spider(spider)
+    assert spider.checkpoint.pendientes(SUCURSAL, 4, 2) == [(0, 2), (2, 2)]
+
+
+def test_error_de_escritura_sin_thread(en_tmp):
+    spider, pipeline = crawl(en_tmp)
+
+    def falla(item, spider):
+        raise OSError("disco lleno")
+
+    pipeline.export_item = falla
+    items = pagina(spider, 0)
+    with pytest.raises(OSError):
+        pipeline.process_item(items[0], spider)
+    for item in items[1:]:
+        try:
+            pipeline.process_item(item, spider)
+        except OSError:
+            pass
+    pipeline.close_spider(spider)
+    assert spider.checkpoint.pendientes(SUCURSAL, 4, 2) == [(0, 2), (2, 2)]
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+import scrapy
+from scrapy.utils.test import get_crawler
+
+from conftest import respuesta
+from preciosclaros.cola import ColaTrabajo
+from preciosclaros.items import FinPaginaItem
+from preciosclaros.pipelines import MultiCSVItemPipeline
+from preciosclaros.spiders.pclaros import PreciosClarosSpider, productos_url
+
+SUCURSAL = "10-3-670"
+
+
+def test_unidades_repetidas_se_ignoran(tmp_path):
+    cola = ColaTrabajo(tmp_path / "cola.sqlite")
+    cola.agregar([(SUCURSAL, 0, None, None), ("15-1-241", 0, None, None)])
+    cola.agregar([(SUCURSAL, 0, None, None)])
+    assert sorted(cola.tomar(10)) == [("10-3-670", 0, None, None), ("15-1-241", 0, None, None)]
+    assert cola.tomar(10) == []
+
+
+def test_lease_vencido_vuelve_a_la_cola(tmp_path):
+    path = tmp_path / "cola.sqlite"
+    muerto, vivo = ColaTrabajo(path, lease=0), ColaTrabajo(path)
+    muerto.agregar([(SUCURSAL, 0, 50, 120)])
+    assert muerto.tomar(1) == [(SUCURSAL, 0, 50, 120)]
+    time.sleep(0.01)
+    assert vivo.tomar(1) == [(SUCURSAL, 0, 50, 120)]
+
+
+def test_unidad_completada_no_vuelve(tmp_path):
+    cola = ColaTrabajo(tmp_path / "cola.sqlite", lease=0)
+    cola.agregar([(SUCURSAL, 0, 50, 120), (SUCURSAL, 50, 50, 120)])
+    cola.tomar(2)
+    cola.completar_varias([(SUCURSAL, 0)])
+    time.sleep(0.01)
+    assert cola.tomar(2) == [(SUCURSAL, 50, 50, 120)]
+
+
+def test_cola_requiere_exportar(tmp_path):
+    with pytest.raises(AssertionError):
+        PreciosClarosSpider(cola=str(tmp_path / "cola.sqlite"))
+
+
+def test_pagina_completada_recien_al_exportar(en_tmp):
+    crawler = get_crawler(PreciosClarosSpider, {"EXPORT_SYNC_SECONDS": 3600})
+    spider = PreciosClarosSpider.from_crawler(crawler, exportar=1, cola=str(en_tmp / "cola.sqlite"), lease=0)
+    crawler.spider = spider
+    pipeline = MultiCSVItemPipeline.from_crawler(crawler)
+    pipeline.open_spider(spider)
+    spider.cola.agregar([(SUCURSAL, 2, 2, 4)])
+    spider.cola.tomar(1)
+
+    url = productos_url + f"?limit=2&offset=2&id_sucursal={SUCURSAL}"
+    meta = {"id_sucursal": SUCURSAL, "offset": 2, "total": 4, "limit": 2}
+    items = spider.parse_productos_y_precios(respuesta(url, "productos_sucursal.json", **meta))
+    requests = [i for i in items if isinstance(i, scrapy.Request)]
+    # la unidad vencida se vuelve a tomar como reemplazo: no se completó en el callback
+    assert [r.meta["offset"] for r in requests] == [2]
+    assert isinstance(items[-2], FinPaginaItem)
+
+    for item in items:
+        if not isinstance(item, scrapy.Request):
+            pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    time.sleep(0.01)
+    assert spider.cola.tomar(1) == []
@@ -0,0 +1,118 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import consolidar_precios
+from consolidar_precios import consolidar, consolidar_por_partes
+from lectura import leer_varios
+
+
+def escribir_precios(path, filas, semilla, fecha):
+    """
+    Un ``precio-*.csv`` como los del spider, con precios repetidos entre sucursales de la misma cadena.
+    """
+    rng = np.random.default_rng(semilla)
+    sucursales = np.array([f"{c}-1-{s}" for c in (9, 10, 15) for s in range(20)])
+    productos = np.array([str(7790000000000 + i) for i in range(3000)])
+    precios = rng.choice([99.9, 100.0, 150.5, 210.0, 215.0, 300.0, 999.99, 1000.0], filas)
+    frame = pd.DataFrame(
+        {
+            "sucursal_id": rng.choice(sucursales, filas),
+            "producto_id": rng.choice(productos, filas),
+            "precio": precios,
+            "precio_max": precios,
+            "precio_min": precios,
+            "fecha_relevamiento": pd.Timestamp(fecha) + pd.to_timedelta(rng.integers(0, 3600, filas), unit="s"),
+        }
+    )
+    frame.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def archivos(tmp_path):
+    return [
+        escribir_precios(tmp_path / "precio-1-3.csv", 9000, 1, "2026-10-01"),
+        escribir_precios(tmp_path / "precio-2-3.csv", 7000, 2, "2026-10-02"),
+        # pandas lo comprime por la extension
+        escribir_precios(tmp_path / "precio-3-3.csv.gz", 6000, 3, "2026-10-03"),
+    ]
+
+
+def leer(path):
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+@pytest.mark.parametrize("memoria", [200_000, 2_000_000])
+def test_por_partes_igual_que_en_memoria(tmp_path, archivos, memoria):
+    frame, date_from, date_to = consolidar(archivos)
+    esperado = tmp_path / "esperado.csv"
+    frame.to_csv(esperado, index=False)
+
+    output, desde, hasta = consolidar_por_partes(archivos, memoria, str(tmp_path / "precios_{date_from}_{date_to}.csv"))
+    assert (desde, hasta) == (date_from, date_to) == ("20261001", "20261003")
+    pd.testing.assert_frame_equal(leer(output), leer(esperado))
+
+
+def test_por_partes_con_varios_bloques_por_particion(tmp_path, archivos, monkeypatch):
+    # el merge externo tiene que avanzar por varios bloques de cada particion
+    bloques = []
+    ordenar = consolidar_precios.ordenar_particiones
+
+    def ordenar_particiones(*args):
+        corridas = [list(corrida) for corrida in ordenar(*args)]
+        bloques.extend(len(corrida) for corrida in corridas)
+        return [iter(corrida) for corrida in corridas]
+
+    monkeypatch.setattr(consolidar_precios, "ordenar_particiones", ordenar_particiones)
+    frame, _, _ = consolidar(archivos)
+    output, _, _ = consolidar_por_partes(archivos, 2_000_000, str(tmp_path / "precios.csv.gz"))
+    assert len(bloques) > 1 and min(bloques) > 1
+    esperado = tmp_path / "esperado.csv"
+    frame.to_csv(esperado, index=False)
+    pd.testing.assert_frame_equal(leer(output), leer(esperado))
+
+
+def test_por_partes_sobre_un_consolidado_anterior(tmp_path, archivos):
+    base = tmp_path / "base.csv"
+    consolidar(archivos[:2])[0].to_csv(base, index=False)
+
+    frame, _, _ = consolidar(archivos[2:], base=base)
+    esperado = tmp_path / "esperado.csv"
+    frame.to_csv(esperado, index=False)
+    output, desde, hasta = consolidar_por_partes(
+        archivos[2:], 200_000, str(tmp_path / "precios.csv"), base=base, rango=("20261001", "20261002")
+    )
+    assert (desde, hasta) == ("20261001", "20261003")
+    pd.testing.assert_frame_equal(leer(output), leer(esperado))
+
+
+def test_leer_varios_en_paralelo_conserva_el_orden(archivos):
+    serial = leer_varios(archivos)
+    paralelo = leer_varios(archivos, jobs=2)
+    assert len(paralelo) == len(archivos)
+    for a, b in zip(paralelo, serial):
+        pd.testing.assert_frame_equal(a, b)
+
+
+def correr(directorio, *argumentos):
+    script = Path(__file__).parent.parent / "consolidar_precios.py"
+    return subprocess.run(
+        [sys.executable, script, "precio-*.csv*", *argumentos], cwd=directorio, capture_output=True, text=True
+    )
+
+
+def test_jobs_igual_que_serial(tmp_path, archivos):
+    assert correr(tmp_path, "-o", "serial.csv").returncode == 0
+    assert correr(tmp_path, "-o", "paralelo.csv", "--jobs", "3").returncode == 0
+    assert (tmp_path / "paralelo.csv").read_bytes() == (tmp_path / "serial.csv").read_bytes()
+
+
+def test_jobs_no_se_combina_con_memoria(tmp_path, archivos):
+    resultado = correr(tmp_path, "--memoria", "100", "--jobs", "2")
+    assert resultado.returncode == 2
+    assert "--jobs no se puede combinar con --memoria" in resultado.stderr
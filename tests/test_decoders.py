@@ -0,0 +1,27 @@
+import pytest
+from scrapy.utils.test import get_crawler
+
+from preciosclaros.decoders import DECODIFICADORES, filas_productos, get_decodificador
+from preciosclaros.spiders.pclaros import CategoriasSpider, PreciosClarosSpider
+
+
+@pytest.mark.parametrize("nombre", sorted(DECODIFICADORES))
+def test_decodificadores_sobre_bytes(nombre):
+    assert get_decodificador(nombre)('{"total": 1, "nombre": "Ñandú"}'.encode()) == {"total": 1, "nombre": "Ñandú"}
+
+
+def test_decodificador_desconocido():
+    with pytest.raises(ValueError):
+        get_decodificador("simdjson")
+
+
+@pytest.mark.parametrize("spider_cls", [PreciosClarosSpider, CategoriasSpider])
+def test_los_spiders_usan_el_setting_json_decoder(spider_cls):
+    crawler = get_crawler(spider_cls, {"JSON_DECODER": "json"})
+    spider = spider_cls.from_crawler(crawler)
+    assert spider.decodificar is DECODIFICADORES["json"]
+
+
+def test_filas_productos():
+    productos = [{"id": "1", "nombre": "Yerba", "precio": 10.0, "precioMax": 12.0, "precioMin": 9.0}]
+    assert filas_productos(productos) == [("1", "Yerba", None, None, 10.0, 12.0, 9.0)]
@@ -0,0 +1,128 @@
+import datetime
+import random
+
+import pytest
+from scrapy.exceptions import DropItem
+
+from preciosclaros.dedup import HuellasAcotadas, IdsVistos, como_entero
+from preciosclaros.items import PaginaPreciosItem, PrecioItem
+from preciosclaros.pipelines import PreciosPorCadenaPipeline
+from preciosclaros.spiders.pclaros import PreciosClarosSpider
+
+
+def test_como_entero():
+    assert como_entero("7790742656018") == 7790742656018
+    assert como_entero("0779") is None
+    assert como_entero("abc") is None
+    assert como_entero(str(2**64)) is None
+
+
+def test_ids_vistos_equivale_a_un_set():
+    random.seed(0)
+    ids = [str(7790000000000 + random.randrange(10**6)) for _ in range(5000)] + ["0001", "abc"]
+    vistos, esperado = IdsVistos(buffer=64), set()
+    for id_ in ids:
+        assert (id_ in vistos) == (id_ in esperado)
+        vistos.add(id_)
+        esperado.add(id_)
+    assert len(vistos) == len(esperado)
+    assert all(id_ in vistos for id_ in esperado)
+    assert str(7790000000000 + 10**6) not in vistos
+
+
+def test_corridas_de_tamaño_geometrico():
+    vistos = IdsVistos(buffer=10)
+    for n in range(1000):
+        vistos.add(n)
+    tamaños = [len(corrida) for corrida in vistos.corridas]
+    # cada corrida es más grande que la siguiente, así que hay O(log N) corridas
+    assert all(a > b for a, b in zip(tamaños, tamaños[1:]))
+    assert len(tamaños) <= 7
+    assert all(list(c) == sorted(c) for c in vistos.corridas)
+
+
+def test_huellas_acotadas():
+    vistos = HuellasAcotadas(slots=1024)
+    assert not vistos.visto(("10-3", "1", 10.0))
+    assert vistos.visto(("10-3", "1", 10.0))
+    assert not vistos.visto(("10-3", "1", 11.0))
+
+
+def por_cadena(slots=1024):
+    spider = PreciosClarosSpider(dedup_cadena=1)
+    pipeline = PreciosPorCadenaPipeline(slots=slots)
+    pipeline.open_spider(spider)
+    return spider, pipeline
+
+
+def precio(sucursal_id, producto_id, valor):
+    return PrecioItem(
+        sucursal_id=sucursal_id,
+        producto_id=producto_id,
+        precio=valor,
+        precio_max=valor,
+        precio_min=valor,
+        fecha_relevamiento=datetime.datetime(2026, 10, 18),
+    )
+
+
+def pagina(sucursal_id, producto_ids, precios, filas_precios=None):
+    return PaginaPreciosItem(
+        sucursal_id=sucursal_id,
+        producto_ids=producto_ids,
+        nombres=producto_ids,
+        marcas=producto_ids,
+        presentaciones=producto_ids,
+        precios=precios,
+        precios_max=precios,
+        precios_min=precios,
+        fecha_relevamiento=datetime.datetime(2026, 10, 18),
+        filas_precios=filas_precios,
+    )
+
+
+def test_precio_repetido_en_la_cadena_se_descarta():
+    spider, pipeline = por_cadena()
+    assert pipeline.process_item(precio("10-3-670", "1", 10.0), spider)
+    with pytest.raises(DropItem):
+        pipeline.process_item(precio("10-3-671", "1", 10.0), spider)
+    # otro precio, u otra cadena, pasan
+    assert pipeline.process_item(precio("10-3-671", "1", 11.0), spider)
+    assert pipeline.process_item(precio("10-4-671", "1", 10.0), spider)
+
+
+def test_sin_dedup_cadena_pasa_todo():
+    spider, pipeline = PreciosClarosSpider(), PreciosPorCadenaPipeline(slots=16)
+    pipeline.open_spider(spider)
+    for _ in range(2):
+        assert pipeline.process_item(precio("10-3-670", "1", 10.0), spider)
+
+
+def test_pagina_filtra_los_precios_repetidos_en_la_cadena():
+    spider, pipeline = por_cadena()
+    pipeline.process_item(precio("10-3-670", "1", 10.0), spider)
+    item = pipeline.process_item(pagina("10-3-671", ("1", "2", "3"), (10.0, 20.0, 30.0)), spider)
+    assert item["filas_precios"] == [1, 2]
+    # sobre las filas que ya dejó un pipeline anterior
+    item = pipeline.process_item(pagina("10-3-672", ("1", "2", "4"), (11.0, 20.0, 40.0), [0, 1]), spider)
+    assert item["filas_precios"] == [0]
+
+
+def test_pagina_sin_precios_no_se_filtra():
+    spider, pipeline = por_cadena()
+    item = pagina("10-3-671", ("1",), None)
+    assert pipeline.process_item(item, spider)["filas_precios"] is None
+
+
+def test_tabla_llena_no_descarta_precios_nuevos():
+    # con 4 slots la tabla se llena enseguida: se pisan huellas viejas, asi que algun
+    # duplicado puede pasar, pero un precio nuevo nunca se descarta
+    spider, pipeline = por_cadena(slots=4)
+    items = [precio("10-3-670", str(i), 10.0) for i in range(50)]
+    for item in items:
+        assert pipeline.process_item(item, spider)
+    item = pipeline.process_item(pagina("10-3-671", tuple(str(i) for i in range(50, 100)), (10.0,) * 50), spider)
+    assert item["filas_precios"] == list(range(50))
+    # el ultimo que entró sigue en la tabla
+    with pytest.raises(DropItem):
+        pipeline.process_item(precio("10-3-672", "99", 10.0), spider)
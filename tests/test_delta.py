@@ -0,0 +1,85 @@
+import scrapy
+from twisted.python.failure import Failure
+
+from conftest import respuesta
+from preciosclaros.items import FinPaginaItem, PrecioItem
+from preciosclaros.spiders.pclaros import PreciosClarosSpider, productos_url
+
+SUCURSAL = "10-3-670"
+
+
+def pagina(offset, total=None, **meta):
+    url = productos_url + f"?limit=2&offset={offset}&id_sucursal={SUCURSAL}"
+    meta = {"id_sucursal": SUCURSAL, "offset": offset, "total": total, "limit": 2, **meta}
+    return respuesta(url, "productos_sucursal.json", **meta)
+
+
+def requests(salida):
+    return [i for i in salida if isinstance(i, scrapy.Request)]
+
+
+def corrida(spider):
+    """
+    Scrapea la sucursal (4 productos en 2 paginas): primer pagina, muestra de la ultima y el resto.
+    """
+    salida = list(spider.parse_productos_first_page(pagina(0)))
+    muestra = requests(salida)[0]
+    assert muestra.callback == spider.parse_muestra and muestra.errback == spider.muestra_fallida
+    salida = list(spider.parse_muestra(pagina(2, 4, muestras=muestra.meta["muestras"])))
+    return salida
+
+
+def test_sucursal_nueva_se_baja_completa_y_guarda_su_huella(tmp_path):
+    spider = PreciosClarosSpider(delta=str(tmp_path / "delta.sqlite"))
+    salida = corrida(spider)
+
+    # las dos paginas ya estaban bajadas como muestras
+    assert requests(salida) == []
+    assert len([i for i in salida if isinstance(i, PrecioItem)]) == 4
+    assert spider.delta.huella(SUCURSAL) is not None
+    assert SUCURSAL not in spider.delta_pendientes
+
+
+def test_sucursal_sin_cambios_arrastra_sus_precios(tmp_path):
+    path = str(tmp_path / "delta.sqlite")
+    corrida(PreciosClarosSpider(delta=path))
+
+    salida = corrida(PreciosClarosSpider(delta=path))
+    precios = [i for i in salida if isinstance(i, PrecioItem)]
+    assert {(p["producto_id"], p["precio"]) for p in precios} == {("7790742656018", 1150.5), ("7790580660000", 850.0)}
+    assert requests(salida) == []
+
+
+def test_muestra_fallida_baja_la_sucursal_completa(tmp_path):
+    spider = PreciosClarosSpider(delta=str(tmp_path / "delta.sqlite"))
+    muestra = requests(spider.parse_productos_first_page(pagina(0)))[0]
+    failure = Failure(Exception("HTTP 500"))
+    failure.request = muestra
+    salida = spider.muestra_fallida(failure)
+
+    # la primer pagina ya bajada se procesa y la ultima se pide con un request normal
+    assert len([i for i in salida if isinstance(i, PrecioItem)]) == 2
+    [ultima] = requests(salida)
+    assert ultima.meta["offset"] == 2 and ultima.callback == spider.parse_productos_y_precios
+    assert SUCURSAL not in spider.delta_pendientes
+
+    spider.parse_productos_y_precios(pagina(2, 4))
+    assert spider.delta.huella(SUCURSAL) is None
+
+
+def test_checkpoint_con_delta_guarda_el_total(en_tmp):
+    spider = PreciosClarosSpider(delta="delta.sqlite", checkpoint="checkpoint.sqlite", exportar=1)
+    salida = corrida(spider)
+    assert spider.checkpoint.total(SUCURSAL) == 4
+    marcas = [i for i in salida if isinstance(i, FinPaginaItem)]
+    assert [(m["offset"], m["limite"]) for m in marcas] == [(0, 2), (2, 2)]
+
+
+def test_checkpoint_con_delta_sin_cambios_marca_la_sucursal_entera(en_tmp):
+    corrida(PreciosClarosSpider(delta="delta.sqlite", checkpoint="checkpoint.sqlite", exportar=1))
+
+    spider = PreciosClarosSpider(delta="delta.sqlite", checkpoint="otro.sqlite", exportar=1)
+    salida = corrida(spider)
+    assert salida[-1] == FinPaginaItem(sucursal_id=SUCURSAL, offset=0, limite=4)
+    spider.checkpoint.marcar_paginas([(SUCURSAL, 0, 4)])
+    assert spider.checkpoint.pendientes(SUCURSAL, spider.checkpoint.total(SUCURSAL), 2) == []
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+import esquema
+from esquema import compactar, concatenar
+
+
+def test_concatenar_une_las_categorias():
+    a = pd.DataFrame({"provincia": pd.Categorical(["Salta", "Chaco"]), "precio": [1.0, 2.0]})
+    b = pd.DataFrame({"provincia": pd.Categorical(["Córdoba", "Salta"]), "precio": [3.0, 4.0]})
+    frame = concatenar([a, b], ignore_index=True)
+
+    assert isinstance(frame["provincia"].dtype, pd.CategoricalDtype)
+    assert list(frame["provincia"].cat.categories) == ["Chaco", "Córdoba", "Salta"]
+    assert frame["provincia"].tolist() == ["Salta", "Chaco", "Córdoba", "Salta"]
+    # con pd.concat las categorias distintas se pierden
+    assert not isinstance(pd.concat([a, b])["provincia"].dtype, pd.CategoricalDtype)
+
+
+def test_concatenar_con_la_columna_en_un_solo_frame_o_sin_categorica():
+    a = pd.DataFrame({"cadena": pd.Categorical(["Disco"]), "marca": pd.Categorical(["A"])})
+    b = pd.DataFrame({"marca": pd.Categorical(["B"])})
+    frame = concatenar([a, b], ignore_index=True)
+    assert list(frame["marca"].cat.categories) == ["A", "B"]
+    assert frame["cadena"].tolist()[0] == "Disco" and pd.isna(frame["cadena"][1])
+
+    # si algun frame la tiene como texto, queda como la deja pd.concat
+    c = pd.DataFrame({"marca": ["C"]})
+    assert concatenar([a, c], ignore_index=True)["marca"].tolist() == ["A", "C"]
+
+
+def test_compactar_precios_a_float32_con_nan():
+    frame = pd.DataFrame(
+        {
+            "precio": [10.5, np.nan],
+            "precio_max": [11.0, 12.0],
+            "precio_20261001": [np.nan, 1.25],
+            "variacion_relativa": [0.1, np.nan],
+            "lat": [-31.4, -31.5],
+            "provincia": ["Córdoba", "Córdoba"],
+            "producto_id": [7790000000001, 7790000000002],
+        }
+    )
+    compacto = compactar(frame)
+
+    for columna in ["precio", "precio_max", "precio_20261001", "variacion_relativa"]:
+        assert compacto[columna].dtype == esquema.TIPO_PRECIO == np.float32
+    assert compacto["precio"].isna().tolist() == [False, True]
+    assert compacto["precio_20261001"].isna().tolist() == [True, False]
+    assert compacto["precio"][0] == np.float32(10.5)
+    # lat, los ids numericos y lo que no es del esquema no cambian
+    assert compacto["lat"].dtype == "float64" and compacto["producto_id"].dtype == "int64"
+    assert isinstance(compacto["provincia"].dtype, pd.CategoricalDtype)
+
+
+def test_compactar_no_toca_precios_no_float():
+    frame = pd.DataFrame({"precio": ["10,5"], "sucursal_id": pd.Categorical(["10-3-670"])})
+    compacto = compactar(frame)
+    assert compacto["precio"].tolist() == ["10,5"]
+    assert compacto["sucursal_id"].dtype == frame["sucursal_id"].dtype
+
+
+def test_sin_categoricas():
+    assert esquema.sin_categoricas({"provincia": "category", "precio": "float64"}) == {
+        "provincia": "str",
+        "precio": "float64",
+    }
@@ -0,0 +1,209 @@
+import datetime
+import io
+import re
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from scrapy.exporters import CsvItemExporter
+from scrapy.utils.test import get_crawler
+
+from consolidar_precios import consolidar
+from helpers import reconstruir_precios
+from lectura import leer_csv
+from preciosclaros.exporters import COLUMNAS, DICCIONARIO, FilasCsvExporter, ParquetItemExporter
+from preciosclaros.items import PrecioItem, ProductoItem, SucursalItem
+from preciosclaros.pipelines import MultiCSVItemPipeline
+from preciosclaros.spiders.pclaros import PreciosClarosSpider
+
+
+def precios(cantidad=5):
+    return [
+        PrecioItem(
+            sucursal_id=f"10-3-{670 + i % 2}",
+            producto_id=str(7790000000001 + i),
+            precio=100.0 + i,
+            precio_max=110.0 + i,
+            precio_min=None if i == 2 else 90.0 + i,
+            fecha_relevamiento=datetime.datetime(2026, 10, 18, 12) + datetime.timedelta(seconds=i),
+        )
+        for i in range(cantidad)
+    ]
+
+
+def exportar(path, items, item_type="precio", **kwargs):
+    with open(path, "wb") as f:
+        exporter = ParquetItemExporter(f, item_type, **kwargs)
+        exporter.start_exporting()
+        for item in items:
+            exporter.export_item(item)
+        exporter.finish_exporting()
+    return path
+
+
+def test_parquet_ida_y_vuelta(tmp_path):
+    items = precios()
+    path = exportar(tmp_path / "precio.parquet", items)
+    frame = pd.read_parquet(path)
+
+    assert list(frame.columns) == list(PrecioItem.fields)
+    assert frame["precio"].dtype == "float64" and frame["precio_min"].dtype == "float64"
+    assert frame["fecha_relevamiento"].dtype == "datetime64[us]"
+    assert pd.api.types.is_string_dtype(frame["sucursal_id"])
+    assert frame["producto_id"].tolist() == [i["producto_id"] for i in items]
+    assert frame["fecha_relevamiento"].tolist() == [pd.Timestamp(i["fecha_relevamiento"]) for i in items]
+    assert pd.isna(frame["precio_min"][2])
+
+    # dictionary encoding sólo en las columnas de DICCIONARIO
+    metadata = pq.ParquetFile(path).metadata.row_group(0)
+    codificadas = {
+        metadata.column(i).path_in_schema
+        for i in range(metadata.num_columns)
+        if any("DICTIONARY" in codificacion for codificacion in metadata.column(i).encodings)
+    }
+    assert codificadas == {"sucursal_id", "producto_id"} == set(DICCIONARIO) & set(PrecioItem.fields)
+
+
+def test_parquet_row_groups_al_llegar_al_limite(tmp_path):
+    path = exportar(tmp_path / "precio.parquet", precios(5), row_group_size=2)
+    archivo = pq.ParquetFile(path)
+    assert [archivo.metadata.row_group(i).num_rows for i in range(archivo.num_row_groups)] == [2, 2, 1]
+    assert len(pd.read_parquet(path)) == 5
+
+
+def test_parquet_de_items_sin_esquema_fijo_usa_sus_campos(tmp_path):
+    producto = ProductoItem(id=7790000000001, nombre="Leche", presentacion="1.0 lt", marca="A")
+    frame = pd.read_parquet(exportar(tmp_path / "p.parquet", [producto], item_type="otro"))
+    # los valores sin tipo propio se guardan como texto
+    assert frame.to_dict("records") == [
+        {"id": "7790000000001", "nombre": "Leche", "presentacion": "1.0 lt", "marca": "A"}
+    ]
+
+
+def exportar_corrida(items, formato, **argumentos):
+    crawler = get_crawler(PreciosClarosSpider)
+    spider = PreciosClarosSpider.from_crawler(crawler, exportar=1, formato=formato, porcion="2/7", **argumentos)
+    crawler.spider = spider
+    pipeline = MultiCSVItemPipeline.from_crawler(crawler)
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+
+
+def test_nombre_de_los_archivos_parquet(en_tmp):
+    exportar_corrida(precios(), "parquet")
+    nombres = [f.name for f in (en_tmp / "data").iterdir()]
+    assert len(nombres) == 1 and re.fullmatch(r"precio-2-7-\d{8}-\d{6}\.parquet", nombres[0])
+
+    exportar_corrida(precios(), "parquet", rotar_filas=2)
+    partes = sorted(f.name for f in (en_tmp / "data").glob("precio-*-000?.parquet"))
+    assert [nombre.rsplit("-", 1)[1] for nombre in partes] == ["0000.parquet", "0001.parquet", "0002.parquet"]
+
+
+def test_partes_parquet_se_leen_como_los_csv(en_tmp):
+    items = precios(7)
+    exportar_corrida(items, "parquet", rotar_filas=3)
+    (en_tmp / "data").rename(en_tmp / "parquet")
+    exportar_corrida(items, "csv")
+    (en_tmp / "data").rename(en_tmp / "csv")
+
+    fecha = "2026-10-19"
+    pd.testing.assert_frame_equal(
+        reconstruir_precios(en_tmp / "parquet", fecha), reconstruir_precios(en_tmp / "csv", fecha)
+    )
+    partes = sorted((en_tmp / "parquet").glob("precio-*.parquet"))
+    assert len(partes) == 3
+    frame, desde, hasta = consolidar(partes)
+    esperado, *rango = consolidar(list((en_tmp / "csv").glob("precio-*.csv")))
+    assert rango == [desde, hasta] == ["20261018", "20261018"]
+    pd.testing.assert_frame_equal(frame.reset_index(drop=True), esperado.reset_index(drop=True))
+
+
+def partes(path, patron):
+    return [leer_csv(f) for f in sorted(path.glob(patron))]
+
+
+@pytest.mark.parametrize("comprimir,extension", [("", "csv"), ("zstd", "csv.zst"), ("gzip", "csv.gz")])
+def test_rotacion_por_filas(en_tmp, comprimir, extension):
+    items = precios(7)
+    exportar_corrida(items, "csv", comprimir=comprimir, rotar_filas=3)
+    leidas = partes(en_tmp / "data", f"precio-2-7-*-000?.{extension}")
+    assert [len(parte) for parte in leidas] == [3, 3, 1]
+    assert pd.concat(leidas)["producto_id"].astype(str).tolist() == [i["producto_id"] for i in items]
+
+
+@pytest.mark.parametrize("comprimir,extension", [("", "csv"), ("zstd", "csv.zst")])
+def test_rotacion_por_tamaño(en_tmp, comprimir, extension):
+    exportar_corrida(precios(5000), "csv", comprimir=comprimir, rotar_mb=0.02)
+    archivos = sorted((en_tmp / "data").glob(f"precio-*.{extension}"))
+    assert len(archivos) > 1
+    # todas las partes menos la ultima llegaron al limite
+    assert all(f.stat().st_size >= 0.02 * 2**20 for f in archivos[:-1])
+    assert sum(len(parte) for parte in partes(en_tmp / "data", f"precio-*.{extension}")) == 5000
+
+
+def exportar_csv(exporter_cls, items, *args):
+    salida = io.BytesIO()
+    exporter = exporter_cls(salida, *args)
+    exporter.start_exporting()
+    for item in items:
+        exporter.export_item(item)
+    exporter.finish_exporting()
+    return salida.getvalue()
+
+
+ITEMS_CSV = {
+    "precio": [
+        *precios(3),
+        PrecioItem(
+            sucursal_id="10-3-670",
+            producto_id="7790000000001",
+            precio=1e-05,
+            precio_max=None,
+            precio_min=1234567.891,
+            fecha_relevamiento=datetime.datetime(2026, 10, 18, 12, 0, 0, 123456),
+        ),
+    ],
+    "sucursal": [
+        SucursalItem(
+            id="10-3-670",
+            sucursalTipo="Hipermercado",
+            direccion='Av. "Colón", 1234\nLocal 2',
+            provincia="AR-X",
+            banderaId=3,
+            localidad="Córdoba",
+            banderaDescripcion="Disco",
+            comercioRazonSocial="Jumbo Retail Argentina S.A.",
+            lat=-31.4135,
+            lng=None,
+            sucursalNombre=" Centro ",
+            comercioId=10,
+            sucursalId="670",
+        ),
+        # los campos que faltan quedan vacios
+        SucursalItem(id="10-3-671", provincia="AR-X"),
+    ],
+    "producto": [
+        ProductoItem(id="7790000000001", nombre="Leche, entera", presentacion="1.0 lt", marca=None),
+        ProductoItem(id=7790000000002, nombre='Yogur "firme"', presentacion="", marca="La Serenísima"),
+    ],
+}
+
+
+@pytest.mark.parametrize("item_type", list(ITEMS_CSV))
+def test_filas_csv_igual_que_csv_item_exporter(item_type):
+    items = ITEMS_CSV[item_type]
+    esperado = exportar_csv(CsvItemExporter, items)
+    assert exportar_csv(FilasCsvExporter, items, item_type) == esperado
+
+    # lo mismo escribiendo filas, como export_pagina
+    salida = io.BytesIO()
+    exporter = FilasCsvExporter(salida, item_type)
+    exporter.start_exporting()
+    filas = [[item.get(columna) for columna in COLUMNAS[item_type]] for item in items]
+    exporter.export_filas(
+        [[exporter.formatear_fecha(v) if isinstance(v, datetime.datetime) else v for v in fila] for fila in filas]
+    )
+    exporter.finish_exporting()
+    assert salida.getvalue() == esperado
@@ -0,0 +1,51 @@
+import scrapy
+
+from conftest import respuesta
+from preciosclaros.items import PrecioItem, SucursalGemelaItem
+from preciosclaros.spiders.pclaros import PreciosClarosSpider, productos_url
+
+REFERENCIA, GEMELA = "10-3-670", "10-3-671"
+
+
+def pagina(id_sucursal, offset, cuerpo="productos_sucursal.json", **meta):
+    url = productos_url + f"?limit=2&offset={offset}&id_sucursal={id_sucursal}"
+    meta = {"id_sucursal": id_sucursal, "offset": offset, "total": 4 if offset else None, "limit": 2, **meta}
+    return respuesta(url, cuerpo, **meta)
+
+
+def scrapear(spider, id_sucursal, ultima="productos_sucursal.json"):
+    """
+    Primer pagina y muestra de la ultima de una sucursal de 4 productos.
+    """
+    [muestra] = spider.parse_productos_first_page(pagina(id_sucursal, 0))
+    assert muestra.meta["offset"] == 2 and muestra.errback == spider.muestra_fallida
+    return list(spider.parse_muestra(pagina(id_sucursal, 2, ultima, muestras=muestra.meta["muestras"])))
+
+
+def test_misma_primer_y_ultima_pagina_es_gemela():
+    spider = PreciosClarosSpider(gemelas=1)
+    referencia = scrapear(spider, REFERENCIA)
+    assert len([i for i in referencia if isinstance(i, PrecioItem)]) == 4
+
+    [gemela] = scrapear(spider, GEMELA)
+    assert isinstance(gemela, SucursalGemelaItem)
+    assert (gemela["sucursal_id"], gemela["referencia_id"]) == (GEMELA, REFERENCIA)
+
+
+def test_ultima_pagina_distinta_no_es_gemela():
+    spider = PreciosClarosSpider(gemelas=1)
+    scrapear(spider, REFERENCIA)
+    salida = scrapear(spider, GEMELA, ultima="productos_sucursal_otra.json")
+
+    assert not any(isinstance(i, SucursalGemelaItem) for i in salida)
+    assert len([i for i in salida if isinstance(i, PrecioItem)]) == 4
+    assert not any(isinstance(i, scrapy.Request) for i in salida)
+
+
+def test_gemela_con_checkpoint_queda_hecha(en_tmp):
+    spider = PreciosClarosSpider(gemelas=1, checkpoint="checkpoint.sqlite", exportar=1)
+    scrapear(spider, REFERENCIA)
+    salida = scrapear(spider, GEMELA)
+    assert isinstance(salida[0], SucursalGemelaItem)
+    assert (salida[1]["offset"], salida[1]["limite"]) == (0, 4)
+    assert spider.checkpoint.total(GEMELA) == 4
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+import indices
+from helpers import read_precios_largo, sucursales_prov
+from indices import CLAVES, NIVELES, actualizar_indices, calcular_indices, read_indices
+
+
+def indices_a_mano(path):
+    """
+    Los indices calculados de la forma obvia: por grupo, fecha a fecha, con los productos
+    que tienen precio en esa fecha y en la anterior.
+    """
+    sucursales = sucursales_prov(path).drop_duplicates("id_prov").set_index("id_prov")
+    productos = pd.read_csv(path / "productos.csv", dtype={"id": str}).set_index("id")
+    largo = read_precios_largo(path).astype({"id_prov": str, "producto_id": str, "fecha": str})
+    largo["provincia"] = largo["id_prov"].map(sucursales["provincia"]).astype(str)
+    largo["cadena"] = largo["id_prov"].map(sucursales["cadena"]).astype(str)
+    precios = largo.set_index(["fecha", "id_prov", "producto_id"])["precio"].astype(float).to_dict()
+    fechas = sorted(largo["fecha"].unique())
+
+    filas = []
+    for nivel in NIVELES:
+        largo["categoria"] = largo["producto_id"].map(productos[nivel])
+        for (categoria, provincia, cadena), grupo in largo.dropna(subset=["categoria"]).groupby(
+            ["categoria", "provincia", "cadena"]
+        ):
+            jevons = dutot = None
+            for anterior, fecha in zip(fechas, fechas[1:]):
+                pares = [
+                    (precios[anterior, id_prov, producto], precio)
+                    for id_prov, producto, precio in grupo[grupo["fecha"] == fecha][
+                        ["id_prov", "producto_id", "precio"]
+                    ].itertuples(index=False)
+                    if (anterior, id_prov, producto) in precios
+                ]
+                if not pares:
+                    continue
+                if jevons is None:
+                    jevons = dutot = 100.0
+                    filas.append((nivel, categoria, provincia, cadena, anterior, 0, jevons, dutot))
+                jevons *= np.exp(np.mean([np.log(actual / previo) for previo, actual in pares]))
+                dutot *= sum(actual for _, actual in pares) / sum(previo for previo, _ in pares)
+                filas.append((nivel, categoria, provincia, cadena, fecha, len(pares), jevons, dutot))
+    return pd.DataFrame(filas, columns=CLAVES + ["fecha", "productos", "jevons", "dutot"])
+
+
+def comparables(frame):
+    frame = frame.astype({clave: str for clave in CLAVES + ["fecha"]}).astype({"productos": "int64"})
+    return frame.sort_values(CLAVES + ["fecha"], ignore_index=True)
+
+
+def test_igual_que_el_calculo_a_mano(dataset):
+    esperado = indices_a_mano(dataset)
+    assert len(esperado) and set(esperado["nivel"]) == set(NIVELES)
+    pd.testing.assert_frame_equal(comparables(calcular_indices(dataset)), comparables(esperado), rtol=1e-6)
+
+
+def test_actualizacion_incremental_igual_que_completa(dataset, monkeypatch):
+    ultimo = dataset / "precios_20261003.csv"
+    (dataset / "aparte").mkdir()
+    guardado = ultimo.rename(dataset / "aparte" / ultimo.name)
+    actualizar_indices(dataset)
+    guardado.rename(ultimo)
+
+    lecturas = []
+    leer = indices.read_precios_largo
+
+    def read_precios_largo(*args, **kwargs):
+        lecturas.append(kwargs.get("desde"))
+        return leer(*args, **kwargs)
+
+    monkeypatch.setattr(indices, "read_precios_largo", read_precios_largo)
+    incremental = actualizar_indices(dataset)
+    # sólo se leyeron los precios desde la ultima fecha ya incluida
+    assert lecturas == ["20261002"]
+
+    completo = calcular_indices(dataset)
+    pd.testing.assert_frame_equal(comparables(incremental), comparables(completo), rtol=1e-6)
+    pd.testing.assert_frame_equal(comparables(read_indices(dataset)), comparables(completo), rtol=1e-6)
+    # sin cambios no se recalcula nada
+    lecturas.clear()
+    pd.testing.assert_frame_equal(comparables(actualizar_indices(dataset)), comparables(completo), rtol=1e-6)
+    assert lecturas == []
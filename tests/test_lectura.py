@@ -0,0 +1,219 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from consolidar_precios import consolidar, consolidar_por_partes
+from helpers import read_precios, read_precios_largo
+from lectura import guardar_manifiesto, leer_csv, leer_csv_por_partes, leer_manifiesto, pendientes, zstd
+from preciosclaros.items import SucursalItem
+from test_consolidar_precios import escribir_precios, leer
+
+
+def iguales(izquierda, derecha):
+    # con cache las categorias de producto_id quedan en el orden en que aparecieron
+    pd.testing.assert_frame_equal(
+        izquierda.astype({"producto_id": str}), derecha.astype({"producto_id": str}), check_categorical=False
+    )
+
+
+def test_cache_igual_que_sin_cache(dataset):
+    esperado = read_precios_largo(dataset)
+    iguales(read_precios_largo(dataset, cache=True), esperado)
+    # la segunda lectura sale de los .npy
+    iguales(read_precios_largo(dataset, cache=True), esperado)
+
+
+def test_cache_incremental_igual_que_completa(dataset):
+    nuevo = dataset / "precios_20261003.csv"
+    (dataset / "aparte").mkdir()
+    guardado = nuevo.rename(dataset / "aparte" / nuevo.name)
+    read_precios_largo(dataset, cache=True)
+    guardado.rename(nuevo)
+
+    incremental = read_precios_largo(dataset, cache=True)
+    assert list(incremental["fecha"].cat.categories) == ["20261001", "20261002", "20261003"]
+    iguales(incremental, read_precios_largo(dataset))
+
+
+def test_cache_rearmada_no_borra_otros_archivos(dataset):
+    cache = dataset / "compartida"
+    cache.mkdir()
+    (cache / "otro.npy").write_bytes(b"no es de la cache")
+    read_precios_largo(dataset, cache=cache)
+
+    # cambian las sucursales: se rearma la cache
+    sucursales = pd.read_csv(dataset / "sucursales.csv")
+    sucursales.iloc[::-1].to_csv(dataset / "sucursales.csv", index=False)
+    iguales(read_precios_largo(dataset, cache=cache), read_precios_largo(dataset))
+    assert (cache / "otro.npy").read_bytes() == b"no es de la cache"
+    assert {f.name for f in cache.iterdir()} == {"otro.npy", "precios_largo"}
+
+
+
+def test_filtros_con_y_sin_cache(dataset):
+    filtros = {"desde": "2026-10-02", "id_provs": ["10-1-AR-X"], "producto_ids": [7790000000002, 7790000000003]}
+    largo = read_precios_largo(dataset, **filtros)
+    assert list(largo["fecha"].cat.categories) == ["20261002", "20261003"]
+    assert set(largo["id_prov"].astype(str)) == {"10-1-AR-X"}
+    assert set(largo["producto_id"].astype(str)) == {"7790000000002", "7790000000003"}
+    # un unico precio por fecha, id_prov y producto aunque haya dos sucursales
+    assert not largo.duplicated(["fecha", "id_prov", "producto_id"]).any()
+
+    completo = read_precios_largo(dataset)
+    elegidos = completo[
+        (completo["fecha"] >= "20261002")
+        & (completo["id_prov"] == "10-1-AR-X")
+        & completo["producto_id"].isin(filtros["producto_ids"])
+    ]
+    assert np.array_equal(largo["precio"].to_numpy(), elegidos["precio"].to_numpy())
+
+    con_cache = read_precios_largo(dataset, cache=True, **filtros)
+    iguales(con_cache, largo)
+
+
+@pytest.mark.parametrize("cache", [None, True])
+def test_sin_snapshots_entre_las_fechas_frame_vacio(dataset, cache):
+    completo = read_precios_largo(dataset)
+    vacio = read_precios_largo(dataset, cache=cache, desde="2026-11-01")
+    assert len(vacio) == 0
+    assert list(vacio.columns) == list(completo.columns)
+    assert (vacio.dtypes.apply(str) == completo.dtypes.apply(str)).all()
+    assert list(vacio["id_prov"].cat.categories) == list(completo["id_prov"].cat.categories)
+
+
+def test_read_precios_sin_snapshots_entre_las_fechas(dataset):
+    with pytest.raises(ValueError, match="No hay precios"):
+        read_precios(dataset, hasta="2026-09-30")
+
+
+def test_read_precios_ordenado_y_compacto(dataset):
+    precios = read_precios(dataset)
+    claves = ["provincia", "cadena", "producto_id"]
+    pd.testing.assert_frame_equal(precios, precios.sort_values(claves, ignore_index=True))
+    assert isinstance(precios["producto_id"].dtype, pd.CategoricalDtype)
+    assert (precios.filter(regex="^(precio_|variacion)").dtypes == np.float32).all()
+    # el mismo frame con cache
+    pd.testing.assert_frame_equal(
+        read_precios(dataset, cache=True).astype({"producto_id": str}),
+        precios.astype({"producto_id": str}),
+        check_categorical=False,
+    )
+
+
+def como_zst(path):
+    destino = path.with_name(path.name + ".zst")
+    with zstd.open(destino, "wb") as f:
+        f.write(path.read_bytes())
+    return destino
+
+
+def test_leer_csv_de_partes_zst(tmp_path):
+    csv = escribir_precios(tmp_path / "precio-1-1.csv", 500, 1, "2026-10-01")
+    zst = como_zst(csv)
+    pd.testing.assert_frame_equal(leer_csv(zst), leer_csv(csv))
+    partes = list(leer_csv_por_partes(zst, 200))
+    assert [len(parte) for parte in partes] == [200, 200, 100]
+    pd.testing.assert_frame_equal(pd.concat(partes), pd.concat(leer_csv_por_partes(csv, 200)))
+
+
+def test_consolidar_partes_zst(tmp_path):
+    csvs = [escribir_precios(tmp_path / f"precio-{i}-2.csv", 3000, i, f"2026-10-0{i}") for i in (1, 2)]
+    zsts = [como_zst(f) for f in csvs]
+    esperado, *rango = consolidar(csvs)
+    frame, *rango_zst = consolidar(zsts)
+    assert rango_zst == rango
+    pd.testing.assert_frame_equal(frame, esperado)
+
+    salida, *_ = consolidar_por_partes(zsts, 200_000, str(tmp_path / "precios.csv"))
+    esperado.to_csv(tmp_path / "esperado.csv", index=False)
+    pd.testing.assert_frame_equal(leer(salida), leer(tmp_path / "esperado.csv"))
+
+
+@pytest.fixture
+def archivos(tmp_path):
+    for nombre, contenido in [("a.csv", "x\n1\n"), ("b.csv", "x\n2\n")]:
+        (tmp_path / nombre).write_text(contenido)
+    salida = tmp_path / "salida.csv"
+    salida.write_text("x\n1\n2\n")
+    return tmp_path
+
+
+def consolidado(path, nombres):
+    # manifiesto de una consolidacion de ``nombres`` guardada en salida.csv, ida y vuelta por disco
+    manifiesto = leer_manifiesto(path / "manifiesto.json")
+    base, nuevos = pendientes(manifiesto, [path / n for n in nombres])
+    manifiesto["salida"] = str(path / "salida.csv")
+    guardar_manifiesto(path / "manifiesto.json", manifiesto)
+    return base, nuevos
+
+
+def test_manifiesto_suma_sólo_los_archivos_nuevos(archivos):
+    assert consolidado(archivos, ["a.csv"]) == (None, [archivos / "a.csv"])
+    (archivos / "c.csv").write_text("x\n3\n")
+    base, nuevos = consolidado(archivos, ["a.csv", "b.csv", "c.csv"])
+    assert base == str(archivos / "salida.csv") and nuevos == [archivos / "b.csv", archivos / "c.csv"]
+    assert consolidado(archivos, ["a.csv", "b.csv", "c.csv"])[1] == []
+
+
+@pytest.mark.parametrize("contenido", ["x\n10\n", "x\n9\n"], ids=["tamaño", "hash"])
+def test_manifiesto_archivo_cambiado_reconsolida_todo(archivos, contenido):
+    consolidado(archivos, ["a.csv", "b.csv"])
+    (archivos / "a.csv").write_text(contenido)
+    os.utime(archivos / "a.csv", ns=(0, 10**18))
+    assert consolidado(archivos, ["a.csv", "b.csv"]) == (None, [archivos / "a.csv", archivos / "b.csv"])
+
+
+def test_manifiesto_mismo_contenido_con_otra_fecha_no_reconsolida(archivos):
+    consolidado(archivos, ["a.csv", "b.csv"])
+    os.utime(archivos / "a.csv", ns=(0, 10**18))
+    assert consolidado(archivos, ["a.csv", "b.csv"]) == (str(archivos / "salida.csv"), [])
+    assert leer_manifiesto(archivos / "manifiesto.json")["archivos"][str(archivos / "a.csv")]["mtime"] == 10**18
+
+
+def test_manifiesto_archivo_renombrado_se_reconoce_por_hash(archivos):
+    consolidado(archivos, ["a.csv", "b.csv"])
+    (archivos / "a.csv").rename(archivos / "a2.csv")
+    assert consolidado(archivos, ["a2.csv", "b.csv"]) == (str(archivos / "salida.csv"), [])
+
+
+def test_manifiesto_sin_consolidado_anterior_reconsolida_todo(archivos):
+    consolidado(archivos, ["a.csv", "b.csv"])
+    (archivos / "salida.csv").unlink()
+    assert consolidado(archivos, ["a.csv", "b.csv"]) == (None, [archivos / "a.csv", archivos / "b.csv"])
+
+
+def consolidar_sucursales(directorio, *argumentos):
+    script = Path(__file__).parent.parent / "consolidar_sucursales.py"
+    subprocess.run([sys.executable, script, "sucursal-*.csv", *argumentos], cwd=directorio, check=True)
+    return pd.read_csv(directorio / "sucursales.csv", dtype=str)
+
+
+def test_consolidar_sucursales_incremental_igual_que_completo(tmp_path):
+    columnas = list(SucursalItem.fields)
+    filas = [
+        {c: f"{c}-{i}" for c in columnas} | {"id": f"10-3-{i}", "sucursalId": str(i), "lat": i + 0.5, "lng": i + 0.5}
+        for i in range(6)
+    ]
+    sucursales = pd.DataFrame(filas, columns=columnas)
+    sucursales.iloc[:4].to_csv(tmp_path / "sucursal-1-2.csv", index=False)
+    # repite dos sucursales de la primera y cambia la direccion de una
+    segunda = sucursales.iloc[2:].copy()
+    segunda.loc[3, "direccion"] = "otra"
+    segunda.to_csv(tmp_path / "sucursal-2-2.csv", index=False)
+
+    # sucursalId es parte de id, asi que deduplicar sin esa columna da lo mismo que con ella
+    esperado = pd.concat([sucursales.iloc[:4], segunda]).drop_duplicates().sort_values(by="id")
+    esperado = esperado.drop(columns="sucursalId").astype(str).reset_index(drop=True)
+    completo = consolidar_sucursales(tmp_path)
+    assert len(completo) == 7
+    pd.testing.assert_frame_equal(completo[esperado.columns], esperado)
+
+    (tmp_path / "sucursal-2-2.csv").rename(tmp_path / "despues.csv")
+    consolidar_sucursales(tmp_path, "--manifiesto", "manifiesto.json")
+    (tmp_path / "despues.csv").rename(tmp_path / "sucursal-2-2.csv")
+    pd.testing.assert_frame_equal(consolidar_sucursales(tmp_path, "--manifiesto", "manifiesto.json"), completo)
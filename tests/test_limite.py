@@ -0,0 +1,57 @@
+from twisted.python.failure import Failure
+
+from conftest import respuesta
+from preciosclaros.spiders.pclaros import (
+    CANDIDATOS_LIMIT_SUCURSALES,
+    LIMIT_SUCURSALES,
+    PreciosClarosSpider,
+    sucursales_url,
+)
+
+
+def fallo(request):
+    failure = Failure(Exception("HTTP 500"))
+    failure.request = request
+    return failure
+
+
+def test_sondeo_fallido_con_el_ultimo_candidato_arranca_con_los_limites_fijos():
+    spider = PreciosClarosSpider(limite="auto")
+    sondeo = spider.sondeo_sucursales_request(len(CANDIDATOS_LIMIT_SUCURSALES) - 1)
+    requests = list(spider.sondeo_fallido(fallo(sondeo)))
+
+    assert len(requests) == 1
+    assert requests[0].url == sucursales_url + f"?limit={LIMIT_SUCURSALES}"
+    assert requests[0].callback == spider.parse_sucursal_first_page
+
+
+def test_sondeo_fallido_prueba_el_siguiente_candidato():
+    spider = PreciosClarosSpider(limite="auto")
+    requests = list(spider.sondeo_fallido(fallo(spider.sondeo_sucursales_request(0))))
+    assert requests[0].meta["intento"] == 1
+
+
+def test_pagina_de_sucursales_fallida_se_pide_en_paginas_mas_chicas():
+    spider = PreciosClarosSpider(limite="auto")
+    spider.limit_sucursales = 200
+    request = spider.sucursales_request(400, 1000)
+    requests = spider.sucursales_fallido(fallo(request))
+
+    assert spider.limit_sucursales == 100
+    assert [(r.meta["offset"], r.meta["limit"]) for r in requests] == [(400, 100), (500, 100)]
+
+
+def test_pagina_de_sucursales_truncada_se_pide_en_paginas_mas_chicas():
+    spider = PreciosClarosSpider(limite="auto")
+    spider.limit_sucursales = 100
+    request = spider.sucursales_request(0, 1000)
+    response = respuesta(request.url, {"status": 500}, **request.meta)
+    requests = list(spider.parse_sucursal(response))
+
+    assert spider.limit_sucursales == 50
+    assert [r.meta["offset"] for r in requests] == [0, 50]
+
+
+def test_sin_limite_auto_no_hay_backoff_de_sucursales():
+    spider = PreciosClarosSpider()
+    assert spider.sucursales_fallido(fallo(spider.sucursales_request(0, 100))) == []
@@ -0,0 +1,50 @@
+import scrapy
+
+from conftest import respuesta
+from preciosclaros.items import SucursalItem
+from preciosclaros.plan import guardar_plan, leer_plan, repartir
+from preciosclaros.spiders.pclaros import PreciosClarosSpider, sucursales_url
+
+
+def test_repartir_balancea_paginas():
+    reparto = repartir({"a": 10, "b": 6, "c": 5, "d": 4}, 2)
+    assert reparto == [(14, ["a", "d"]), (11, ["b", "c"])]
+
+
+def sucursal(id_):
+    comercio, bandera, suc = id_.split("-")
+    return {"id": id_, "comercioId": comercio, "banderaId": bandera, "sucursalId": suc, "comercioRazonSocial": "X"}
+
+
+def plan(tmp_path):
+    path = tmp_path / "plan.json"
+    guardar_plan(path, [(14, ["10-3-670", "9-1-119"]), (11, ["15-1-241"])], 50)
+    return str(path)
+
+
+def test_leer_plan(tmp_path):
+    assert leer_plan(plan(tmp_path), 2, 2) == ["15-1-241"]
+
+
+def test_plan_recorre_todo_el_listado_de_sucursales(tmp_path):
+    spider = PreciosClarosSpider(plan=plan(tmp_path), porcion="2/2")
+    response = respuesta(sucursales_url + "?limit=30", {"total": 70, "sucursales": []}, limit=30)
+    offsets = [r.meta["offset"] for r in spider.parse_sucursal_first_page(response)]
+    assert offsets == [0, 30, 60]
+
+
+def test_plan_exporta_las_sucursales_planificadas(tmp_path):
+    spider = PreciosClarosSpider(plan=plan(tmp_path), porcion="1/2")
+    cuerpo = {"total": 3, "sucursales": [sucursal(i) for i in ("10-3-670", "15-1-241", "9-1-119")]}
+    salida = list(spider.parse_sucursal(respuesta(sucursales_url, cuerpo, offset=0, end=3, limit=30)))
+
+    assert [i["id"] for i in salida if isinstance(i, SucursalItem)] == ["10-3-670", "9-1-119"]
+    requests = [r for r in salida if isinstance(r, scrapy.Request)]
+    assert [r.meta["id_sucursal"] for r in requests] == ["10-3-670", "9-1-119"]
+    assert spider.planificadas_vistas == spider.plan
+
+
+def test_plan_sin_sucursales_pide_productos_directamente(tmp_path):
+    spider = PreciosClarosSpider(plan=plan(tmp_path), porcion="2/2", sucursales=0)
+    assert spider.ids == ["15-1-241"]
+    assert [r.meta["id_sucursal"] for r in spider.iniciar()] == ["15-1-241"]